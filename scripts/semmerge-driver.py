@@ -1,12 +1,28 @@
 #!/usr/bin/env python3
-"""Git merge driver wrapper for the semantic merge engine."""
+"""Git merge driver wrapper for the semantic merge engine.
+
+Configure it as ``python3 scripts/semmerge-driver.py %O %A %B %P``. Git runs
+the driver once per conflicted file, one file at a time, while it holds the
+index lock. The first run of a ``git merge`` merges the whole tree in place;
+later runs for the other files reuse its result.
+"""
 from __future__ import annotations
 
+import contextlib
 import os
 import pathlib
+import re
 import shutil
 import subprocess
 import sys
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows has no flock; run without cross-process locking
+    fcntl = None  # type: ignore[assignment]
+
+_GITHEAD = re.compile(r"GITHEAD_([0-9a-f]{40}|[0-9a-f]{64})")
 
 
 def run(cmd: list[str], cwd: str | None = None) -> str:
@@ -18,35 +34,136 @@ def run(cmd: list[str], cwd: str | None = None) -> str:
     return proc.stdout.strip()
 
 
+def run_remote(server: str, repo_root: str, args: list[str]) -> int | None:
+    """Run the merge through ``semmerge serve`` at *server*, relaying its output.
+
+    Returns ``None`` when no service answers there.
+    """
+
+    from semmerge.client import Unavailable, run_remote as submit
+
+    def relay(event: dict) -> None:
+        if event.get("event") == "log":
+            sys.stderr.write(f"{event['level']} {event['message']}\n")
+        elif event.get("event") == "output":
+            sys.stdout.write(event["line"] + "\n")
+
+    try:
+        return submit(server, "semmerge", repo_root, args, on_event=relay)
+    except Unavailable as exc:
+        if os.environ.get("SEMMERGE_SERVER"):
+            sys.stderr.write(f"semmerge-driver: {exc}; merging locally\n")
+        return None
+    except (OSError, RuntimeError) as exc:
+        sys.exit(f"semmerge-driver: {exc}")
+
+
+def run_local(repo_root: pathlib.Path, args: list[str]) -> int:
+    """Run the merge in this process rather than starting another interpreter."""
+
+    from semmerge.__main__ import main as cli
+
+    os.chdir(repo_root)
+    try:
+        cli.main(args=["semmerge", *args], prog_name="semmerge", standalone_mode=False)
+    except SystemExit as exc:
+        return exc.code if isinstance(exc.code, int) else (0 if exc.code is None else 1)
+    return 0
+
+
+def merge_head(head: str) -> str:
+    """Return the commit being merged into *head*.
+
+    ``MERGE_HEAD`` is only written once a merge stops, so git names the heads
+    of a running merge in ``GITHEAD_<sha>`` variables. ``GITHEAD_REF``
+    overrides them.
+    """
+
+    named = os.environ.get("GITHEAD_REF")
+    if named:
+        return named
+    heads = sorted({match.group(1) for match in map(_GITHEAD.fullmatch, os.environ) if match} - {head})
+    if len(heads) == 1:
+        return heads[0]
+    return run(["git", "rev-parse", "MERGE_HEAD"])
+
+
+def merge_stamp(git_dir: pathlib.Path, args: list[str]) -> str | None:
+    """Identify the running ``git merge`` by the index lock it holds throughout; ``None`` outside one."""
+
+    try:
+        lock = (git_dir / "index.lock").stat()
+    except OSError:
+        return None
+    return f"{lock.st_dev}:{lock.st_ino}:{lock.st_ctime_ns} {' '.join(args)}"
+
+
+@contextlib.contextmanager
+def locked(path: pathlib.Path) -> Iterator[None]:
+    """Hold an exclusive ``flock`` on *path*, waiting for other drivers of the work tree."""
+
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def merge_once(repo_root: pathlib.Path, git_dir: pathlib.Path, args: list[str]) -> int:
+    """Merge the tree once per ``git merge`` and return the exit code; later calls replay it."""
+
+    stamp = merge_stamp(git_dir, args)
+    done = git_dir / ".semmerge.done"
+    with locked(git_dir / ".semmerge.lock"):
+        if stamp is not None:
+            with contextlib.suppress(OSError, ValueError):
+                recorded, code = done.read_text().rsplit("\n", 1)
+                if recorded == stamp:
+                    return int(code)
+
+        from semmerge.client import discover
+
+        # The service also serializes jobs per repository and folds identical
+        # concurrent requests into one job.
+        server = discover()
+        result = run_remote(server, str(repo_root), args) if server else None
+        if result is None:
+            result = run_local(repo_root, args)
+        if stamp is not None:
+            done.write_text(f"{stamp}\n{result}")
+    return result
+
+
+def copy_result(repo_root: pathlib.Path, ours_file: str, path: str | None) -> None:
+    """Hand the merged *path* (git's ``%P``) back to git through *ours_file* (``%A``)."""
+
+    if path is None:
+        # %A is normally a temporary file in the work tree root, which this cannot map back.
+        path = os.path.relpath(ours_file, repo_root)
+    resolved = repo_root / path
+    if not resolved.exists():
+        return
+    if os.path.samefile(resolved, ours_file):
+        sys.exit("semmerge-driver: cannot tell which file %A stands for; add %P to the driver command")
+    shutil.copyfile(resolved, ours_file)
+
+
 def main() -> None:
     if len(sys.argv) < 4:
-        sys.exit("semmerge-driver requires %O %A %B arguments")
-
-    base_file, ours_file, theirs_file = sys.argv[1:4]
-
-    repo_root = pathlib.Path(run(["git", "rev-parse", "--show-toplevel"]))
-    head = run(["git", "rev-parse", "HEAD"])
-    merge_head = os.environ.get("GITHEAD_REF") or run(["git", "rev-parse", "MERGE_HEAD"])
-    base_commit = run(["git", "merge-base", "HEAD", merge_head])
-
-    lock = repo_root / ".git" / ".semmerge.lock"
-    lock.parent.mkdir(parents=True, exist_ok=True)
-    if not lock.exists():
-        lock.write_text(merge_head)
-        try:
-            code = subprocess.run(
-                ["python3", "-m", "semmerge", "semmerge", base_commit, head, merge_head, "--inplace", "--git"],
-                cwd=repo_root,
-            ).returncode
-            if code != 0:
-                sys.exit(code)
-        finally:
-            lock.unlink(missing_ok=True)
-
-    rel = pathlib.Path(os.path.relpath(ours_file, repo_root))
-    resolved = repo_root / rel
-    if resolved.exists():
-        shutil.copyfile(resolved, ours_file)
+        sys.exit("semmerge-driver requires %O %A %B [%P] arguments")
+
+    ours_file = os.path.abspath(sys.argv[2])
+    top, git_dir, head = run(["git", "rev-parse", "--show-toplevel", "--absolute-git-dir", "HEAD"]).splitlines()
+    repo_root = pathlib.Path(top)
+    theirs = merge_head(head)
+    base_commit = run(["git", "merge-base", head, theirs])
+
+    code = merge_once(repo_root, pathlib.Path(git_dir), [base_commit, head, theirs, "--inplace", "--git"])
+    if code != 0:
+        sys.exit(code)
+    copy_result(repo_root, ours_file, sys.argv[4] if len(sys.argv) > 4 else None)
     sys.exit(0)
 
 
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""Stress test the Git merge driver and the lifecycle of its TypeScript workers.
+
+Builds a synthetic repository in which every one of ``--files`` TypeScript
+files changed on both sides (the left side renames its function, the right
+side edits its body), then runs ``git merge`` through
+``scripts/semmerge-driver.py`` ``--merges`` times, ``--parallel`` at once, in
+linked work trees sharing one object store and one ``.git/semmerge`` cache.
+With ``--serve`` the drivers hand the merges to a ``semmerge serve``, which is
+stopped with SIGTERM at the end.
+
+Each merge is checked against a reference ``semmerge semmerge --inplace`` run,
+so the harness tests the driver, not the merge semantics:
+
+* latency: wall time of each ``git merge``, and merges and files per second;
+* semantic merge runs per ``git merge``: exactly one. None means a driver
+  skipped the merge (a lock race); more mean the drivers of one merge did not
+  share its result;
+* stale files: merged files that differ from the reference;
+* TypeScript workers spawned, and leaked (still running once the merges, and
+  the service, have stopped). Workers are told apart from any others by a
+  marker in their environment.
+
+The exit status is 1 when any check fails or the 95th percentile latency
+exceeds ``--max-p95``, so the harness can gate throughput regressions::
+
+    python scripts/stress-driver.py --files 300 --merges 20 --parallel 4 --json stress.json
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import pathlib
+import shlex
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Set, Tuple
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parent.parent
+DRIVER = PROJECT_ROOT / "scripts" / "semmerge-driver.py"
+MARKER = "SEMMERGE_STRESS_RUN"
+# Seconds between scans of /proc for TypeScript workers, and the time they get to exit at the end.
+SCAN_INTERVAL_S = 0.01
+EXIT_GRACE_S = 5.0
+
+_BASE = "export function f{n}(x: number) {{\n  return x + {n};\n}}\n"
+_LEFT = "export function left{n}(x: number) {{\n  return x + {n};\n}}\n"
+_RIGHT = "export function f{n}(x: number) {{\n  return x * {n};\n}}\n"
+
+
+@dataclass
+class MergeRun:
+    slot: int
+    seconds: float
+    exit_code: int
+    semantic_runs: int
+    unmerged: int
+    stale: List[str] = field(default_factory=list)
+
+
+class WorkerCensus:
+    """Scans ``/proc`` for node processes whose environment carries *token*."""
+
+    def __init__(self, token: str) -> None:
+        self._needle = f"{MARKER}={token}".encode()
+        self.seen: Set[Tuple[int, str]] = set()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._watch, name="worker-census", daemon=True)
+
+    def __enter__(self) -> "WorkerCensus":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def alive(self) -> Set[Tuple[int, str]]:
+        """``(pid, start time)`` of the marked workers running now."""
+
+        found = set()
+        for entry in os.scandir("/proc"):
+            if not entry.name.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry.name}/comm", "rb") as fh:
+                    if fh.read().strip() != b"node":
+                        continue
+                with open(f"/proc/{entry.name}/environ", "rb") as fh:
+                    if self._needle not in fh.read().split(b"\0"):
+                        continue
+                with open(f"/proc/{entry.name}/stat", "rb") as fh:
+                    stat = fh.read()
+            except OSError:
+                continue
+            found.add((int(entry.name), stat[stat.rfind(b")") + 2 :].split()[19].decode()))
+        return found
+
+    def _watch(self) -> None:
+        while not self._stop.wait(SCAN_INTERVAL_S):
+            self.seen |= self.alive()
+
+
+def git(cwd: pathlib.Path, *args: str, env: Dict[str, str] | None = None) -> str:
+    proc = subprocess.run(
+        ["git", *args],
+        cwd=cwd,
+        env=env,
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    return proc.stdout.strip()
+
+
+def build_repo(root: pathlib.Path, files: int) -> Tuple[str, str, str]:
+    """Create the synthetic repository; return the base, left and right commits."""
+
+    root.mkdir(parents=True)
+    git(root, "init", "-q")
+    # Linked work trees and the merge service's jobs read the identity from here.
+    git(root, "config", "user.name", "semmerge stress")
+    git(root, "config", "user.email", "stress@example.invalid")
+    (root / ".gitattributes").write_text("*.ts merge=semmerge\n")
+    driver = f"{shlex.quote(sys.executable)} {shlex.quote(str(DRIVER))} %O %A %B %P"
+    git(root, "config", "merge.semmerge.driver", driver)
+    commits = []
+    for template in (_BASE, _LEFT, _RIGHT):
+        if commits:
+            git(root, "checkout", "-q", "--detach", commits[0])
+        src = root / "src"
+        src.mkdir(exist_ok=True)
+        for n in range(files):
+            (src / f"m{n}.ts").write_text(template.format(n=n))
+        git(root, "add", "-A")
+        git(root, "commit", "-q", "-m", f"stress {len(commits)}")
+        commits.append(git(root, "rev-parse", "HEAD"))
+    return commits[0], commits[1], commits[2]
+
+
+def tree_digest(root: pathlib.Path) -> Dict[str, str]:
+    return {
+        path.relative_to(root).as_posix(): hashlib.sha256(path.read_bytes()).hexdigest()
+        for path in sorted((root / "src").glob("*.ts"))
+    }
+
+
+def reset(slot: pathlib.Path, left: str) -> None:
+    subprocess.run(["git", "merge", "--abort"], cwd=slot, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    git(slot, "reset", "-q", "--hard", left)
+    git(slot, "clean", "-qfdx")
+
+
+def merge(slot: pathlib.Path, index: int, right: str, env: Dict[str, str], expected: Dict[str, str]) -> MergeRun:
+    started = time.perf_counter()
+    proc = subprocess.run(
+        ["git", "merge", "--no-edit", right],
+        cwd=slot,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    seconds = time.perf_counter() - started
+    unmerged = len(git(slot, "diff", "--name-only", "--diff-filter=U").splitlines())
+    actual = tree_digest(slot)
+    return MergeRun(
+        slot=index,
+        seconds=seconds,
+        exit_code=proc.returncode,
+        semantic_runs=(proc.stdout + proc.stderr).count("Starting semantic merge"),
+        unmerged=unmerged,
+        stale=sorted(path for path, digest in expected.items() if actual.get(path) != digest),
+    )
+
+
+def start_service(workdir: pathlib.Path, jobs: int, env: Dict[str, str]) -> Tuple[subprocess.Popen, str]:
+    socket_path = workdir / "serve.sock"
+    with open(workdir / "serve.log", "wb") as log:
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "semmerge", "serve", "--socket", str(socket_path), "--jobs", str(jobs)],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=log,
+        )
+    deadline = time.monotonic() + 30
+    while not socket_path.exists():
+        if proc.poll() is not None or time.monotonic() > deadline:
+            sys.exit(f"semmerge serve did not start; see {workdir / 'serve.log'}")
+        time.sleep(0.05)
+    return proc, f"unix:{socket_path}"
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run(args: argparse.Namespace, workdir: pathlib.Path) -> Dict[str, Any]:
+    token = uuid.uuid4().hex
+    origin = workdir / "origin"
+    base, left, right = build_repo(origin, args.files)
+    env = dict(os.environ, **{MARKER: token, "XDG_RUNTIME_DIR": str(workdir)})
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(PROJECT_ROOT), env.get("PYTHONPATH")]))
+    env.pop("SEMMERGE_SERVER", None)
+
+    slots = []
+    for index in range(args.parallel):
+        slot = workdir / f"slot-{index}"
+        git(origin, "worktree", "add", "-q", "--detach", str(slot), left)
+        slots.append(slot)
+
+    with WorkerCensus(token) as census:
+        # The reference merge also warms the shared caches, as a first merge would.
+        reference = subprocess.run(
+            [sys.executable, "-m", "semmerge", "semmerge", base, left, right, "--inplace"],
+            cwd=slots[0],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        if reference.returncode != 0:
+            sys.exit(f"reference merge failed ({reference.returncode}):\n{reference.stderr}")
+        expected = tree_digest(slots[0])
+        reset(slots[0], left)
+
+        service = None
+        if args.serve:
+            service, env["SEMMERGE_SERVER"] = start_service(workdir, args.parallel, env)
+        free = list(range(args.parallel))
+        free_lock = threading.Lock()
+
+        def one(_: int) -> MergeRun:
+            with free_lock:
+                index = free.pop()
+            try:
+                reset(slots[index], left)
+                return merge(slots[index], index, right, env, expected)
+            finally:
+                with free_lock:
+                    free.append(index)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.parallel) as pool:
+            runs = list(pool.map(one, range(args.merges)))
+        elapsed = time.perf_counter() - started
+
+        if service is not None:
+            service.send_signal(signal.SIGTERM)
+            service.wait(timeout=60)
+        deadline = time.monotonic() + EXIT_GRACE_S
+        while census.alive() and time.monotonic() < deadline:
+            time.sleep(0.1)
+        leaked = census.alive()
+    for pid, _start in leaked:
+        with contextlib.suppress(ProcessLookupError):
+            os.kill(pid, signal.SIGKILL)
+
+    latencies = [merge_run.seconds for merge_run in runs]
+    p95 = percentile(latencies, 0.95)
+    failures = [
+        *(f"merge {n} exited {r.exit_code}" for n, r in enumerate(runs) if r.exit_code != 0),
+        *(f"merge {n} ran {r.semantic_runs} semantic merges" for n, r in enumerate(runs) if r.semantic_runs != 1),
+        *(f"merge {n} left {r.unmerged} unmerged paths" for n, r in enumerate(runs) if r.unmerged),
+        *(f"merge {n}: {len(r.stale)} stale files, e.g. {r.stale[0]}" for n, r in enumerate(runs) if r.stale),
+        *([f"{len(leaked)} TypeScript workers leaked: {sorted(pid for pid, _ in leaked)}"] if leaked else []),
+        *([f"p95 latency {p95:.2f}s exceeds {args.max_p95:.2f}s"] if args.max_p95 and p95 > args.max_p95 else []),
+    ]
+    return {
+        "files": args.files,
+        "merges": args.merges,
+        "parallel": args.parallel,
+        "serve": args.serve,
+        "elapsedSeconds": round(elapsed, 3),
+        "mergesPerSecond": round(args.merges / elapsed, 3),
+        "filesPerSecond": round(args.merges * args.files / elapsed, 1),
+        "latencySeconds": {
+            "min": round(min(latencies), 3),
+            "median": round(statistics.median(latencies), 3),
+            "p95": round(p95, 3),
+            "max": round(max(latencies), 3),
+        },
+        "workersSpawned": len(census.seen),
+        "workersLeaked": len(leaked),
+        "failures": failures,
+        "runs": [asdict(merge_run) for merge_run in runs],
+    }
+
+
+def report(result: Dict[str, Any]) -> str:
+    latency = result["latencySeconds"]
+    lines = [
+        f"{result['merges']} merges of {result['files']} conflicted files, {result['parallel']} at a time"
+        f"{' through semmerge serve' if result['serve'] else ''}: {result['elapsedSeconds']}s",
+        f"  throughput   {result['mergesPerSecond']} merges/s, {result['filesPerSecond']} files/s",
+        "  latency      min {min}s  median {median}s  p95 {p95}s  max {max}s".format(**latency),
+        f"  TS workers   {result['workersSpawned']} spawned, {result['workersLeaked']} leaked",
+    ]
+    lines += [f"  FAIL {failure}" for failure in result["failures"]] or ["  OK"]
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", 1)[0])
+    parser.add_argument("--files", type=int, default=300, help="conflicted .ts files in the repository")
+    parser.add_argument("--merges", type=int, default=20, help="git merges to run")
+    parser.add_argument("--parallel", type=int, default=4, help="git merges running at once")
+    parser.add_argument("--serve", action="store_true", help="merge through a semmerge serve")
+    parser.add_argument("--max-p95", type=float, default=0.0, help="fail when p95 latency exceeds SECONDS")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this JSON file")
+    parser.add_argument("--workdir", help="build the repositories here and keep them (default: a temp dir)")
+    args = parser.parse_args()
+
+    if args.workdir:
+        workdir = pathlib.Path(args.workdir).resolve()
+        workdir.mkdir(parents=True, exist_ok=False)
+        result = run(args, workdir)
+    else:
+        workdir = pathlib.Path(tempfile.mkdtemp(prefix="semmerge-stress-"))
+        try:
+            result = run(args, workdir)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    if args.json_path:
+        pathlib.Path(args.json_path).write_text(json.dumps(result, indent=2) + "\n")
+    print(report(result))
+    sys.exit(1 if result["failures"] else 0)
+
+
+if __name__ == "__main__":
+    main()
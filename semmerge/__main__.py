@@ -1,23 +1,18 @@
-"""Command line interface for the semantic merge engine."""
+"""Command line interface for the semantic merge engine.
+
+Only click is imported at module level. Each command imports what it needs
+when it runs (:mod:`semmerge.pipeline` for ``semdiff``/``semmerge``,
+:mod:`semmerge.server` for ``serve``), so ``--help`` and the merge driver
+start quickly; ``tests/test_startup.py`` holds the budget.
+"""
 from __future__ import annotations
 
-import json
-import pathlib
-import shutil
 import sys
-from typing import Iterable, Sequence
+from typing import ContextManager
 
 import click
 
-from .applier import apply_ops
-from .compose import compose_oplogs
-from .emitter import emit_files
-from .git_api import checkout_tree_to_temp, resolve_rev
-from .lang.ts.bridge import TSWorker
-from .loggingx import logger
-from .notes import notes_put
-from .ops import OpLog
-from .verify import typecheck_ts
+_PROFILE_HELP = "Write a profile of this run (Python and TypeScript worker) into a new bundle under DIR"
 
 
 @click.group()
@@ -25,25 +20,31 @@ def main() -> None:
     """Semantic merge entry point."""
 
 
-@main.command(help="Semantic diff: print op log between two revisions")
+def _profiled(profile_dir: str | None, *command: str) -> ContextManager[None]:
+    if profile_dir is None:
+        import contextlib
+
+        return contextlib.nullcontext()
+    from .profiling import capture
+
+    return capture(profile_dir, " ".join(command))
+
+
+@main.command(help="Semantic diff: print op log between two revisions, or a revision and the working tree")
 @click.argument("rev1")
-@click.argument("rev2")
+@click.argument("rev2", required=False)
 @click.option("--json-out", is_flag=True, default=False, help="Emit JSON instead of a pretty listing")
-def semdiff(rev1: str, rev2: str, json_out: bool) -> None:
-    worker = TSWorker()
-    merged_tree: pathlib.Path | None = None
-    base_tree = checkout_tree_to_temp(rev1)
-    right_tree = checkout_tree_to_temp(rev2)
-    try:
-        ops = worker.diff(base_tree, right_tree)
-    finally:
-        worker.close()
-        _cleanup_temp_dirs([base_tree, right_tree])
-    if json_out:
-        click.echo(json.dumps([op.to_dict() for op in ops], indent=2))
-    else:
-        for op in ops:
-            click.echo(op.pretty())
+@click.option("--worktree", is_flag=True, help="Diff REV1 against the working tree instead of REV2")
+@click.option("--profile", "profile_dir", metavar="DIR", type=click.Path(file_okay=False), help=_PROFILE_HELP)
+def semdiff(rev1: str, rev2: str | None, json_out: bool, worktree: bool, profile_dir: str | None) -> None:
+    if worktree and rev2 is not None:
+        raise click.UsageError("Pass either REV2 or --worktree, not both")
+    if not worktree and rev2 is None:
+        raise click.UsageError("Missing argument 'REV2' (or pass --worktree)")
+    from .pipeline import run_semdiff
+
+    with _profiled(profile_dir, "semdiff", rev1, rev2 or "--worktree"):
+        run_semdiff(rev1, rev2, json_out, worktree=worktree)
 
 
 @main.command(help="Semantic merge base A B into working tree")
@@ -52,72 +53,66 @@ def semdiff(rev1: str, rev2: str, json_out: bool) -> None:
 @click.argument("b")
 @click.option("--inplace", is_flag=True, help="Write the merge result into the current working tree")
 @click.option("--git", is_flag=True, help="Flag set when invoked via git merge driver")
-def semmerge(base: str, a: str, b: str, inplace: bool, git: bool) -> None:  # noqa: ARG001 - CLI signature
-    logger.info("Starting semantic merge base=%s A=%s B=%s", base, a, b)
-    worker = TSWorker()
-    base_tree = checkout_tree_to_temp(base)
-    left_tree = checkout_tree_to_temp(a)
-    right_tree = checkout_tree_to_temp(b)
-    merged_tree: pathlib.Path | None = None
-
-    try:
-        op_log_left, op_log_right, _symbol_maps = worker.build_and_diff(base_tree, left_tree, right_tree)
-        composed_ops, conflicts = compose_oplogs(op_log_left, op_log_right)
-
-        if conflicts:
-            _write_conflict_reports(conflicts)
-            sys.exit(1)
-
-        merged_tree = apply_ops(base_tree, composed_ops)
-        emit_files(merged_tree)
-        ok, diagnostics = typecheck_ts(merged_tree)
-        if not ok:
-            _report_type_errors(diagnostics)
-            sys.exit(2)
-
-        if inplace:
-            _copy_tree_into_cwd(merged_tree)
-
-        notes_put(resolve_rev(a), OpLog(op_log_left))
-        notes_put(resolve_rev(b), OpLog(op_log_right))
-        logger.info("Merge complete")
-    finally:
-        worker.close()
-        _cleanup_temp_dirs([base_tree, left_tree, right_tree])
-        if merged_tree is not None and not inplace:
-            _cleanup_temp_dirs([merged_tree])
-
-
-def _copy_tree_into_cwd(tmp_path: pathlib.Path) -> None:
-    tmp_path = pathlib.Path(tmp_path)
-    cwd = pathlib.Path.cwd()
-    for path in tmp_path.rglob("*"):
-        if path.is_file():
-            target = cwd / path.relative_to(tmp_path)
-            target.parent.mkdir(parents=True, exist_ok=True)
-            shutil.copy2(path, target)
-
-
-def _write_conflict_reports(conflicts: Sequence[object]) -> None:
-    out = pathlib.Path(".semmerge-conflicts.json")
-    payload = [conflict.to_dict() if hasattr(conflict, "to_dict") else conflict for conflict in conflicts]
-    out.write_text(json.dumps(payload, indent=2), encoding="utf-8")
-
-
-def _report_type_errors(diagnostics: Iterable[str]) -> None:
-    for line in diagnostics:
-        click.echo(line, err=True)
-
-
-def _cleanup_temp_dirs(paths: Iterable[pathlib.Path]) -> None:
-    for path in paths:
-        try:
-            shutil.rmtree(path)
-        except FileNotFoundError:
-            pass
-        except OSError:
-            # Ignore best-effort cleanup failures.
-            pass
+@click.option(
+    "--fast-path/--no-fast-path",
+    default=True,
+    help="Plan the merge first and run the semantic pipeline only on files changed on both sides",
+)
+@click.option(
+    "--incremental/--no-incremental",
+    default=True,
+    help="Rebuild only what changed since an earlier merge of the same base and A",
+)
+@click.option(
+    "--conflicts-json",
+    is_flag=True,
+    help="Also write conflicts to .semmerge-conflicts.json as one JSON document",
+)
+@click.option("--profile", "profile_dir", metavar="DIR", type=click.Path(file_okay=False), help=_PROFILE_HELP)
+def semmerge(  # noqa: ARG001 - CLI signature
+    base: str,
+    a: str,
+    b: str,
+    inplace: bool,
+    git: bool,
+    fast_path: bool = True,
+    incremental: bool = True,
+    conflicts_json: bool = False,
+    profile_dir: str | None = None,
+) -> None:
+    from .pipeline import run_semmerge
+
+    with _profiled(profile_dir, "semmerge", base, a, b):
+        code = run_semmerge(
+            base, a, b, inplace, fast_path=fast_path, incremental=incremental, conflicts_json=conflicts_json
+        )
+    if code:
+        sys.exit(code)
+
+
+@main.command(help="Serve merge and semdiff jobs over a local HTTP API")
+@click.option(
+    "--socket",
+    "socket_path",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Listen on this Unix socket (default: a per-user socket the merge driver finds on its own)",
+)
+@click.option("--host", default="127.0.0.1", show_default=True, help="Address to bind with --port")
+@click.option("--port", default=None, type=int, help="Listen on loopback TCP instead of a Unix socket")
+@click.option(
+    "--jobs",
+    default=2,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Jobs run concurrently; jobs for one repository always run one at a time",
+)
+def serve(socket_path: str | None, host: str, port: int | None, jobs: int) -> None:
+    from .server import default_socket, serve as serve_jobs
+
+    if socket_path is None and port is None:
+        socket_path = default_socket()
+    serve_jobs(socket_path=socket_path, host=host, port=port or 0, workers=jobs)
 
 
 if __name__ == "__main__":  # pragma: no cover
@@ -1,38 +1,214 @@
-"""Apply semantic operations to a working tree."""
+"""Apply semantic operations to a working tree.
+
+``renameSymbol`` ops produced by the TypeScript worker carry a reference index
+(``params["references"]``: base-tree spans of every identifier that resolves
+to the renamed declaration). Those spans are collected across all renames and
+applied in one pass per file, so only files that actually mention a renamed
+symbol are opened. Ops without references fall back to a whole-word
+substitution in the declaring file.
+"""
 from __future__ import annotations
 
 import pathlib
 import re
 import shutil
 import tempfile
-from typing import Iterable
+from typing import Callable, Dict, Iterable, List, Mapping, Set, Tuple
 
 from .loggingx import logger
 from .ops import Op
 
+_PATH_PARAMS = ("file", "oldFile", "newFile", "oldPath", "newPath")
+_ASTRAL_RE = re.compile("[\U00010000-\U0010FFFF]")
+
+# (start, end, expected text, replacement) in worker (UTF-16) offsets.
+SpanEdit = Tuple[int, int, str, str]
+
+
+def apply_ops(
+    base_tree: pathlib.Path,
+    ops: Iterable[Op],
+    on_file: Callable[[pathlib.Path, pathlib.Path], None] | None = None,
+    reset: Mapping[str, bytes | None] | None = None,
+) -> pathlib.Path:
+    """Apply *ops* onto a copy of *base_tree* and return the merged tree path.
 
-def apply_ops(base_tree: pathlib.Path, ops: Iterable[Op]) -> pathlib.Path:
-    """Apply *ops* onto a copy of *base_tree* and return the merged tree path."""
+    *on_file* is called with the merged tree and the absolute path of every
+    file the ops touch as soon as the last op touching it has been applied,
+    so callers can start post-processing (formatting) while later ops are
+    still running.
+
+    *reset* overwrites files of the copy before any op runs (``None``
+    deletes); re-merges use it to restore base content into a previously
+    merged tree.
+    """
 
     base_tree = pathlib.Path(base_tree)
     out = pathlib.Path(tempfile.mkdtemp(prefix="semmerge_merged_"))
     shutil.copytree(base_tree, out, dirs_exist_ok=True)
+    for rel, data in (reset or {}).items():
+        target = out / _normalize_relpath(rel)
+        if data is None:
+            target.unlink(missing_ok=True)
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(data)
+
+    ops = list(ops)
+    last_touch: Dict[str, int] = {}
+    moves: Dict[str, str] = {}
+    for index, op in enumerate(ops):
+        for rel in touched_paths(op):
+            # Reference spans name base paths; attribute them to wherever the file is by then.
+            last_touch[_follow_moves(moves, rel)] = index
+        _record_move(moves, op)
+    done_at: Dict[int, List[str]] = {}
+    for rel, index in last_touch.items():
+        done_at.setdefault(index, []).append(rel)
 
-    for op in ops:
-        if op.type == "moveDecl":
-            _apply_move_decl(out, op)
-        elif op.type == "renameSymbol":
-            _apply_rename_symbol(out, op)
-        elif op.type == "modifyImport":
-            _apply_modify_import(out, op)
-        elif op.type == "moveFile":
-            _apply_move_file(out, op)
+    edits = _RenameEdits(out)
+    for index, op in enumerate(ops):
+        if op.type == "renameSymbol" and op.params.get("references") is not None:
+            edits.add(op)
         else:
-            logger.debug("No applier hook for op %s", op.type)
+            # Pending span edits are in base coordinates: land them before anything else rewrites the file.
+            for rel in touched_paths(op):
+                edits.flush(rel)
+            _apply_op(out, op)
+            _record_move(edits.moves, op)
+        for rel in done_at.get(index, []):
+            edits.flush(rel)
+            path = out / rel
+            if on_file is not None and path.is_file():
+                on_file(out, path)
+    edits.flush_all()
 
     return out
 
 
+def touched_paths(op: Op) -> Set[str]:
+    """Return the relative paths *op* reads or writes."""
+
+    paths = {str(op.params[key]) for key in _PATH_PARAMS if op.params.get(key)}
+    for ref in op.params.get("references") or ():
+        paths.add(str(ref["file"]))
+    return paths
+
+
+class _RenameEdits:
+    """Reference-span edits of ``renameSymbol`` ops, batched per file."""
+
+    def __init__(self, root: pathlib.Path) -> None:
+        self.root = root
+        self.pending: Dict[str, List[SpanEdit]] = {}
+        # Base path -> current path, for files moved by earlier ops.
+        self.moves: Dict[str, str] = {}
+
+    def add(self, op: Op) -> None:
+        old_name = str(op.params.get("oldName") or "")
+        new_name = str(op.params.get("newName") or "")
+        if not old_name or not new_name:
+            return
+        for ref in op.params["references"]:
+            # ``{ foo }`` must keep its property key when the variable is renamed.
+            replacement = f"{old_name}: {new_name}" if ref.get("shorthand") else new_name
+            edit = (int(ref["start"]), int(ref["end"]), old_name, replacement)
+            self.pending.setdefault(_follow_moves(self.moves, str(ref["file"])), []).append(edit)
+
+    def flush(self, rel: str) -> None:
+        """Apply pending edits for *rel*, wherever the file has been moved to."""
+
+        current = _follow_moves(self.moves, rel)
+        edits = self.pending.pop(current, None)
+        if edits:
+            apply_span_edits(self.root / current, edits)
+
+    def flush_all(self) -> None:
+        for rel in list(self.pending):
+            self.flush(rel)
+
+
+def _record_move(moves: Dict[str, str], op: Op) -> None:
+    if op.type == "moveDecl":
+        src, dst = op.params.get("oldFile"), op.params.get("newFile")
+    elif op.type == "moveFile":
+        src, dst = op.params.get("oldPath"), op.params.get("newPath")
+    else:
+        return
+    if src and dst:
+        moves[_normalize_relpath(src).as_posix()] = _normalize_relpath(dst).as_posix()
+
+
+def _follow_moves(moves: Mapping[str, str], rel: str) -> str:
+    rel = _normalize_relpath(rel).as_posix()
+    seen: Set[str] = set()
+    while rel in moves and rel not in seen:
+        seen.add(rel)
+        rel = moves[rel]
+    return rel
+
+
+def apply_span_edits(path: pathlib.Path, edits: Iterable[SpanEdit]) -> int:
+    """Rewrite *path* with *edits* in a single pass; return how many were applied.
+
+    Offsets are UTF-16 code units as reported by the worker. An edit whose
+    span no longer holds its expected text, or that overlaps one already
+    applied, is skipped.
+    """
+
+    if not path.is_file():
+        logger.debug("rename references target missing: %s", path)
+        return 0
+    # Keep line endings untouched: offsets count "\r\n" as two units.
+    with path.open(encoding="utf-8", newline="") as fh:
+        code = fh.read()
+    index = utf16_index(code)
+    pieces: List[str] = []
+    applied = 0
+    last = len(code)
+    for start, end, expected, replacement in sorted(set(edits), reverse=True):
+        if index is not None:
+            start, end = index.get(start, -1), index.get(end, -1)
+        if start < 0 or end > last or code[start:end] != expected:
+            logger.debug("stale rename reference %s:%d-%d", path, start, end)
+            continue
+        pieces.append(code[end:last])
+        pieces.append(replacement)
+        last = start
+        applied += 1
+    pieces.append(code[:last])
+    with path.open("w", encoding="utf-8", newline="") as fh:
+        fh.write("".join(reversed(pieces)))
+    return applied
+
+
+def utf16_index(code: str) -> Mapping[int, int] | None:
+    """Map UTF-16 offsets to string indices, or ``None`` when they coincide."""
+
+    if not _ASTRAL_RE.search(code):
+        return None
+    index: Dict[int, int] = {}
+    units = 0
+    for position, char in enumerate(code):
+        index[units] = position
+        units += 2 if ord(char) > 0xFFFF else 1
+    index[units] = len(code)
+    return index
+
+
+def _apply_op(out: pathlib.Path, op: Op) -> None:
+    if op.type == "moveDecl":
+        _apply_move_decl(out, op)
+    elif op.type == "renameSymbol":
+        _apply_rename_symbol(out, op)
+    elif op.type == "modifyImport":
+        _apply_modify_import(out, op)
+    elif op.type == "moveFile":
+        _apply_move_file(out, op)
+    else:
+        logger.debug("No applier hook for op %s", op.type)
+
+
 def _apply_move_decl(root: pathlib.Path, op: Op) -> None:
     old_file = op.params.get("oldFile") or op.params.get("file")
     new_file = op.params.get("newFile") or op.params.get("file")
@@ -0,0 +1,157 @@
+"""Language backends other than TypeScript, and the scheduler that runs them.
+
+Every enabled ``[languages.<name>]`` section other than ``typescript`` names
+a backend: ``backend = "..."`` (a key of :data:`BACKENDS` or a
+``module:attribute`` path), defaulting to the section name. Its
+``project_globs`` claim files; a file claimed by several languages goes to
+the first in name order, and TypeScript/JavaScript sources always stay with
+the TypeScript worker.
+
+A backend is a class whose instances provide::
+
+    build_and_diff(base_tree, left_tree, right_tree, paths) -> (left_ops, right_ops)
+
+where *paths* are the repository-relative files it was given. Each backend
+runs in its own process (see :class:`BackendScheduler`), concurrently with
+the TypeScript worker and with each other. Results are combined in language
+name order, so the composed sequence does not depend on which backend
+finished first. The applier cannot replay backend ops: they take part in
+composition (and so in conflict reports) only, while the content of the
+files they cover comes from Git's text merge (see :mod:`semmerge.planner`).
+"""
+from __future__ import annotations
+
+import asyncio
+import importlib
+import multiprocessing
+import pathlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Tuple
+
+from .config import Config, LanguageConfig
+from .fileset import FileSelector, glob_matcher
+from .lang.ts.bridge import SOURCE_SUFFIXES
+from .loggingx import logger
+from .ops import Op
+
+# Backend name -> ``module:attribute`` of its worker class; imported in the backend's process only.
+# The Java and C# bridges are placeholders that cannot merge anything yet, so they are not registered.
+BACKENDS: Dict[str, str] = {
+    "echo": "semmerge.lang.echo.bridge:EchoWorker",
+}
+# Handled by the TypeScript worker in the orchestrator itself.
+_BUILTIN = "typescript"
+
+
+class BackendScheduler:
+    """Partition files among the enabled backends and run them side by side.
+
+    Raises :class:`ValueError` for an enabled section whose backend is not
+    registered, before any merge work starts.
+    """
+
+    def __init__(self, languages: Mapping[str, LanguageConfig], ignored: Callable[[str], bool] | None = None) -> None:
+        self.specs: Dict[str, str] = {}
+        self._claims: List[Tuple[str, Callable[[str], bool]]] = []
+        for name in sorted(languages):
+            lang = languages[name]
+            if name == _BUILTIN or not lang.enabled:
+                continue
+            spec = BACKENDS.get(lang.backend or name, lang.backend or name)
+            if ":" not in spec:
+                raise ValueError(
+                    f"Unknown language backend {spec!r} for [languages.{name}]: use one of "
+                    f"{', '.join(sorted(BACKENDS))} or a module:Class path, or disable the section"
+                )
+            self.specs[name] = spec
+            if not lang.project_globs:
+                logger.debug("Backend %s has no project_globs and claims no files", name)
+            self._claims.append((name, glob_matcher(lang.project_globs)))
+        self._ignored = ignored or (lambda path: False)
+
+    @staticmethod
+    def from_config(config: Config) -> "BackendScheduler":
+        return BackendScheduler(config.languages, ignored=FileSelector.from_config(config).ignored)
+
+    @property
+    def languages(self) -> List[str]:
+        """Enabled languages besides TypeScript, in name order."""
+
+        return list(self.specs)
+
+    def partition(self, paths: Iterable[str]) -> Dict[str, List[str]]:
+        """Return ``{language: sorted paths}`` for the *paths* some backend claims."""
+
+        parts: Dict[str, List[str]] = {}
+        if not self._claims:
+            return parts
+        for path in sorted(set(paths)):
+            if pathlib.PurePosixPath(path).suffix in SOURCE_SUFFIXES or self._ignored(path):
+                continue
+            for name, claims in self._claims:
+                if claims(path):
+                    parts.setdefault(name, []).append(path)
+                    break
+        return parts
+
+    async def run(self, trees: Mapping[str, pathlib.Path], parts: Mapping[str, List[str]]) -> Tuple[List[Op], List[Op]]:
+        """Run ``build_and_diff`` of every backend in *parts*, each in its own process.
+
+        *trees* maps ``base``/``left``/``right`` to checkouts containing the
+        partitioned files. Returns the concatenated left and right op logs.
+        """
+
+        jobs = [(name, paths) for name, paths in sorted(parts.items()) if paths]
+        if not jobs:
+            return [], []
+        for name, paths in jobs:
+            logger.info("%s backend: %d files", name, len(paths))
+        loop = asyncio.get_running_loop()
+        context = multiprocessing.get_context("spawn")
+        # One single-process pool per backend: a shared pool could run two backends in one process.
+        pools = [ProcessPoolExecutor(max_workers=1, mp_context=context) for _job in jobs]
+        try:
+            futures = [
+                loop.run_in_executor(
+                    pool,
+                    _run_backend,
+                    self.specs[name],
+                    str(trees["base"]),
+                    str(trees["left"]),
+                    str(trees["right"]),
+                    paths,
+                )
+                for pool, (name, paths) in zip(pools, jobs)
+            ]
+            results = await asyncio.gather(*futures, return_exceptions=True)
+        finally:
+            for pool in pools:
+                pool.shutdown(wait=False, cancel_futures=True)
+        left: List[Op] = []
+        right: List[Op] = []
+        for (name, _paths), result in zip(jobs, results):
+            if isinstance(result, BaseException):
+                raise RuntimeError(f"{name} backend failed: {result}") from result
+            left.extend(Op.from_dict(item) for item in result[0])
+            right.extend(Op.from_dict(item) for item in result[1])
+        return left, right
+
+
+def load_backend(spec: str) -> Any:
+    """Import the worker class named by *spec* (a :data:`BACKENDS` key or ``module:attribute``)."""
+
+    spec = BACKENDS.get(spec, spec)
+    module_name, _, attribute = spec.partition(":")
+    if not attribute:
+        raise ValueError(f"Unknown language backend {spec!r}")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def _run_backend(
+    spec: str, base: str, left: str, right: str, paths: List[str]
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Entry point in the backend's process; ops travel back as plain dicts."""
+
+    worker = load_backend(spec)()
+    ops_left, ops_right = worker.build_and_diff(pathlib.Path(base), pathlib.Path(left), pathlib.Path(right), paths)
+    return [op.to_dict() for op in ops_left], [op.to_dict() for op in ops_right]
@@ -0,0 +1,101 @@
+"""Client for ``semmerge serve``.
+
+The merge driver runs once per conflicted file, so this module imports only
+the small part of the standard library it needs: no click, no pipeline, no
+HTTP server.
+"""
+from __future__ import annotations
+
+import http.client
+import json
+import os
+import socket
+from typing import Any, Callable, Dict, List
+
+
+class Unavailable(OSError):
+    """No service answered at the address; nothing was submitted."""
+
+
+def default_socket() -> str:
+    """Per-user socket ``semmerge serve`` listens on without ``--socket`` or ``--port``."""
+
+    runtime = os.environ.get("XDG_RUNTIME_DIR") or os.environ.get("TMPDIR") or "/tmp"
+    user = os.getuid() if hasattr(os, "getuid") else os.environ.get("USERNAME", "user")
+    return os.path.join(runtime, f"semmerge-{user}.sock")
+
+
+def discover() -> str | None:
+    """Return the address of a service to use: ``SEMMERGE_SERVER``, else the default socket if present."""
+
+    configured = os.environ.get("SEMMERGE_SERVER")
+    if configured:
+        return configured
+    path = default_socket()
+    return f"unix:{path}" if os.path.exists(path) else None
+
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float | None = None) -> None:
+        super().__init__("localhost", timeout=timeout)
+        self._path = path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self._path)
+
+
+def connect(address: str, timeout: float | None = None) -> http.client.HTTPConnection:
+    """Open a connection to *address*: ``unix:/path/to.sock`` or ``http://host:port``."""
+
+    if address.startswith("unix:"):
+        return _UnixConnection(address[len("unix:") :], timeout=timeout)
+    hostport = address.split("://", 1)[-1].rstrip("/")
+    return http.client.HTTPConnection(hostport, timeout=timeout)
+
+
+def run_remote(
+    address: str,
+    command: str,
+    repo: str,
+    args: List[str],
+    priority: int = 0,
+    on_event: Callable[[Dict[str, Any]], None] | None = None,
+) -> int:
+    """Submit a job to the service at *address*, follow it, and return its exit code.
+
+    Raises :class:`Unavailable` when the service cannot be reached, so
+    callers can run the command themselves instead.
+    """
+
+    conn = connect(address)
+    try:
+        try:
+            conn.connect()
+        except OSError as exc:
+            raise Unavailable(f"no semmerge service at {address}: {exc}") from exc
+        body = json.dumps({"command": command, "repo": repo, "args": args, "priority": priority})
+        conn.request("POST", "/jobs", body=body, headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        payload = json.loads(response.read() or b"{}")
+        if response.status != 202:
+            raise RuntimeError(f"semmerge serve rejected the job: {payload.get('error', response.status)}")
+    finally:
+        conn.close()
+
+    conn = connect(address)
+    try:
+        conn.request("GET", f"/jobs/{payload['id']}/events")
+        response = conn.getresponse()
+        finished: Dict[str, Any] = {}
+        for line in response:
+            event = json.loads(line)
+            if on_event is not None:
+                on_event(event)
+            if event.get("event") == "finished":
+                finished = event
+    finally:
+        conn.close()
+    if finished.get("state") != "done":
+        raise RuntimeError(f"semmerge serve job failed: {finished.get('error', 'stream ended early')}")
+    return int(finished.get("exitCode") or 0)
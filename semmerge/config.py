@@ -14,6 +14,9 @@ if importlib.util.find_spec("tomllib") is not None:  # pragma: no cover - depend
 else:  # pragma: no cover - exercised on Python < 3.11
     tomllib = importlib.import_module("tomli")
 
+# How the TypeScript worker derives symbol identities (see ``sast.IndexMode`` in the worker).
+INDEX_MODES = ("syntax", "tiered", "full")
+
 
 @dataclass
 class CoreConfig:
@@ -22,6 +25,9 @@ class CoreConfig:
     deterministic_seed: str = "auto"
     memory_cap_mb: int = 4096
     formatter: str | None = None
+    tree_cache_mb: int = 2048
+    worker_timeout_s: float = 900.0
+    time_budget_s: float = 0.0
 
 
 @dataclass
@@ -31,6 +37,11 @@ class LanguageConfig:
     enabled: bool = False
     project_globs: list[str] = field(default_factory=list)
     formatter_cmd: list[str] | None = None
+    index_mode: str = "tiered"
+    max_file_kb: int = 512
+    generated_markers: list[str] = field(default_factory=lambda: ["@generated", "DO NOT EDIT", "<auto-generated"])
+    max_line_length: int = 2000
+    backend: str | None = None
 
 
 @dataclass
@@ -75,6 +86,9 @@ def load_config(start: pathlib.Path | None = None) -> Config:
         deterministic_seed=str(core_data.get("deterministic_seed", config.core.deterministic_seed)),
         memory_cap_mb=int(core_data.get("memory_cap_mb", config.core.memory_cap_mb)),
         formatter=core_data.get("formatter", config.core.formatter),
+        tree_cache_mb=int(core_data.get("tree_cache_mb", config.core.tree_cache_mb)),
+        worker_timeout_s=float(core_data.get("worker_timeout_s", config.core.worker_timeout_s)),
+        time_budget_s=float(core_data.get("time_budget_s", config.core.time_budget_s)),
     )
 
     languages: Dict[str, LanguageConfig] = {}
@@ -83,6 +97,13 @@ def load_config(start: pathlib.Path | None = None) -> Config:
             enabled=bool(ldata.get("enabled", False)),
             project_globs=list(_as_str_seq(ldata.get("project_globs", []))),
             formatter_cmd=list(_as_str_seq(ldata.get("formatter_cmd", []))) or None,
+            index_mode=_index_mode(lang, ldata.get("index_mode", "tiered")),
+            max_file_kb=int(ldata.get("max_file_kb", 512)),
+            generated_markers=list(
+                _as_str_seq(ldata.get("generated_markers", LanguageConfig().generated_markers))
+            ),
+            max_line_length=int(ldata.get("max_line_length", 2000)),
+            backend=str(ldata["backend"]) if ldata.get("backend") else None,
         )
     config.languages = languages
 
@@ -105,6 +126,13 @@ def _find_config(start: pathlib.Path) -> pathlib.Path | None:
     return None
 
 
+def _index_mode(lang: str, value: Any) -> str:
+    mode = str(value)
+    if mode not in INDEX_MODES:
+        raise ValueError(f"Unknown index_mode {mode!r} for language {lang!r}; expected one of {', '.join(INDEX_MODES)}")
+    return mode
+
+
 def _as_str_seq(value: Any) -> Iterable[str]:
     if isinstance(value, (list, tuple)):
         for item in value:
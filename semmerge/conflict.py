@@ -1,11 +1,37 @@
-"""Conflict modelling helpers."""
+"""Conflict modelling helpers and conflict reports.
+
+Conflicts are created with an empty ``minimalSlice``. The slice (the base
+declaration of the conflicting symbol) is only cut when a report is written
+(:func:`with_slices`): conflicts are grouped by file, and each file is
+memory-mapped and read once however many conflicts it holds.
+
+Reports are streamed as NDJSON, one conflict per line, to
+:data:`CONFLICTS_NDJSON`. The single indented JSON document of earlier
+releases, :data:`CONFLICTS_JSON`, is written only on request.
+"""
 from __future__ import annotations
 
+import json
+import mmap
+import os
+import pathlib
+from collections import defaultdict
 from dataclasses import dataclass
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
+import orjson
+
+from .applier import utf16_index
 from .ops import Op
 
+CONFLICTS_NDJSON = ".semmerge-conflicts.ndjson"
+CONFLICTS_JSON = ".semmerge-conflicts.json"
+
+# Base declaration of a symbol: (path, start, end) in worker (UTF-16) offsets.
+# Looked up by base address: symbol ids hash the signature shape and collide.
+SymbolRange = Tuple[str, int, int]
+Locate = Callable[[str], Optional[SymbolRange]]
+
 
 @dataclass
 class Conflict:
@@ -34,11 +60,13 @@ class Conflict:
 def conflict_divergent_rename(op_a: Op, op_b: Op) -> Conflict:
     """Create a DivergentRename conflict payload."""
 
+    # Both logs target base declarations, so matching addresses name the base one.
+    base = op_a.target.addressId if op_a.target.addressId == op_b.target.addressId else None
     return Conflict(
         id=f"conf-{op_a.id[:8]}-{op_b.id[:8]}",
         category="DivergentRename",
         symbolId=op_a.target.symbolId,
-        addressIds={"A": op_a.target.addressId, "B": op_b.target.addressId, "base": None},
+        addressIds={"A": op_a.target.addressId, "B": op_b.target.addressId, "base": base},
         opA=op_a.to_dict(),
         opB=op_b.to_dict(),
         minimalSlice={"path": "", "start": 0, "end": 0, "code": ""},
@@ -47,3 +75,119 @@ def conflict_divergent_rename(op_a: Op, op_b: Op) -> Conflict:
             {"id": "keepB", "label": f"Rename to {op_b.params.get('newName')}", "ops": [op_b.id]},
         ],
     )
+
+
+def conflict_text_merge(path: str) -> Conflict:
+    """Create a TextConflict payload for a non-source file Git could not merge cleanly."""
+
+    return Conflict(
+        id=f"conf-text-{path}",
+        category="TextConflict",
+        symbolId="",
+        addressIds={"A": None, "B": None, "base": None},
+        opA={},
+        opB={},
+        minimalSlice={"path": path, "start": 0, "end": 0, "code": ""},
+        suggestions=[{"id": "resolveText", "label": f"Resolve conflict markers in {path}", "ops": []}],
+    )
+
+
+def conflict_opaque(path: str, reason: str = "") -> Conflict:
+    """Create an OpaqueConflict payload for a large/generated file changed on both sides."""
+
+    detail = f" ({reason})" if reason else ""
+    return Conflict(
+        id=f"conf-opaque-{path}",
+        category="OpaqueConflict",
+        symbolId="",
+        addressIds={"A": None, "B": None, "base": None},
+        opA={},
+        opB={},
+        minimalSlice={"path": path, "start": 0, "end": 0, "code": ""},
+        suggestions=[
+            {"id": "keepA", "label": f"Keep A's version of {path}{detail}", "ops": []},
+            {"id": "keepB", "label": f"Keep B's version of {path}{detail}", "ops": []},
+        ],
+    )
+
+
+def with_slices(
+    conflicts: Iterable[Conflict], tree: pathlib.Path | None, locate: Locate | None
+) -> Iterator[Dict[str, Any]]:
+    """Yield the payload of every conflict, with the minimal slice cut from *tree*.
+
+    *locate* maps a base address id to the range of its declaration in
+    *tree*. Conflicts without a base address, or whose address it cannot
+    locate, are yielded first, unchanged;
+    the rest follow grouped by file.
+    """
+
+    if tree is None or locate is None:
+        yield from (conflict.to_dict() for conflict in conflicts)
+        return
+    by_file: Dict[str, List[Tuple[Conflict, int, int]]] = defaultdict(list)
+    for conflict in conflicts:
+        address = conflict.addressIds.get("base")
+        located = locate(address) if address else None
+        if located is None:
+            yield conflict.to_dict()
+            continue
+        path, start, end = located
+        by_file[path].append((conflict, start, end))
+    for path, spans in sorted(by_file.items()):
+        code = _read_spans(tree / path, [(start, end) for _, start, end in spans])
+        for conflict, start, end in spans:
+            payload = conflict.to_dict()
+            payload["minimalSlice"] = {"path": path, "start": start, "end": end, "code": code.get((start, end), "")}
+            yield payload
+
+
+def write_reports(
+    conflicts: Iterable[Conflict],
+    directory: pathlib.Path,
+    tree: pathlib.Path | None = None,
+    locate: Locate | None = None,
+    json_copy: bool = False,
+) -> int:
+    """Stream the conflict report into *directory* and return the number of conflicts written.
+
+    With *json_copy*, :data:`CONFLICTS_JSON` is written too; otherwise a
+    stale copy from an earlier merge is removed.
+    """
+
+    kept: List[Dict[str, Any]] = []
+    count = 0
+    with (directory / CONFLICTS_NDJSON).open("wb") as fh:
+        for payload in with_slices(conflicts, tree, locate):
+            fh.write(orjson.dumps(payload) + b"\n")
+            count += 1
+            if json_copy:
+                kept.append(payload)
+    legacy = directory / CONFLICTS_JSON
+    if json_copy:
+        legacy.write_text(json.dumps(kept, indent=2), encoding="utf-8")
+    else:
+        legacy.unlink(missing_ok=True)
+    return count
+
+
+def _read_spans(path: pathlib.Path, spans: List[Tuple[int, int]]) -> Dict[Tuple[int, int], str]:
+    """Text of each ``(start, end)`` span of *path*; spans that cannot be read are left out."""
+
+    try:
+        with path.open("rb") as fh:
+            size = os.fstat(fh.fileno()).st_size
+            if not size:
+                return {}
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                # A UTF-16 code unit takes at most three UTF-8 bytes: read no further than the last span needs.
+                text = mapped[: min(size, 3 * max(end for _, end in spans))].decode("utf-8", "replace")
+    except OSError:
+        return {}
+    index = utf16_index(text)
+    slices: Dict[Tuple[int, int], str] = {}
+    for start, end in spans:
+        lo, hi = (start, end) if index is None else (index.get(start, -1), index.get(end, -1))
+        if 0 <= lo <= hi <= len(text):
+            slices[(start, end)] = text[lo:hi]
+    return slices
@@ -3,17 +3,24 @@ from __future__ import annotations
 
 import pathlib
 import subprocess
+from typing import Iterable
 
 from .loggingx import logger
 
 
-def emit_files(tree_path: pathlib.Path) -> None:
-    """Format files in *tree_path* using Prettier when available."""
+def emit_files(tree_path: pathlib.Path, paths: Iterable[pathlib.Path] | None = None) -> None:
+    """Format files in *tree_path* using Prettier when available.
+
+    When *paths* is given only those files are formatted.
+    """
 
     tree_path = pathlib.Path(tree_path)
+    targets = ["."] if paths is None else [str(path) for path in paths]
+    if not targets:
+        return
     try:
         subprocess.run(
-            ["npx", "prettier", "--write", "."],
+            ["npx", "prettier", "--write", *targets],
             cwd=tree_path,
             check=True,
             stdout=subprocess.DEVNULL,
@@ -0,0 +1,308 @@
+"""Select the files a language backend should see.
+
+File lists come from Git (``ls-tree``, or the index and ``ls-files`` for the
+working tree) rather than from walking a checkout.
+They are filtered by:
+
+* source suffix (see :data:`SOURCE_SUFFIXES`);
+* ``.semmergeignore`` at the repository root (gitignore syntax; ``node_modules``
+  is always ignored);
+* ``project_globs`` from ``.semmerge.toml``. Globs naming ``*.json`` files
+  locate TypeScript projects, whose ``files``/``include``/``exclude`` decide
+  membership; any other glob selects source files directly.
+
+All patterns are compiled to regular expressions once per selector.
+"""
+from __future__ import annotations
+
+import json
+import posixpath
+import re
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import Callable, Dict, Iterable, List, Mapping, Pattern, Sequence, Tuple
+
+from .config import Config, LanguageConfig
+from .git_api import read_blobs
+from .lang.ts.bridge import SOURCE_SUFFIXES
+from .loggingx import logger
+
+IGNORE_FILE = ".semmergeignore"
+_DEFAULT_IGNORES = ("node_modules/",)
+# tsc's own defaults when a tsconfig has no ``exclude``.
+_TSCONFIG_DEFAULT_EXCLUDES = ("node_modules", "bower_components", "jspm_packages")
+
+ReadFiles = Callable[[List[str]], Mapping[str, bytes | None]]
+
+
+@dataclass
+class FileSelection:
+    """Files chosen for a backend, plus how many were skipped and why."""
+
+    included: List[str] = field(default_factory=list)
+    skipped: Dict[str, int] = field(default_factory=dict)
+
+    def skip(self, reason: str) -> None:
+        self.skipped[reason] = self.skipped.get(reason, 0) + 1
+
+    def summary(self) -> str:
+        total = sum(self.skipped.values())
+        reasons = ", ".join(f"{count} {reason}" for reason, count in sorted(self.skipped.items()))
+        return f"{len(self.included)} included, {total} skipped" + (f" ({reasons})" if reasons else "")
+
+
+@dataclass
+class _Project:
+    root: str
+    files: frozenset[str]
+    include: Pattern[str] | None
+    exclude: Pattern[str] | None
+
+    def contains(self, path: str) -> bool:
+        if path in self.files:
+            return True
+        if self.root:
+            if not path.startswith(self.root + "/"):
+                return False
+            path = path[len(self.root) + 1 :]
+        if self.include is None or not self.include.fullmatch(path):
+            return False
+        return self.exclude is None or not self.exclude.fullmatch(path)
+
+
+class FileSelector:
+    """Precompiled suffix, ignore and project filters."""
+
+    def __init__(
+        self,
+        project_globs: Sequence[str] = (),
+        ignore_patterns: Sequence[str] = (),
+        suffixes: Iterable[str] = SOURCE_SUFFIXES,
+    ) -> None:
+        self.suffixes = frozenset(suffixes)
+        self._ignores = [_compile_ignore(p) for p in (*_DEFAULT_IGNORES, *ignore_patterns)]
+        project_patterns = [g for g in project_globs if g.endswith(".json")]
+        source_patterns = [g for g in project_globs if not g.endswith(".json")]
+        self._project_files = _compile_globs(project_patterns)
+        self._sources = _compile_globs(source_patterns)
+
+    @staticmethod
+    def from_config(config: Config, language: str = "typescript") -> "FileSelector":
+        """Build the selector for *language* from ``.semmerge.toml`` and ``.semmergeignore``."""
+
+        lang = config.languages.get(language, LanguageConfig())
+        ignore_path = Path(config.root) / IGNORE_FILE
+        patterns: List[str] = []
+        if ignore_path.is_file():
+            patterns = ignore_path.read_text(encoding="utf-8").splitlines()
+        return FileSelector(project_globs=lang.project_globs, ignore_patterns=patterns)
+
+    def select(
+        self,
+        listing: Iterable[str],
+        read: ReadFiles | None = None,
+        candidates: Iterable[str] | None = None,
+    ) -> FileSelection:
+        """Filter *candidates* (default: all of *listing*).
+
+        *listing* is every path in the tree and is used to discover project
+        files, which are loaded through *read*.
+        """
+
+        listing = list(listing)
+        projects = self._projects(listing, read) if self._project_files is not None and read else None
+        selection = FileSelection()
+        for path in listing if candidates is None else candidates:
+            if PurePosixPath(path).suffix not in self.suffixes:
+                selection.skip("non-source")
+            elif self.ignored(path):
+                selection.skip("ignored")
+            elif not self._in_scope(path, projects):
+                selection.skip("outside project")
+            else:
+                selection.included.append(path)
+        return selection
+
+    def ignored(self, path: str) -> bool:
+        ignored = False
+        for negate, pattern in self._ignores:
+            if pattern.search(path):
+                ignored = not negate
+        return ignored
+
+    def _in_scope(self, path: str, projects: List[_Project] | None) -> bool:
+        if self._project_files is None and self._sources is None:
+            return True
+        if self._sources is not None and self._sources.fullmatch(path):
+            return True
+        if projects is None:
+            return False
+        if not projects:
+            # Project globs that match nothing would hide every file; fall back to the whole tree.
+            return True
+        return any(project.contains(path) for project in projects)
+
+    def _projects(self, listing: List[str], read: ReadFiles) -> List[_Project]:
+        assert self._project_files is not None
+        configs = [path for path in listing if self._project_files.fullmatch(path)]
+        if not configs:
+            logger.debug("No project files match project_globs; selecting the whole tree")
+            return []
+        projects = []
+        for path, data in read(configs).items():
+            if data is None:
+                continue
+            try:
+                projects.append(_parse_tsconfig(path, data))
+            except ValueError as exc:
+                logger.warning("Ignoring unreadable project file %s: %s", path, exc)
+        return projects
+
+
+def glob_matcher(patterns: Sequence[str]) -> Callable[[str], bool]:
+    """Return a predicate matching whole paths against *patterns* (same syntax as ``project_globs``)."""
+
+    compiled = _compile_globs(patterns)
+    if compiled is None:
+        return lambda path: False
+    return lambda path: compiled.fullmatch(path) is not None
+
+
+def select_tree_files(selector: FileSelector, rev: str, listing: Iterable[str]) -> FileSelection:
+    """Select files of revision *rev* given its path *listing*."""
+
+    return selector.select(listing, read=lambda paths: read_blobs(rev, paths))
+
+
+def select_worktree_files(selector: FileSelector, root: Path, listing: Iterable[str]) -> FileSelection:
+    """Select files of the working tree at *root* given its path *listing* (as from ``git ls-files``)."""
+
+    return selector.select(listing, read=lambda paths: {path: _read_file(root / path) for path in paths})
+
+
+def _read_file(path: Path) -> bytes | None:
+    try:
+        return path.read_bytes()
+    except OSError:
+        return None
+
+
+def _parse_tsconfig(path: str, data: bytes) -> _Project:
+    config = json.loads(_strip_jsonc(data.decode("utf-8-sig")))
+    if not isinstance(config, dict):
+        raise ValueError("not an object")
+    root = posixpath.dirname(path)
+    files = frozenset(_join(root, f) for f in config.get("files", []) or [])
+    include = config.get("include")
+    if include is None:
+        include = [] if files else ["**/*"]
+    exclude = config.get("exclude")
+    if exclude is None:
+        out_dir = (config.get("compilerOptions") or {}).get("outDir")
+        exclude = [*_TSCONFIG_DEFAULT_EXCLUDES, *([out_dir] if out_dir else [])]
+    return _Project(
+        root=root,
+        files=files,
+        include=_compile_globs([_tsconfig_pattern(p) for p in include]),
+        exclude=_compile_globs([_tsconfig_pattern(p) for p in exclude]),
+    )
+
+
+def _tsconfig_pattern(pattern: str) -> str:
+    pattern = posixpath.normpath(pattern)
+    if pattern == ".":
+        return "**/*"
+    # A pattern without wildcards or extension names a directory (tsc semantics).
+    last = pattern.rsplit("/", 1)[-1]
+    if not any(ch in last for ch in "*?") and "." not in last:
+        return pattern + "/**/*"
+    return pattern
+
+
+def _join(root: str, rel: str) -> str:
+    return posixpath.normpath(posixpath.join(root, rel)) if root else posixpath.normpath(rel)
+
+
+def _strip_jsonc(text: str) -> str:
+    """Remove comments and trailing commas from tsconfig-style JSON."""
+
+    out: List[str] = []
+    i, n = 0, len(text)
+    while i < n:
+        ch = text[i]
+        if ch == '"':
+            j = i + 1
+            while j < n and text[j] != '"':
+                j += 2 if text[j] == "\\" else 1
+            out.append(text[i : j + 1])
+            i = j + 1
+        elif text.startswith("//", i):
+            i = text.find("\n", i)
+            i = n if i < 0 else i
+        elif text.startswith("/*", i):
+            i = text.find("*/", i + 2)
+            i = n if i < 0 else i + 2
+        else:
+            out.append(ch)
+            i += 1
+    return re.sub(r",(\s*[}\]])", r"\1", "".join(out))
+
+
+def _compile_globs(patterns: Sequence[str]) -> Pattern[str] | None:
+    """Compile path globs (``**``, ``*``, ``?``, ``[...]``) into one anchored regex."""
+
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{_glob_regex(p)})" for p in patterns))
+
+
+def _compile_ignore(pattern: str) -> Tuple[bool, Pattern[str]]:
+    """Compile one gitignore-style line into ``(negated, regex)``; ``search`` matches paths."""
+
+    line = pattern.strip()
+    if not line or line.startswith("#"):
+        return False, re.compile(r"(?!)")
+    negate = line.startswith("!")
+    line = line[1:] if negate else line
+    directory = line.endswith("/")
+    line = line.rstrip("/")
+    anchored = "/" in line
+    body = _glob_regex(line.lstrip("/"))
+    prefix = "^" if anchored else r"(?:^|/)"
+    # Matching a directory also matches everything below it.
+    suffix = "/" if directory else r"(?:/|$)"
+    return negate, re.compile(prefix + body + suffix)
+
+
+def _glob_regex(pattern: str) -> str:
+    out: List[str] = []
+    i, n = 0, len(pattern)
+    while i < n:
+        ch = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append(r"(?:[^/]*/)*")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(r".*")
+            i += 2
+        elif ch == "*":
+            out.append(r"[^/]*")
+            i += 1
+        elif ch == "?":
+            out.append(r"[^/]")
+            i += 1
+        elif ch == "[":
+            end = pattern.find("]", i + 1)
+            if end < 0:
+                out.append(re.escape(ch))
+                i += 1
+            else:
+                body = pattern[i + 1 : end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append(f"[{body}]")
+                i = end + 1
+        else:
+            out.append(re.escape(ch))
+            i += 1
+    return "".join(out)
@@ -1,10 +1,14 @@
 """Git helper utilities."""
 from __future__ import annotations
 
+import os
 import pathlib
+import re
 import subprocess
 import tempfile
-from typing import Iterable
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+_FULL_OID = re.compile(r"[0-9a-f]{40}(?:[0-9a-f]{24})?")
 
 
 def run_git(args: Iterable[str]) -> str:
@@ -17,7 +21,25 @@ def run_git(args: Iterable[str]) -> str:
 def resolve_rev(rev: str) -> str:
     """Resolve *rev* to a full commit hash."""
 
-    return run_git(["rev-parse", rev])
+    return resolve_revs([rev])[0]
+
+
+def resolve_revs(revs: Sequence[str]) -> List[str]:
+    """Resolve several revisions with at most one ``git rev-parse``.
+
+    Full object names are returned as-is (``rev-parse`` would echo them
+    unchanged anyway), so already-resolved commits cost no process.
+    """
+
+    pending = [rev for rev in dict.fromkeys(revs) if not _FULL_OID.fullmatch(rev)]
+    resolved = dict(zip(pending, run_git(["rev-parse", *pending]).splitlines())) if pending else {}
+    return [resolved.get(rev, rev) for rev in revs]
+
+
+def git_dir() -> pathlib.Path:
+    """Return the absolute path of the repository's common ``.git`` directory."""
+
+    return pathlib.Path(run_git(["rev-parse", "--git-common-dir"])).resolve()
 
 
 def checkout_tree_to_temp(rev: str) -> pathlib.Path:
@@ -33,8 +55,181 @@ def checkout_tree_to_temp(rev: str) -> pathlib.Path:
     return tmpdir
 
 
+def checkout_paths_to_temp(rev: str, paths: Iterable[str]) -> pathlib.Path:
+    """Materialize only *paths* of ``rev`` into a temporary directory.
+
+    Paths that do not exist in ``rev`` are skipped.
+    """
+
+    tmpdir = pathlib.Path(tempfile.mkdtemp(prefix="semmerge_tree_"))
+    for path, data in read_blobs(rev, paths).items():
+        if data is None:
+            continue
+        target = tmpdir / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(data)
+    return tmpdir
+
+
 def changed_files_between(rev1: str, rev2: str) -> list[str]:
-    """Return the set of files that differ between two revisions."""
+    """Return the set of files that differ between two revisions.
 
-    out = run_git(["diff", "--name-only", f"{rev1}..{rev2}"])
+    Renames are reported as a deletion of the old path and an addition of the
+    new one so callers see every path that was touched.
+    """
+
+    out = run_git(["diff", "--name-only", "--no-renames", f"{rev1}..{rev2}"])
     return [line for line in out.splitlines() if line]
+
+
+def list_tree(rev: str) -> Dict[str, str]:
+    """Return ``{path: blob_oid}`` for every file in ``rev``."""
+
+    return {path: oid for path, (_mode, oid) in list_tree_entries(rev).items()}
+
+
+def list_tree_entries(rev: str) -> Dict[str, Tuple[str, str]]:
+    """Return ``{path: (mode, blob_oid)}`` for every file in ``rev``."""
+
+    out = subprocess.run(
+        ["git", "ls-tree", "-r", "-z", "--full-tree", rev], check=True, stdout=subprocess.PIPE
+    ).stdout.decode("utf-8", "surrogateescape")
+    entries: Dict[str, Tuple[str, str]] = {}
+    for record in out.split("\0"):
+        if not record:
+            continue
+        meta, path = record.split("\t", 1)
+        mode, kind, oid = meta.split()
+        if kind == "blob":
+            entries[path] = (mode, oid)
+    return entries
+
+
+def worktree_root() -> pathlib.Path:
+    """Return the top-level directory of the current working tree."""
+
+    return pathlib.Path(run_git(["rev-parse", "--show-toplevel"]))
+
+
+def worktree_changes(rev: str, root: pathlib.Path) -> Tuple[List[str], List[str]]:
+    """Return ``(changed, removed)``: how the working tree at *root* differs from ``rev``.
+
+    Tracked files are compared through the stat information cached in the
+    index (``git diff-index``), so unmodified files are neither read nor
+    hashed. A file whose stat information is stale counts as changed even
+    when its content is not, which only costs reading it. Untracked files
+    that are not ignored are changed; files of ``rev`` that are gone are
+    removed.
+    """
+
+    def records(*args: str) -> List[str]:
+        out = subprocess.run(["git", "-C", str(root), *args], check=True, stdout=subprocess.PIPE).stdout
+        return [record for record in out.decode("utf-8", "surrogateescape").split("\0") if record]
+
+    status = records("diff-index", "-z", "--name-status", "--no-renames", rev, "--")
+    changed = [path for kind, path in zip(status[::2], status[1::2]) if kind != "D"]
+    changed += records("ls-files", "-z", "--others", "--exclude-standard", "--full-name")
+    present = set(changed)
+    removed = [path for kind, path in zip(status[::2], status[1::2]) if kind == "D" and path not in present]
+    return changed, removed
+
+
+def read_blobs(rev: str, paths: Iterable[str]) -> Dict[str, bytes | None]:
+    """Read ``rev:path`` for every path through a single ``git cat-file --batch``.
+
+    Paths missing from ``rev`` map to ``None``.
+    """
+
+    wanted = list(dict.fromkeys(paths))
+    if not wanted:
+        return {}
+    request = "".join(f"{rev}:{path}\n" for path in wanted).encode("utf-8")
+    proc = subprocess.run(["git", "cat-file", "--batch"], input=request, check=True, stdout=subprocess.PIPE)
+    out = proc.stdout
+    blobs: Dict[str, bytes | None] = {}
+    pos = 0
+    for path in wanted:
+        eol = out.index(b"\n", pos)
+        header = out[pos:eol].split()
+        pos = eol + 1
+        if len(header) < 3 or header[-1] == b"missing":
+            blobs[path] = None
+            continue
+        size = int(header[2])
+        blobs[path] = out[pos : pos + size]
+        pos += size + 1
+    return blobs
+
+
+def blob_sizes(rev: str, paths: Iterable[str]) -> Dict[str, int | None]:
+    """Return the size of ``rev:path`` for every path without reading contents."""
+
+    wanted = list(dict.fromkeys(paths))
+    if not wanted:
+        return {}
+    request = "".join(f"{rev}:{path}\n" for path in wanted).encode("utf-8")
+    proc = subprocess.run(["git", "cat-file", "--batch-check"], input=request, check=True, stdout=subprocess.PIPE)
+    sizes: Dict[str, int | None] = {}
+    for path, line in zip(wanted, proc.stdout.decode("utf-8", "surrogateescape").splitlines()):
+        header = line.split()
+        sizes[path] = int(header[2]) if len(header) >= 3 and header[-1] != "missing" else None
+    return sizes
+
+
+def grep_files(rev: str, needles: Iterable[str]) -> List[str]:
+    """Return paths of ``rev`` containing any of *needles* (fixed strings), without a checkout."""
+
+    args: List[str] = []
+    for needle in needles:
+        args += ["-e", needle]
+    if not args:
+        return []
+    proc = subprocess.run(
+        ["git", "grep", "-l", "-z", "-F", *args, rev, "--"], stdout=subprocess.PIPE, check=False
+    )
+    if proc.returncode not in (0, 1):
+        raise subprocess.CalledProcessError(proc.returncode, "git grep")
+    prefix = f"{rev}:"
+    return [
+        record[len(prefix) :] if record.startswith(prefix) else record
+        for record in proc.stdout.decode("utf-8", "surrogateescape").split("\0")
+        if record
+    ]
+
+
+def write_tree(start: str, root: pathlib.Path, paths: Iterable[str]) -> str:
+    """Write ``start`` with *paths* replaced by their content under *root* as a tree object.
+
+    Paths missing under *root* are removed. Only *paths* are hashed, and a
+    private index is used, so the repository's own index is untouched.
+    """
+
+    root = pathlib.Path(root)
+    paths = sorted(set(paths))
+    present = [path for path in paths if (root / path).is_file()]
+    with tempfile.TemporaryDirectory(prefix="semmerge_index_") as tmp:
+        env = {**os.environ, "GIT_INDEX_FILE": str(pathlib.Path(tmp) / "index")}
+        subprocess.run(["git", "read-tree", start], check=True, env=env)
+        oids: List[str] = []
+        if present:
+            oids = subprocess.run(
+                ["git", "hash-object", "-w", "--stdin-paths"],
+                input="".join(f"{root / path}\n" for path in present),
+                check=True,
+                stdout=subprocess.PIPE,
+                text=True,
+            ).stdout.split()
+        blobs = dict(zip(present, oids))
+        info = []
+        for path in paths:
+            if path in blobs:
+                mode = "100755" if os.access(root / path, os.X_OK) else "100644"
+                info.append(f"{mode} {blobs[path]}\t{path}\n")
+            else:
+                # Mode 0 removes the entry.
+                info.append(f"0 {'0' * 40}\t{path}\n")
+        if info:
+            subprocess.run(["git", "update-index", "--index-info"], input="".join(info), check=True, text=True, env=env)
+        return subprocess.run(
+            ["git", "write-tree"], check=True, stdout=subprocess.PIPE, text=True, env=env
+        ).stdout.strip()
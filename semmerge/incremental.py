@@ -0,0 +1,238 @@
+"""Incremental re-merge when the right-hand side gains commits.
+
+A merge queue often re-runs ``semmerge base A B'`` after ``B`` gained a
+commit. After every merge that ran the semantic pipeline
+:class:`MergeStateStore` records the op logs, the composed sequence and the
+merged tree (written into the object database) under
+``.git/semmerge/merges/``. A planned merge's logs only cover its semantic
+files, so its state is only reused while ``B → B'`` stays within them. A
+later merge of the same ``base`` and ``A`` can then:
+
+1. diff only the source files changed ``B → B'`` (plus the files the old
+   right-hand ops tied to them) against ``base``;
+2. replace the right-hand ops for those files and compose again;
+3. reset and re-apply only the files whose composed ops changed, starting
+   from the stored merged tree;
+4. type-check only those files and the files importing them.
+
+Anything that cannot be reconciled from that scope, such as a new rename or
+move (whose references reach other files), changed project configuration,
+or large/generated files, falls back to merging from scratch.
+"""
+from __future__ import annotations
+
+import os
+import pathlib
+import posixpath
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Mapping, Set, Tuple
+
+import orjson
+
+from .applier import touched_paths
+from .git_api import git_dir, grep_files, list_tree, read_blobs
+from .loggingx import logger
+from .ops import Op
+from .planner import imported_paths
+
+# Re-merge state kept per (base, A) pair.
+_STATES_KEPT = 32
+# Changes to these files can change which files the backend sees.
+_CONFIG_FILES = frozenset({".semmerge.toml", ".semmergeignore"})
+# Ops whose effect reaches beyond the files they name, or that relocate files.
+_STRUCTURAL = frozenset({"renameSymbol", "moveDecl", "moveFile"})
+
+
+@dataclass
+class MergeState:
+    """Everything a later re-merge of the same ``base`` and ``left`` reuses."""
+
+    base: str
+    left: str
+    right: str
+    index_mode: str
+    merged_tree: str
+    left_ops: List[Op] = field(default_factory=list)
+    right_ops: List[Op] = field(default_factory=list)
+    composed: List[Op] = field(default_factory=list)
+    # Paths the op logs cover (a planned merge's semantic files); ``None`` for the whole tree.
+    scope: List[str] | None = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "base": self.base,
+            "left": self.left,
+            "right": self.right,
+            "indexMode": self.index_mode,
+            "mergedTree": self.merged_tree,
+            "leftOps": [op.to_dict() for op in self.left_ops],
+            "rightOps": [op.to_dict() for op in self.right_ops],
+            "composed": [op.to_dict() for op in self.composed],
+            "scope": self.scope,
+        }
+
+    @staticmethod
+    def from_dict(data: Mapping[str, Any]) -> "MergeState":
+        return MergeState(
+            base=str(data["base"]),
+            left=str(data["left"]),
+            right=str(data["right"]),
+            index_mode=str(data["indexMode"]),
+            merged_tree=str(data["mergedTree"]),
+            left_ops=[Op.from_dict(item) for item in data.get("leftOps", [])],
+            right_ops=[Op.from_dict(item) for item in data.get("rightOps", [])],
+            composed=[Op.from_dict(item) for item in data.get("composed", [])],
+            scope=None if data.get("scope") is None else [str(path) for path in data["scope"]],
+        )
+
+
+class MergeStateStore:
+    """JSON files under ``.git/semmerge/merges/``, one per ``(base, left, index mode)``."""
+
+    def __init__(self, root: pathlib.Path) -> None:
+        self.root = pathlib.Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def for_repo() -> "MergeStateStore":
+        return MergeStateStore(git_dir() / "semmerge" / "merges")
+
+    def load(self, base: str, left: str, index_mode: str) -> MergeState | None:
+        path = self._path(base, left, index_mode)
+        try:
+            return MergeState.from_dict(orjson.loads(path.read_bytes()))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            logger.debug("Ignoring unreadable merge state %s: %s", path, exc)
+            return None
+
+    def save(self, state: MergeState) -> None:
+        path = self._path(state.base, state.left, state.index_mode)
+        staged = path.with_name(f".tmp-{path.name}-{os.getpid()}")
+        staged.write_bytes(orjson.dumps(state.to_dict()))
+        os.replace(staged, path)
+        states = sorted(self.root.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+        for stale in states[_STATES_KEPT:]:
+            stale.unlink(missing_ok=True)
+
+    def _path(self, base: str, left: str, index_mode: str) -> pathlib.Path:
+        return self.root / f"{base}-{left}-{index_mode}.json"
+
+
+def rediff_scope(state: MergeState, changed: Iterable[str], selected: Iterable[str]) -> Set[str] | None:
+    """Return the files to re-diff for a right side whose *changed* paths are known.
+
+    *selected* are the changed paths the backend sees. The scope also covers
+    every file an old right-hand op touching them names, so a replaced op
+    never leaves half of its effect behind. ``None`` means merging from
+    scratch, as does any path outside a planned merge's :attr:`MergeState.scope`.
+    """
+
+    changed = list(changed)
+    config = [path for path in changed if path in _CONFIG_FILES or path.endswith(".json")]
+    if config:
+        logger.info("Incremental re-merge: configuration changed (%s)", ", ".join(sorted(config)))
+        return None
+    scope = _close_over(state.right_ops, set(selected))
+    if state.scope is not None:
+        outside = (set(changed) | scope) - set(state.scope)
+        if outside:
+            logger.info("Incremental re-merge: %d paths are outside the earlier planned merge", len(outside))
+            return None
+    return scope
+
+
+def rebase_right_ops(state: MergeState, scope: Set[str], delta: Iterable[Op]) -> List[Op] | None:
+    """Replace the old right-hand ops within *scope* by *delta* (re-diffed ``base → B'``)."""
+
+    previous = {_signature(op): op for op in state.right_ops}
+    ops = [op for op in state.right_ops if not touched_paths(op) & scope]
+    for op in delta:
+        if not touched_paths(op) <= scope:
+            logger.info("Incremental re-merge: %s reaches beyond the changed files", op.type)
+            return None
+        known = previous.get(_signature(op))
+        if known is not None:
+            # Keep the earlier op: it carries the reference index the re-diff does not compute.
+            ops.append(known)
+        elif op.type in _STRUCTURAL:
+            logger.info("Incremental re-merge: new %s", op.type)
+            return None
+        else:
+            ops.append(op)
+    return ops
+
+
+def affected_paths(previous: Iterable[Op], composed: Iterable[Op]) -> Set[str] | None:
+    """Return the files whose merged content must be rebuilt, or ``None`` for a full merge.
+
+    These are the files touched by ops that differ between the two composed
+    sequences, closed over every op touching any of them.
+    """
+
+    previous, composed = list(previous), list(composed)
+    before = Counter(_signature(op) for op in previous)
+    after = Counter(_signature(op) for op in composed)
+    changed = [op for op in composed if after[_signature(op)] > before[_signature(op)]]
+    changed += [op for op in previous if before[_signature(op)] > after[_signature(op)]]
+    affected: Set[str] = set()
+    for op in changed:
+        affected |= touched_paths(op)
+    affected = _close_over([*composed, *previous], affected)
+    for op in composed:
+        if touched_paths(op) & affected and _relocates(op):
+            logger.info("Incremental re-merge: %s in the affected files", op.type)
+            return None
+    return affected
+
+
+def importers(tree: str, targets: Set[str], known: Set[str]) -> Set[str]:
+    """Return files of *tree* that import any of *targets* through a relative path."""
+
+    if not targets:
+        return set()
+    stems = sorted({posixpath.splitext(posixpath.basename(path))[0] for path in targets})
+    candidates = grep_files(tree, stems)
+    found: Set[str] = set()
+    for path, data in read_blobs(tree, candidates).items():
+        if data is not None and imported_paths(path, data, known) & targets:
+            found.add(path)
+    return found - targets
+
+
+def verify_scope(tree: str, affected: Set[str], suffixes: Iterable[str]) -> List[str]:
+    """Source files to type-check after rebuilding *affected* files of *tree*."""
+
+    known = set(list_tree(tree))
+    suffixes = tuple(suffixes)
+    present = {path for path in affected if path in known}
+    return sorted(p for p in present | importers(tree, present, known) if p.endswith(suffixes))
+
+
+def _close_over(ops: Iterable[Op], paths: Set[str]) -> Set[str]:
+    ops = [(op, touched_paths(op)) for op in ops]
+    paths = set(paths)
+    grown = True
+    while grown:
+        grown = False
+        for _op, touched in ops:
+            if touched & paths and not touched <= paths:
+                paths |= touched
+                grown = True
+    return paths
+
+
+def _relocates(op: Op) -> bool:
+    if op.type == "moveDecl":
+        file = op.params.get("file")
+        return (op.params.get("oldFile") or file) != (op.params.get("newFile") or file)
+    return op.type == "moveFile"
+
+
+def _signature(op: Op) -> Tuple[str, str, str | None, bytes]:
+    """Identity of an op's effect, ignoring its id, provenance and reference index."""
+
+    params = {key: value for key, value in op.params.items() if key not in ("references", "confidence")}
+    return op.type, op.target.symbolId, op.target.addressId, orjson.dumps(params, option=orjson.OPT_SORT_KEYS)
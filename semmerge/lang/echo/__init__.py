@@ -0,0 +1 @@
+"""Echo backend for exercising the backend scheduler."""
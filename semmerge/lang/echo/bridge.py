@@ -0,0 +1,53 @@
+"""Echo backend: reports whole-file changes without parsing anything.
+
+It stands in for a real compiler frontend when testing the backend
+scheduler: every file that differs from the base becomes one ``addDecl``,
+``deleteDecl`` or ``editStmtBlock`` op on a file-level target. Op ids are
+derived from the side and path, so repeated runs produce identical logs.
+The ``pid`` in each op's provenance shows which process produced it.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import pathlib
+from typing import Iterable, List, Tuple
+
+from ...ops import Op, Target
+
+
+class EchoWorker:
+    def build_and_diff(
+        self, base_tree: pathlib.Path, left_tree: pathlib.Path, right_tree: pathlib.Path, paths: Iterable[str]
+    ) -> Tuple[List[Op], List[Op]]:
+        paths = sorted(paths)
+        return _diff("left", base_tree, left_tree, paths), _diff("right", base_tree, right_tree, paths)
+
+
+def _diff(side: str, base_tree: pathlib.Path, tree: pathlib.Path, paths: List[str]) -> List[Op]:
+    ops: List[Op] = []
+    for path in paths:
+        before, after = _read(base_tree / path), _read(tree / path)
+        if before == after:
+            continue
+        op_type = "addDecl" if before is None else "deleteDecl" if after is None else "editStmtBlock"
+        ops.append(
+            Op(
+                id=hashlib.sha1(f"{side}:{path}".encode()).hexdigest(),
+                schemaVersion=1,
+                type=op_type,
+                target=Target(hashlib.sha1(path.encode()).hexdigest()[:16], f"{path}::file"),
+                params={"file": path},
+                guards={},
+                effects={},
+                provenance={"backend": "echo", "pid": os.getpid()},
+            )
+        )
+    return ops
+
+
+def _read(path: pathlib.Path) -> bytes | None:
+    try:
+        return path.read_bytes()
+    except FileNotFoundError:
+        return None
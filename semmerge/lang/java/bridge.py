@@ -2,7 +2,7 @@
 
 
 class JavaWorker:
-    def build_and_diff(self, base_tree, left_tree, right_tree):
+    def build_and_diff(self, base_tree, left_tree, right_tree, paths):
         raise NotImplementedError(
             "Enable the Java backend by integrating a compiler frontend and exposing the protocol over stdio"
         )
@@ -1,59 +1,177 @@
 """Bridge between Python and the TypeScript worker."""
 from __future__ import annotations
 
+import hashlib
 import json
+import os
 import pathlib
+import shutil
 import subprocess
-from typing import Dict, Iterable, List, Tuple
+import threading
+from typing import TYPE_CHECKING, Dict, Iterable, List, Sequence, Set, Tuple
 
+from ... import profiling
 from ...loggingx import logger
 from ...ops import Op
+from .rpc import RpcClient
+
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    from ...progress import TimeBudget
+    from ...symindex import SymbolIndex
+    from .rpc import ProgressCallback
+
+
+SOURCE_SUFFIXES = frozenset({".ts", ".tsx", ".js", ".jsx"})
+
+# Files per ``addFiles`` notification when streaming a snapshot.
+_STREAM_CHUNK = 64
 
 
 class TSWorker:
-    """Wrapper around the Node.js TypeScript worker."""
+    """Wrapper around the Node.js TypeScript worker.
 
-    def __init__(self) -> None:
+    Requests go through a multiplexed :class:`~semmerge.lang.ts.rpc.RpcClient`,
+    so the methods below may be called from several threads at once. Each
+    request is cancelled in the worker and fails with
+    :class:`~semmerge.lang.ts.rpc.RpcTimeout` after *timeout* seconds
+    (``None``: no deadline).
+    """
+
+    def __init__(self, index_mode: str = "tiered", timeout: float | None = None) -> None:
         self._root = pathlib.Path(__file__).resolve().parents[3]
+        self.index_mode = index_mode
+        self.timeout = timeout
         self._proc: subprocess.Popen[str] | None = None
-        self._msg_id = 0
+        self._client: RpcClient | None = None
+        self._spawn_lock = threading.Lock()
+        # Started with profiling flags: stop by closing stdin so Node writes the profiles.
+        self._profiled = False
+        self._streamed: Dict[pathlib.Path, Tuple[str, Set[str], Dict[str, object] | None]] = {}
+
+    def start(self) -> None:
+        """Spawn the worker now so Node startup overlaps the caller's own I/O."""
+
+        self._ensure_proc()
+
+    def stream_snapshot(
+        self,
+        name: str,
+        tree: pathlib.Path,
+        paths: Iterable[str] | None = None,
+        removed: Sequence[str] | None = None,
+    ) -> None:
+        """Send the source files of *tree* to the worker ahead of the request using it.
+
+        Files go out in ``addFiles`` notifications while they are read, so the
+        worker parses them while later files (and other trees) are still being
+        read. *paths* (relative, normally a :class:`~semmerge.fileset.FileSelection`)
+        limits the snapshot to those files. Subsequent :meth:`build_and_diff`/
+        :meth:`diff` calls on the same *tree* refer to the streamed snapshot
+        instead of resending it. Safe to call from several threads at once.
+
+        With *removed*, the snapshot is an overlay on the base snapshot of the
+        :meth:`diff` using it: *paths* are only the files that differ from the
+        base, and *removed* are base files it does not have.
+        """
+
+        tree = pathlib.Path(tree)
+        ref = f"{name}:{tree}"
+        hashes: Set[str] = set()
+        chunk: List[Dict[str, str]] = []
+        for entry in self._iter_snapshot_files(tree, paths):
+            hashes.add(entry["hash"])
+            chunk.append(entry)
+            if len(chunk) >= _STREAM_CHUNK:
+                self._notify("addFiles", {"snapshot": ref, "files": chunk})
+                chunk = []
+        if chunk or not hashes:
+            # Even an empty snapshot must exist for the request to refer to it.
+            self._notify("addFiles", {"snapshot": ref, "files": chunk})
+        overlay = {"removed": list(removed)} if removed is not None else None
+        self._streamed[tree] = (ref, hashes, overlay)
+
+    @property
+    def has_pending_snapshots(self) -> bool:
+        """``True`` while streamed snapshots have not been consumed by a request."""
+
+        return bool(self._streamed)
+
+    @property
+    def stalled(self) -> bool:
+        """``True`` if a request was cancelled and the worker has not acknowledged it."""
+
+        return self._client is not None and self._client.stalled
 
     def build_and_diff(
         self,
         base_tree: pathlib.Path,
         left_tree: pathlib.Path,
         right_tree: pathlib.Path,
+        symbol_index: "SymbolIndex | None" = None,
+        progress: "ProgressCallback | None" = None,
+        budget: "TimeBudget | None" = None,
     ) -> Tuple[List[Op], List[Op], Dict[str, object]]:
-        result = self._rpc(
-            "buildAndDiff",
-            {
-                "base": self._snapshot(base_tree),
-                "left": self._snapshot(left_tree),
-                "right": self._snapshot(right_tree),
-                "config": {},
-            },
-        )
+        """Diff both sides against the base; returns both op logs and the symbol maps of all three trees.
+
+        *progress* receives the worker's progress events. With a *budget*,
+        the worker gets what is left of it and indexes syntax-only if it
+        would not fit; its timings and any such degradation are recorded in
+        *budget*.
+        """
+
+        hashes: Set[str] = set()
+        snapshots = {
+            "base": self._snapshot_param(base_tree, hashes),
+            "left": self._snapshot_param(left_tree, hashes),
+            "right": self._snapshot_param(right_tree, hashes),
+        }
+        config: Dict[str, object] = {"indexMode": self.index_mode}
+        remaining = budget.remaining() if budget is not None else None
+        if remaining is not None:
+            config["budgetMs"] = max(1, int(remaining * 1000))
+        params: Dict[str, object] = {**snapshots, "config": config}
+        if symbol_index is not None:
+            params["seed"] = symbol_index.seed(hashes)
+        result = self._rpc("buildAndDiff", params, progress)
+        if budget is not None:
+            budget.worker_report(result)
         return (
             [Op.from_dict(item) for item in result.get("opLogLeft", [])],
             [Op.from_dict(item) for item in result.get("opLogRight", [])],
             result.get("symbolMaps", {}),
         )
 
-    def diff(self, base_tree: pathlib.Path, right_tree: pathlib.Path) -> List[Op]:
+    def diff(
+        self, base_tree: pathlib.Path, right_tree: pathlib.Path, progress: "ProgressCallback | None" = None
+    ) -> List[Op]:
         result = self._rpc(
             "diff",
-            {"base": self._snapshot(base_tree), "right": self._snapshot(right_tree)},
+            {
+                "base": self._snapshot_param(base_tree, set()),
+                "right": self._snapshot_param(right_tree, set()),
+                "config": {"indexMode": self.index_mode},
+            },
+            progress,
         )
         return [Op.from_dict(item) for item in result.get("opLogRight", [])]
 
     def close(self) -> None:
+        if self._proc and self._proc.poll() is None and self._profiled and self._proc.stdin:
+            try:
+                self._proc.stdin.close()
+                self._proc.wait(timeout=profiling.WORKER_EXIT_S)
+            except (OSError, subprocess.TimeoutExpired):
+                logger.warning("TypeScript worker did not exit in time; its profile is lost")
         if self._proc and self._proc.poll() is None:
             self._proc.terminate()
             try:
                 self._proc.wait(timeout=2)
             except subprocess.TimeoutExpired:
                 self._proc.kill()
+        if self._client is not None:
+            self._client.close("TypeScript worker closed")
         self._proc = None
+        self._client = None
 
     def __del__(self) -> None:  # pragma: no cover - best effort cleanup
         try:
@@ -64,55 +182,131 @@ class TSWorker:
     # Internal helpers -------------------------------------------------
 
     def _snapshot(self, path: pathlib.Path) -> Dict[str, object]:
-        path = pathlib.Path(path)
-        files = []
-        for file in self._iter_ts_files(path):
-            rel = file.relative_to(path)
-            files.append({"path": rel.as_posix(), "content": file.read_text(encoding="utf-8")})
-        return {"files": files, "project": None}
+        return {"files": list(self._iter_snapshot_files(pathlib.Path(path))), "project": None}
 
-    def _iter_ts_files(self, root: pathlib.Path) -> Iterable[pathlib.Path]:
-        exts = {".ts", ".tsx", ".js", ".jsx"}
-        for path in root.rglob("*"):
-            if path.is_file() and path.suffix in exts:
-                yield path
-
-    def _rpc(self, method: str, params: Dict[str, object]) -> Dict[str, object]:
-        proc = self._ensure_proc()
-        self._msg_id += 1
-        message = json.dumps({"jsonrpc": "2.0", "id": self._msg_id, "method": method, "params": params})
-        assert proc.stdin and proc.stdout
-        proc.stdin.write(message + "\n")
-        proc.stdin.flush()
-        while True:
-            line = proc.stdout.readline()
-            if not line:
-                raise RuntimeError("TypeScript worker exited unexpectedly")
-            line = line.strip()
-            if not line:
+    def _snapshot_param(self, tree: pathlib.Path, hashes: Set[str]) -> Dict[str, object]:
+        """Return the snapshot for *tree*: a reference when it was streamed, else inline files."""
+
+        streamed = self._streamed.pop(pathlib.Path(tree), None)
+        if streamed is not None:
+            ref, streamed_hashes, overlay = streamed
+            hashes.update(streamed_hashes)
+            if overlay is not None:
+                return {"ref": ref, "project": None, "overlay": overlay}
+            return {"ref": ref, "project": None}
+        snapshot = self._snapshot(tree)
+        hashes.update(f["hash"] for f in snapshot["files"])  # type: ignore[union-attr]
+        return snapshot
+
+    def _iter_snapshot_files(self, root: pathlib.Path, paths: Iterable[str] | None = None) -> Iterable[Dict[str, str]]:
+        files = self._iter_ts_files(root) if paths is None else (root / rel for rel in paths)
+        for file in files:
+            try:
+                content = file.read_text(encoding="utf-8")
+            except FileNotFoundError:
                 continue
-            payload = json.loads(line)
-            if "error" in payload:
-                err = payload["error"]
-                raise RuntimeError(f"Worker error {err}")
-            return payload.get("result", {})
+            yield {"path": file.relative_to(root).as_posix(), "content": content, "hash": _content_hash(content)}
+
+    def _iter_ts_files(self, root: pathlib.Path) -> Iterable[pathlib.Path]:
+        """Walk *root* for source files; used only when no file list is supplied."""
+
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if d != "node_modules"]
+            for name in filenames:
+                if pathlib.PurePath(name).suffix in SOURCE_SUFFIXES:
+                    yield pathlib.Path(dirpath, name)
+
+    def _rpc(
+        self, method: str, params: Dict[str, object], progress: "ProgressCallback | None" = None
+    ) -> Dict[str, object]:
+        return self._ensure_client().call(method, params, self.timeout, on_progress=progress)
+
+    def _notify(self, method: str, params: Dict[str, object]) -> None:
+        """Send a JSON-RPC notification (no ``id``, no response)."""
+
+        self._ensure_client().notify(method, params)
+
+    def _ensure_client(self) -> RpcClient:
+        self._ensure_proc()
+        assert self._client is not None
+        return self._client
 
     def _ensure_proc(self) -> subprocess.Popen[str]:
-        if self._proc and self._proc.poll() is None:
-            return self._proc
-        worker_path = self._root / "workers" / "ts" / "dist" / "index.js"
-        if not worker_path.exists():
+        with self._spawn_lock:
+            if self._proc and self._proc.poll() is None:
+                return self._proc
+            return self._spawn()
+
+    def _spawn(self) -> subprocess.Popen[str]:
+        command = worker_command(self._root / "workers" / "ts" / "dist", shutil.which("node") or "node")
+        if command is None:
             raise RuntimeError(
                 "TypeScript worker not built. Run `npm --prefix workers/ts install` and "
                 "`npm --prefix workers/ts run build` first."
             )
-        logger.debug("Starting TypeScript worker at %s", worker_path)
+        flags = profiling.worker_flags()
+        command = [command[0], *flags, *command[1:]]
+        self._profiled = bool(flags)
+        logger.debug("Starting TypeScript worker: %s", " ".join(command))
         self._proc = subprocess.Popen(
-            ["node", str(worker_path)],
+            command,
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
             text=True,
             cwd=self._root,
         )
-        self._msg_id = 0
+        assert self._proc.stdin and self._proc.stdout
+        if self._client is not None:
+            self._client.close("TypeScript worker was restarted")
+        self._client = RpcClient(self._proc.stdin, self._proc.stdout, name="TypeScript worker")
+        self._streamed.clear()
         return self._proc
+
+
+def worker_command(dist: pathlib.Path, node: str) -> List[str] | None:
+    """Return the command that starts the worker built into *dist*, or ``None`` if it is not built.
+
+    Prefers the startup snapshot (``dist/snapshot/worker.blob``, written by
+    ``npm run build`` where Node supports it), which skips loading and
+    initialising TypeScript. A blob only loads in the Node binary that built
+    it, so it is used only when ``worker.json`` names *node*'s binary. It is
+    also used only while the ``dist/*.js`` it was built with are unchanged
+    (``worker.json`` records their hash); otherwise, or with
+    ``SEMMERGE_SNAPSHOT=0``, the worker starts from ``dist/index.js``.
+    """
+
+    entry = dist / "index.js"
+    blob = dist / "snapshot" / "worker.blob"
+    if os.environ.get("SEMMERGE_SNAPSHOT") != "0" and _snapshot_fits(blob, dist, node):
+        return [node, "--snapshot-blob", str(blob)]
+    return [node, str(entry)] if entry.exists() else None
+
+
+def _snapshot_fits(blob: pathlib.Path, dist: pathlib.Path, node: str) -> bool:
+    try:
+        meta = json.loads(blob.with_name("worker.json").read_text(encoding="utf-8"))
+        binary = os.path.realpath(node)
+        stat = os.stat(binary)
+        if meta.get("dist") != _dist_hash(dist):
+            logger.warning("Worker snapshot %s is stale (%s/*.js changed); rebuild it with npm run build", blob, dist)
+            return False
+    except (OSError, ValueError):
+        return False
+    return meta.get("node") == binary and meta.get("size") == stat.st_size and meta.get("mtime") == int(stat.st_mtime)
+
+
+def _dist_hash(dist: pathlib.Path) -> str:
+    """Hash the worker modules as ``scripts/build-snapshot.cjs`` does for ``worker.json``."""
+
+    digest = hashlib.sha256()
+    for path in sorted(dist.glob("*.js"), key=lambda path: path.name):
+        digest.update(path.name.encode("utf-8") + b"\0")
+        digest.update(path.read_bytes())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _content_hash(content: str) -> str:
+    """Hash file content the same way the worker does (``sast.hash``)."""
+
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
@@ -1,7 +1,7 @@
 """Typed structures for communicating with the TypeScript worker."""
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Any, Dict, List, Optional
 
 
@@ -9,6 +9,22 @@ from typing import Any, Dict, List, Optional
 class ProgramSnapshot:
     files: List[Dict[str, str]]
     project: Optional[str] = None
+    # {"removed": [...]}: *files* replace or add to the request's base snapshot.
+    overlay: Optional[Dict[str, List[str]]] = None
+
+
+@dataclass
+class SymbolEntry:
+    symbolId: str
+    addressId: str
+    kind: str
+    name: Optional[str]
+    file: str
+    start: int
+    end: int
+    fileHash: str
+    fingerprint: str
+    typeChecked: bool = False
 
 
 @dataclass
@@ -17,3 +33,7 @@ class BuildAndDiffResult:
     opLogRight: List[Dict[str, Any]]
     symbolMaps: Dict[str, Any]
     diagnostics: List[Dict[str, Any]]
+    indexMode: str = "tiered"
+    degraded: List[str] = field(default_factory=list)
+    timings: Dict[str, int] = field(default_factory=dict)
+    files: Dict[str, int] = field(default_factory=dict)
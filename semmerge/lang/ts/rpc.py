@@ -0,0 +1,223 @@
+"""Multiplexed JSON-RPC client for a worker speaking newline-delimited JSON over stdio.
+
+Any number of requests may be in flight at once: each carries its own id, and
+a reader thread hands every response to the request with that id, in
+whatever order the worker answers. Requests return
+:class:`concurrent.futures.Future` objects (:meth:`RpcClient.request`), so
+callers can pipeline them, block on one with a deadline (:meth:`RpcClient.call`)
+or await one from asyncio (:meth:`RpcClient.acall`).
+
+A request that misses its deadline or whose future is cancelled is cancelled
+in the worker too, with a ``$/cancelRequest`` notification; the worker stops
+it at its next checkpoint and answers with :data:`REQUEST_CANCELLED`. A
+cancellation that the worker never acknowledges means it is stuck (see
+:attr:`RpcClient.stalled`).
+
+While it works on a request, the worker may send ``$/progress``
+notifications naming the request's id; they go to the ``on_progress``
+callback given with the request, on the reader thread.
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import IO, Any, Callable, Dict, Set
+
+from ... import profiling
+from ...loggingx import logger
+
+# Error code of a request the worker stopped because it was cancelled (as in LSP).
+REQUEST_CANCELLED = -32800
+
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
+
+class RpcError(RuntimeError):
+    """The worker answered a request with a JSON-RPC error."""
+
+    def __init__(self, error: Dict[str, Any]) -> None:
+        super().__init__(f"Worker error {error}")
+        self.code = error.get("code")
+        self.message = error.get("message")
+
+
+class RpcTimeout(TimeoutError):
+    """A request missed its deadline and was cancelled."""
+
+
+class RpcClient:
+    """JSON-RPC 2.0 over a pair of text streams, with concurrent requests correlated by id."""
+
+    def __init__(self, stdin: IO[str], stdout: IO[str], name: str = "worker") -> None:
+        self.name = name
+        self._stdin = stdin
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, Future[Dict[str, Any]]] = {}
+        # Method of every request not answered yet, to account response payloads to it.
+        self._methods: Dict[int, str] = {}
+        self._progress: Dict[int, ProgressCallback] = {}
+        # Cancelled requests the worker has not answered yet.
+        self._cancelled: Set[int] = set()
+        self._lock = threading.Lock()
+        self._closed: str | None = None
+        self._reader = threading.Thread(target=self._read, args=(stdout,), name=f"{name}-rpc", daemon=True)
+        self._reader.start()
+
+    @property
+    def in_flight(self) -> int:
+        """Requests sent and not yet answered or cancelled."""
+
+        return len(self._pending)
+
+    @property
+    def stalled(self) -> bool:
+        """``True`` if a cancelled request has not been acknowledged: the worker is probably stuck."""
+
+        return bool(self._cancelled)
+
+    def request(
+        self, method: str, params: Dict[str, Any], on_progress: ProgressCallback | None = None
+    ) -> Future[Dict[str, Any]]:
+        """Send a request and return a future for its result; cancelling the future cancels the request."""
+
+        future: Future[Dict[str, Any]] = Future()
+        with self._lock:
+            if self._closed is not None:
+                raise RuntimeError(self._closed)
+            msg_id = next(self._ids)
+            self._pending[msg_id] = future
+            self._methods[msg_id] = method
+            if on_progress is not None:
+                self._progress[msg_id] = on_progress
+            try:
+                self._write({"jsonrpc": "2.0", "id": msg_id, "method": method, "params": params})
+            except OSError as exc:
+                del self._pending[msg_id]
+                del self._methods[msg_id]
+                self._progress.pop(msg_id, None)
+                raise RuntimeError(f"{self.name} exited unexpectedly") from exc
+        future.add_done_callback(lambda done: self._finished(msg_id, done))
+        return future
+
+    def call(
+        self,
+        method: str,
+        params: Dict[str, Any],
+        timeout: float | None = None,
+        on_progress: ProgressCallback | None = None,
+    ) -> Dict[str, Any]:
+        """Send a request and wait for its result, cancelling it if *timeout* seconds pass first."""
+
+        future = self.request(method, params, on_progress)
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise RpcTimeout(f"{self.name}: {method} did not finish within {timeout:g}s") from None
+
+    async def acall(
+        self,
+        method: str,
+        params: Dict[str, Any],
+        timeout: float | None = None,
+        on_progress: ProgressCallback | None = None,
+    ) -> Dict[str, Any]:
+        """Like :meth:`call`, awaitable; cancelling the awaiting task cancels the request."""
+
+        future = self.request(method, params, on_progress)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            raise RpcTimeout(f"{self.name}: {method} did not finish within {timeout:g}s") from None
+
+    def notify(self, method: str, params: Dict[str, Any]) -> None:
+        """Send a notification (no ``id``, no response)."""
+
+        with self._lock:
+            if self._closed is not None:
+                raise RuntimeError(self._closed)
+            try:
+                self._write({"jsonrpc": "2.0", "method": method, "params": params})
+            except OSError as exc:
+                raise RuntimeError(f"{self.name} exited unexpectedly") from exc
+
+    def close(self, reason: str = "connection closed") -> None:
+        """Fail every pending request with *reason*; later requests raise immediately."""
+
+        with self._lock:
+            if self._closed is None:
+                self._closed = reason
+            pending = list(self._pending.values())
+            self._pending.clear()
+            self._methods.clear()
+            self._progress.clear()
+            self._cancelled.clear()
+        for future in pending:
+            if not future.done():
+                future.set_exception(RuntimeError(reason))
+
+    # Internal helpers -------------------------------------------------
+
+    def _write(self, message: Dict[str, Any]) -> None:
+        line = json.dumps(message) + "\n"
+        self._stdin.write(line)
+        self._stdin.flush()
+        profiling.rpc_payload(message["method"], "sent", line)
+
+    def _finished(self, msg_id: int, future: Future[Dict[str, Any]]) -> None:
+        if not future.cancelled():
+            return
+        with self._lock:
+            self._progress.pop(msg_id, None)
+            if self._pending.pop(msg_id, None) is None or self._closed is not None:
+                return
+            self._cancelled.add(msg_id)
+            try:
+                self._write({"jsonrpc": "2.0", "method": "$/cancelRequest", "params": {"id": msg_id}})
+            except OSError:
+                logger.debug("Could not cancel %s request %d", self.name, msg_id)
+
+    def _read(self, stdout: IO[str]) -> None:
+        for line in stdout:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                payload = json.loads(line)
+            except ValueError:
+                logger.debug("%s wrote a line that is not JSON: %.200s", self.name, line)
+                continue
+            msg_id = payload.get("id")
+            if msg_id is None:
+                profiling.rpc_payload(payload.get("method", "?"), "received", line)
+                self._notification(payload)
+                continue
+            with self._lock:
+                self._progress.pop(msg_id, None)
+                future = self._pending.pop(msg_id, None)
+                self._cancelled.discard(msg_id)
+                method = self._methods.pop(msg_id, "?")
+            profiling.rpc_payload(method, "received", line)
+            if future is None or not future.set_running_or_notify_cancel():
+                continue
+            if "error" in payload:
+                future.set_exception(RpcError(payload["error"]))
+            else:
+                future.set_result(payload.get("result", {}))
+        self.close(f"{self.name} exited unexpectedly")
+
+    def _notification(self, payload: Dict[str, Any]) -> None:
+        params = payload.get("params") or {}
+        if payload.get("method") != "$/progress":
+            logger.debug("%s sent unexpected notification %s", self.name, payload.get("method"))
+            return
+        callback = self._progress.get(params.get("id"))
+        if callback is None:
+            return
+        try:
+            callback(params)
+        except Exception as exc:  # a display problem must not stop responses being read
+            logger.debug("Progress callback failed: %s", exc)
@@ -0,0 +1,132 @@
+"""Large and generated files, merged as opaque units.
+
+Generated API clients and minified bundles gain nothing from semantic
+merging, and decoding, escaping and parsing them dominates a merge. Files
+that exceed the configured size, carry a "generated" header marker, or have
+minified-length lines are never decoded or sent to a language worker: they
+are compared by hash and taken whole when only one side changed them, and
+reported as a conflict otherwise.
+
+On-disk files are inspected through ``mmap`` (only the header sample is
+touched) and hashed straight from the mapping.
+"""
+from __future__ import annotations
+
+import hashlib
+import mmap
+import pathlib
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Mapping, Tuple
+
+from .config import LanguageConfig
+
+# Bytes inspected for header markers and minified lines.
+_HEADER_BYTES = 2048
+_SAMPLE_BYTES = 64 * 1024
+
+
+@dataclass
+class OpaquePolicy:
+    """Thresholds that make a file opaque."""
+
+    max_bytes: int = 512 * 1024
+    markers: Tuple[bytes, ...] = (b"@generated", b"DO NOT EDIT", b"<auto-generated")
+    max_line_length: int = 2000
+
+    @staticmethod
+    def from_language(config: LanguageConfig) -> "OpaquePolicy":
+        return OpaquePolicy(
+            max_bytes=config.max_file_kb * 1024,
+            markers=tuple(marker.encode("utf-8") for marker in config.generated_markers),
+            max_line_length=config.max_line_length,
+        )
+
+    def classify(self, size: int, sample: bytes | memoryview) -> str | None:
+        """Return why a file of *size* bytes starting with *sample* is opaque, or ``None``."""
+
+        if self.max_bytes > 0 and size > self.max_bytes:
+            return "size"
+        head = bytes(sample[:_HEADER_BYTES])
+        if any(marker in head for marker in self.markers):
+            return "generated"
+        if self.max_line_length > 0:
+            start = 0
+            data = bytes(sample[:_SAMPLE_BYTES])
+            while start < len(data):
+                end = data.find(b"\n", start)
+                end = len(data) if end < 0 else end
+                if end - start > self.max_line_length:
+                    return "minified"
+                start = end + 1
+        return None
+
+    def classify_file(self, path: pathlib.Path) -> str | None:
+        """Classify an on-disk file without reading more than its header sample."""
+
+        size = path.stat().st_size
+        if self.max_bytes > 0 and size > self.max_bytes:
+            return "size"
+        if size == 0:
+            return None
+        with path.open("rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return self.classify(size, memoryview(mm)[:_SAMPLE_BYTES])
+
+
+@dataclass
+class OpaqueMerge:
+    """Per-path decisions for opaque files."""
+
+    take: Dict[str, str] = field(default_factory=dict)
+    conflicted: List[str] = field(default_factory=list)
+
+
+def split_opaque(
+    tree: pathlib.Path, paths: Iterable[str], policy: OpaquePolicy
+) -> Tuple[List[str], Dict[str, str]]:
+    """Split *paths* of *tree* into ``(regular, {opaque_path: reason})``."""
+
+    regular: List[str] = []
+    opaque: Dict[str, str] = {}
+    for rel in paths:
+        try:
+            reason = policy.classify_file(tree / rel)
+        except FileNotFoundError:
+            continue
+        if reason is None:
+            regular.append(rel)
+        else:
+            opaque[rel] = reason
+    return regular, opaque
+
+
+def file_digest(path: pathlib.Path) -> str | None:
+    """SHA-256 of *path*'s bytes via ``mmap``; ``None`` when the file is absent."""
+
+    try:
+        with path.open("rb") as fh:
+            if path.stat().st_size == 0:
+                return hashlib.sha256(b"").hexdigest()
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return hashlib.sha256(mm).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def merge_opaque(paths: Iterable[str], trees: Mapping[str, pathlib.Path]) -> OpaqueMerge:
+    """Decide each opaque path by comparing base/left/right digests.
+
+    ``take`` maps a path to the side (``"left"``/``"right"``) whose version
+    wins; a path whose winning version is a deletion is taken all the same.
+    """
+
+    result = OpaqueMerge()
+    for rel in sorted(set(paths)):
+        base, left, right = (file_digest(trees[side] / rel) for side in ("base", "left", "right"))
+        if left == right or right == base:
+            if left != base:
+                result.take[rel] = "left"
+        elif left == base:
+            result.take[rel] = "right"
+        else:
+            result.conflicted.append(rel)
+    return result
@@ -0,0 +1,815 @@
+"""Diff and merge pipelines behind the CLI commands.
+
+:mod:`semmerge.__main__` imports this module only once a command runs, so
+``--help`` and ``semmerge serve`` clients do not pay for it.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import functools
+import json
+import pathlib
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+from typing import Callable, Dict, Iterable, Iterator, List, Sequence, Set, Tuple
+
+import click
+
+from . import profiling
+from .applier import apply_ops, touched_paths
+from .backends import BackendScheduler
+from .compose import compose_oplogs
+from .config import LanguageConfig, load_config
+from .conflict import CONFLICTS_NDJSON, Conflict, Locate, conflict_opaque, conflict_text_merge, write_reports
+from .emitter import emit_files
+from .fileset import FileSelection, FileSelector, select_tree_files, select_worktree_files
+from .git_api import (
+    changed_files_between,
+    checkout_paths_to_temp,
+    checkout_tree_to_temp,
+    list_tree,
+    read_blobs,
+    resolve_rev,
+    resolve_revs,
+    run_git,
+    worktree_changes,
+    worktree_root,
+    write_tree,
+)
+from .incremental import MergeState, MergeStateStore, affected_paths, rebase_right_ops, rediff_scope, verify_scope
+from .lang.ts.bridge import SOURCE_SUFFIXES, TSWorker
+from .loggingx import logger
+from .notes import notes_put
+from .opaque import OpaqueMerge, OpaquePolicy, merge_opaque, split_opaque
+from .ops import Op, OpLog
+from .planner import (
+    MergePlan,
+    TextMergeResult,
+    filter_ops_to_scope,
+    materialize_plan,
+    plan_merge,
+    semantic_paths_after_merge,
+)
+from .progress import ProgressView, TimeBudget
+from .symindex import SymbolIndex
+from .treecache import TreeCache
+from .verify import typecheck_ts
+
+# Extracts a tree, and selects the files in it the worker should see.
+Checkout = Tuple[Callable[[], pathlib.Path], Callable[[], FileSelection]]
+
+# Workers kept alive between commands, by index mode (``semmerge serve`` runners only).
+_warm_workers: Dict[str, TSWorker] | None = None
+
+
+def run_semdiff(rev1: str, rev2: str | None, json_out: bool, worktree: bool = False) -> None:
+    """Print the op log between *rev1* and *rev2*, or *rev1* and the working tree with *worktree*."""
+
+    ts_config = _ts_config()
+    # Node startup overlaps the checkouts.
+    worker = _start_worker(ts_config.index_mode)
+    tree_cache = _open_tree_cache()
+    selector = _file_selector()
+    policy = OpaquePolicy.from_language(ts_config)
+    checkouts = {"base": _full_checkout(tree_cache, selector, rev1)}
+    if rev2 is not None:
+        checkouts["right"] = _full_checkout(tree_cache, selector, rev2)
+    trees: Dict[str, pathlib.Path] = {}
+    view = ProgressView()
+
+    async def stream() -> pathlib.Path:
+        checkout = _checkout_and_stream(worker, checkouts, trees, opaque_policy=policy)
+        if not worktree:
+            await checkout
+            return trees["right"]
+        _, root = await asyncio.gather(checkout, asyncio.to_thread(_stream_worktree, worker, selector, rev1, policy))
+        return root
+
+    try:
+        with profiling.phase("checkout"):
+            right = asyncio.run(stream())
+        with profiling.phase("diff"):
+            ops = worker.diff(trees["base"], right, progress=view)
+    finally:
+        view.close()
+        _release_worker(worker)
+        _release_trees(tree_cache, trees.values())
+    if json_out:
+        click.echo(json.dumps([op.to_dict() for op in ops], indent=2))
+    else:
+        for op in ops:
+            click.echo(op.pretty())
+
+
+def run_semmerge(
+    base: str,
+    a: str,
+    b: str,
+    inplace: bool,
+    fast_path: bool = True,
+    incremental: bool = True,
+    conflicts_json: bool = False,
+) -> int:
+    """Merge *base*, *a* and *b* and return the CLI exit code (see :func:`_merge`).
+
+    Conflicts are reported in ``.semmerge-conflicts.ndjson``; *conflicts_json*
+    also writes them to ``.semmerge-conflicts.json`` as one JSON document.
+
+    With *incremental*, a merge of *base* and *a* recorded earlier (planned
+    or not) is resumed first; see :func:`_remerge`.
+    """
+
+    logger.info("Starting semantic merge base=%s A=%s B=%s", base, a, b)
+    code = asyncio.run(_remerge(base, a, b, inplace, conflicts_json)) if incremental else None
+    if code is not None:
+        return code
+    plan = _plan(base, a, b) if fast_path else None
+    if plan is None:
+        return asyncio.run(_merge(base, a, b, None, [], inplace, conflicts_json))
+
+    logger.info("Merge plan: %s", plan.summary())
+    # The plan is staged outside the working tree, which only sees a successful merge. An
+    # in-place semantic merge stages onto a checkout of A: its type-check needs the whole tree.
+    full = inplace and not plan.fast
+    staging = checkout_tree_to_temp(plan.left) if full else pathlib.Path(tempfile.mkdtemp(prefix="semmerge_plan_"))
+    try:
+        staged = materialize_plan(plan, staging)
+        text_conflicts = [conflict_text_merge(path) for path in staged.conflicted]
+        text_conflicts += [conflict_opaque(path, reason) for path, reason in plan.opaque.items()]
+        if not plan.fast:
+            return asyncio.run(_merge(base, a, b, plan, text_conflicts, inplace, conflicts_json, staging, staged))
+        logger.info("Fast path: no file changed on both sides needs semantic merge")
+        if text_conflicts:
+            _write_conflict_reports(text_conflicts, conflicts_json)
+            return 1
+        if inplace:
+            _copy_paths(staging, pathlib.Path.cwd(), staged.written, staged.deleted)
+        logger.info("Merge complete")
+        return 0
+    finally:
+        _cleanup_temp_dirs([staging])
+
+
+async def _merge(
+    base: str,
+    a: str,
+    b: str,
+    plan: MergePlan | None,
+    text_conflicts: List[Conflict],
+    inplace: bool,
+    conflicts_json: bool = False,
+    staging: pathlib.Path | None = None,
+    staged: TextMergeResult | None = None,
+) -> int:
+    """Run the semantic pipeline and return the CLI exit code.
+
+    A planned merge passes the *staging* tree its non-semantic paths were
+    *staged* into; in place, the semantic result joins them there and the
+    working tree is only written once the merge succeeded.
+
+    The worker is spawned first so Node startup overlaps the three concurrent
+    checkouts; each tree is streamed to the worker as soon as it is checked
+    out, and merged files are formatted as soon as the applier is done with
+    them. Other language backends run in their own processes alongside the
+    worker. The critical path is roughly the slowest checkout, the slowest
+    backend's indexing, and the applier.
+
+    Phases are timed against ``[core] time_budget_s`` and degrade when
+    projected to overrun it (see :mod:`semmerge.progress`).
+    """
+
+    budget = TimeBudget(load_config().core.time_budget_s)
+    view = ProgressView()
+    ts_config = _ts_config()
+    worker = _start_worker(ts_config.index_mode)
+    backends = _backend_scheduler()
+    tree_cache: TreeCache | None = None
+    checkouts: Dict[str, Checkout]
+    if plan is not None:
+        scope = plan.semantic_scope
+        paths = sorted({*scope, *plan.backend_paths})
+        revs = {"base": plan.base, "left": plan.left, "right": plan.right}
+        checkouts = {
+            side: (functools.partial(checkout_paths_to_temp, rev, paths), functools.partial(FileSelection, scope))
+            for side, rev in revs.items()
+        }
+    else:
+        tree_cache = _open_tree_cache()
+        selector = _file_selector()
+        revs = {"base": base, "left": a, "right": b}
+        checkouts = {side: _full_checkout(tree_cache, selector, rev) for side, rev in revs.items()}
+    trees: Dict[str, pathlib.Path] = {}
+    merged_tree: pathlib.Path | None = None
+    symbol_index: SymbolIndex | None = None
+
+    try:
+        opaque: Set[str] = set()
+        with budget.phase("checkout"):
+            await _checkout_and_stream(worker, checkouts, trees, OpaquePolicy.from_language(ts_config), opaque)
+        symbol_index = _open_symbol_index(ts_config.index_mode)
+        with budget.phase("diff"):
+            parts = plan.backends if plan is not None else await asyncio.to_thread(_backend_parts, backends, revs)
+            (op_log_left, op_log_right, symbol_maps), (other_left, other_right) = await asyncio.gather(
+                asyncio.to_thread(
+                    worker.build_and_diff,
+                    trees["base"],
+                    trees["left"],
+                    trees["right"],
+                    symbol_index=symbol_index,
+                    progress=view,
+                    budget=budget,
+                ),
+                backends.run(trees, parts),
+            )
+        view.close()
+        # Syntax-only symbols must not be stored or reused as symbols of the configured index mode.
+        exact = "syntax-index" not in budget.degraded
+        if symbol_index is not None and exact:
+            _store_symbol_maps(
+                symbol_index,
+                revs,
+                symbol_maps,
+                paths=plan.semantic_scope if plan is not None else None,
+            )
+        if plan is not None:
+            op_log_left = filter_ops_to_scope(op_log_left, plan.semantic)
+            op_log_right = filter_ops_to_scope(op_log_right, plan.semantic)
+        # Backend logs follow the TypeScript ones in language order; composition sorts them deterministically.
+        op_log_left = [*op_log_left, *other_left]
+        op_log_right = [*op_log_right, *other_right]
+        with budget.phase("compose"):
+            composed_ops, conflicts = compose_oplogs(op_log_left, op_log_right)
+            opaque_merge = await asyncio.to_thread(merge_opaque, opaque, trees)
+            conflicts = [*conflicts, *(conflict_opaque(path) for path in opaque_merge.conflicted)]
+
+        if conflicts or text_conflicts:
+            _write_conflict_reports(
+                [*conflicts, *text_conflicts], conflicts_json, trees["base"], _symbol_map_ranges(symbol_maps)
+            )
+            return 1
+
+        changed = {path for op in composed_ops for path in touched_paths(op)} | set(opaque_merge.take)
+        formatting = budget.fits(len(changed))
+        if not formatting:
+            budget.degrade("skip-format", _projection(budget, len(changed)))
+        with budget.phase("apply"):
+            merged_tree = await _apply_and_format(trees["base"], composed_ops, formatting=formatting)
+            _take_opaque(merged_tree, trees, opaque_merge)
+        write: List[str] = []
+        delete: List[str] = []
+        if plan is not None and staging is not None:
+            # The staged plan plus the semantic result is the whole merge.
+            write, delete = semantic_paths_after_merge(merged_tree, plan)
+            _copy_paths(merged_tree, staging, write, delete)
+        with budget.phase("typecheck"):
+            if plan is None:
+                ok, diagnostics = await _typecheck(budget, merged_tree, revs["base"], changed)
+            elif inplace and staging is not None:
+                ok, diagnostics = await _typecheck(budget, staging, revs["base"], set(write))
+            else:
+                logger.info("Type-check skipped: planned merge without --inplace has no complete tree")
+                ok, diagnostics = True, []
+        if not ok:
+            _report_type_errors(diagnostics)
+            return 2
+
+        if staged is not None:
+            write, delete = [*staged.written, *write], [*staged.deleted, *delete]
+        if plan is None and exact:
+            _save_merge_state(revs, ts_config.index_mode, op_log_left, op_log_right, composed_ops, merged_tree, changed)
+        elif staging is not None and exact:
+            # A planned merge's logs only cover its semantic files; re-merges only resume within them.
+            _save_merge_state(
+                revs,
+                ts_config.index_mode,
+                op_log_left,
+                op_log_right,
+                composed_ops,
+                staging,
+                [*write, *delete],
+                start=revs["left"],
+                scope=plan.semantic,
+            )
+        if inplace and plan is None:
+            _copy_tree_into_cwd(merged_tree)
+        elif inplace and staging is not None:
+            _copy_paths(staging, pathlib.Path.cwd(), write, delete)
+
+        notes_put(resolve_rev(revs["left"]), OpLog(op_log_left))
+        notes_put(resolve_rev(revs["right"]), OpLog(op_log_right))
+        if budget.degraded:
+            logger.info("Merge complete (degraded to fit the time budget: %s)", ", ".join(budget.degraded))
+        else:
+            logger.info("Merge complete")
+        return 0
+    finally:
+        view.close()
+        budget.report()
+        _release_worker(worker)
+        if symbol_index is not None:
+            symbol_index.close()
+        _release_trees(tree_cache, trees.values())
+        if merged_tree is not None and not inplace:
+            _cleanup_temp_dirs([merged_tree])
+
+
+async def _remerge(base: str, a: str, b: str, inplace: bool, conflicts_json: bool = False) -> int | None:
+    """Re-merge from the state of an earlier merge of *base* and *a*; ``None`` means merge from scratch.
+
+    Only source files changed between the earlier right-hand commit and *b*
+    are checked out and diffed, and only files whose composed ops changed are
+    rebuilt and type-checked (see :mod:`semmerge.incremental`).
+    """
+
+    ts_config = _ts_config()
+    try:
+        base_c, left_c, right_c = resolve_revs([base, a, b])
+        state = MergeStateStore.for_repo().load(base_c, left_c, ts_config.index_mode)
+        if state is None:
+            return None
+        # Merged trees are unreachable objects; ``git gc`` may have pruned this one.
+        run_git(["cat-file", "-e", f"{state.merged_tree}^{{tree}}"])
+        changed = changed_files_between(state.right, right_c)
+        if _backend_scheduler().partition(changed):
+            logger.info("Incremental re-merge: files of another language backend changed; merging from scratch")
+            return None
+        selection = _file_selector().select(
+            list_tree(right_c), read=lambda paths: read_blobs(right_c, paths), candidates=changed
+        )
+    except (subprocess.CalledProcessError, OSError) as exc:
+        logger.debug("Incremental re-merge unavailable: %s", exc)
+        return None
+    scope = rediff_scope(state, changed, selection.included)
+    if scope is None:
+        logger.info("Merging from scratch")
+        return None
+    logger.info(
+        "Incremental re-merge from B=%s: %d paths changed, %d files to re-diff",
+        state.right[:12],
+        len(changed),
+        len(scope),
+    )
+
+    worker = _start_worker(ts_config.index_mode) if scope else None
+    trees: Dict[str, pathlib.Path] = {}
+    tree_cache: TreeCache | None = None
+    previous: List[pathlib.Path] = []
+    merged_tree: pathlib.Path | None = None
+    try:
+        delta: List[Op] = []
+        if worker is not None:
+            checkouts: Dict[str, Checkout] = {
+                side: (
+                    functools.partial(checkout_paths_to_temp, rev, sorted(scope)),
+                    functools.partial(FileSelection, sorted(scope)),
+                )
+                for side, rev in (("base", base_c), ("right", right_c))
+            }
+            opaque: Set[str] = set()
+            await _checkout_and_stream(worker, checkouts, trees, OpaquePolicy.from_language(ts_config), opaque)
+            if opaque:
+                logger.info("Incremental re-merge: large or generated files changed; merging from scratch")
+                return None
+            delta = await asyncio.to_thread(worker.diff, trees["base"], trees["right"])
+        right_ops = rebase_right_ops(state, scope, delta)
+        affected = None
+        if right_ops is not None:
+            composed_ops, conflicts = compose_oplogs(state.left_ops, right_ops)
+            if conflicts:
+                # The base tree holds only the re-diffed files; declarations elsewhere get a range but no code.
+                with _indexed_ranges(ts_config.index_mode, base_c) as locate:
+                    _write_conflict_reports(conflicts, conflicts_json, trees.get("base"), locate)
+                return 1
+            affected = affected_paths(state.composed, composed_ops)
+        if right_ops is None or affected is None:
+            logger.info("Merging from scratch")
+            return None
+        logger.info("Incremental re-merge: rebuilding %d files", len(affected))
+
+        tree_cache = _open_tree_cache()
+        previous.append(await asyncio.to_thread(_checkout_tree, tree_cache, state.merged_tree))
+        reset = await asyncio.to_thread(read_blobs, base_c, sorted(affected))
+        replay = [op for op in composed_ops if touched_paths(op) & affected]
+        merged_tree = await _apply_and_format(previous[0], replay, reset=reset)
+        files = await asyncio.to_thread(verify_scope, state.merged_tree, affected, SOURCE_SUFFIXES)
+        ok, diagnostics = await asyncio.to_thread(typecheck_ts, merged_tree, files)
+        if not ok:
+            _report_type_errors(diagnostics)
+            return 2
+
+        revs = {"base": base_c, "left": left_c, "right": right_c}
+        _save_merge_state(
+            revs,
+            ts_config.index_mode,
+            state.left_ops,
+            right_ops,
+            composed_ops,
+            merged_tree,
+            affected,
+            start=state.merged_tree,
+            scope=state.scope,
+        )
+        if inplace:
+            _copy_tree_into_cwd(merged_tree)
+        notes_put(right_c, OpLog(right_ops))
+        logger.info("Merge complete")
+        return 0
+    finally:
+        if worker is not None:
+            _release_worker(worker)
+        _cleanup_temp_dirs(trees.values())
+        _release_trees(tree_cache, previous)
+        if merged_tree is not None and not inplace:
+            _cleanup_temp_dirs([merged_tree])
+
+
+def _save_merge_state(
+    revs: Dict[str, str],
+    index_mode: str,
+    left_ops: List[Op],
+    right_ops: List[Op],
+    composed: List[Op],
+    merged_tree: pathlib.Path,
+    changed: Iterable[str],
+    start: str | None = None,
+    scope: List[str] | None = None,
+) -> None:
+    """Record a successful merge for later incremental re-merges.
+
+    The merged tree is written as *start* (default: the base tree) with the
+    *changed* paths replaced, so only those files are hashed. *scope* limits
+    a planned merge's state to the files its op logs cover.
+    """
+
+    try:
+        base_c, left_c, right_c = resolve_revs([revs["base"], revs["left"], revs["right"]])
+        tree = write_tree(start or base_c, merged_tree, changed)
+        state = MergeState(
+            base=base_c,
+            left=left_c,
+            right=right_c,
+            index_mode=index_mode,
+            merged_tree=tree,
+            left_ops=list(left_ops),
+            right_ops=list(right_ops),
+            composed=list(composed),
+            scope=scope,
+        )
+        MergeStateStore.for_repo().save(state)
+    except (subprocess.CalledProcessError, OSError) as exc:
+        logger.debug("Could not record merge state: %s", exc)
+
+
+def keep_workers_warm() -> None:
+    """Keep TypeScript workers alive between commands run in this process."""
+
+    global _warm_workers
+    if _warm_workers is None:
+        _warm_workers = {}
+
+
+def _start_worker(index_mode: str) -> TSWorker:
+    # A profiled run needs a worker of its own, started with profiling flags.
+    warm = _warm_workers if not profiling.active() else None
+    worker = warm.get(index_mode) if warm is not None else None
+    if worker is None:
+        worker = TSWorker(index_mode=index_mode)
+        if warm is not None:
+            warm[index_mode] = worker
+    # Re-read for warm workers too: the deadline belongs to the repository being merged.
+    worker.timeout = load_config().core.worker_timeout_s or None
+    worker.start()
+    return worker
+
+
+def _release_worker(worker: TSWorker) -> None:
+    if _warm_workers is not None and _warm_workers.get(worker.index_mode) is worker:
+        if not worker.has_pending_snapshots and not worker.stalled:
+            return
+        # A failed run left streamed files behind, or the worker ignored a cancellation;
+        # start the next one from a clean worker.
+        del _warm_workers[worker.index_mode]
+    worker.close()
+
+
+async def _checkout_and_stream(
+    worker: TSWorker,
+    checkouts: Dict[str, Checkout],
+    trees: Dict[str, pathlib.Path],
+    opaque_policy: OpaquePolicy | None = None,
+    opaque: Set[str] | None = None,
+) -> None:
+    """Run *checkouts* concurrently, streaming each tree to *worker* once it is ready.
+
+    Each checkout pairs the tree extraction with the file selection for it;
+    the two run concurrently. Finished trees are recorded in *trees* even when
+    another step fails, so the caller can release them. Selected files that
+    *opaque_policy* rejects are withheld from the worker and added to *opaque*.
+    """
+
+    async def one(side: str, checkout: Callable[[], pathlib.Path], select: Callable[[], FileSelection]) -> None:
+        tree, selection = await asyncio.gather(
+            asyncio.to_thread(checkout), asyncio.to_thread(select), return_exceptions=True
+        )
+        if isinstance(tree, pathlib.Path):
+            trees[side] = tree
+        for result in (tree, selection):
+            if isinstance(result, BaseException):
+                raise result
+        assert isinstance(tree, pathlib.Path) and isinstance(selection, FileSelection)
+        logger.info("%s files: %s", side, selection.summary())
+        paths = selection.included
+        if opaque_policy is not None:
+            paths, withheld = await asyncio.to_thread(split_opaque, tree, paths, opaque_policy)
+            if withheld:
+                logger.info("%s files: %d large or generated, merged as opaque units", side, len(withheld))
+                if opaque is not None:
+                    opaque.update(withheld)
+        await asyncio.to_thread(worker.stream_snapshot, side, tree, paths)
+
+    results = await asyncio.gather(
+        *(one(side, checkout, select) for side, (checkout, select) in checkouts.items()), return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+
+async def _apply_and_format(
+    base_tree: pathlib.Path,
+    ops: Sequence[Op],
+    reset: Dict[str, bytes | None] | None = None,
+    formatting: bool = True,
+) -> pathlib.Path:
+    """Apply *ops* in a thread and format each merged file as soon as it is final.
+
+    *reset* is passed on to :func:`~semmerge.applier.apply_ops`. Without
+    *formatting*, merged files are left as the applier wrote them.
+    """
+
+    loop = asyncio.get_running_loop()
+    ready: asyncio.Queue[Tuple[pathlib.Path, pathlib.Path] | None] = asyncio.Queue()
+
+    def on_file(tree: pathlib.Path, path: pathlib.Path) -> None:
+        loop.call_soon_threadsafe(ready.put_nowait, (tree, path))
+
+    def apply() -> pathlib.Path:
+        try:
+            return apply_ops(base_tree, ops, on_file=on_file, reset=reset)
+        finally:
+            loop.call_soon_threadsafe(ready.put_nowait, None)
+
+    async def formatter() -> None:
+        finished = False
+        while not finished:
+            # Format whatever has become final since the last Prettier run in one batch.
+            batch = [await ready.get()]
+            while not ready.empty():
+                batch.append(ready.get_nowait())
+            finished = None in batch
+            done = [item for item in batch if item is not None]
+            if done and formatting:
+                await asyncio.to_thread(emit_files, done[0][0], [path for _tree, path in done])
+
+    merged, _ = await asyncio.gather(asyncio.to_thread(apply), formatter())
+    return merged
+
+
+async def _typecheck(
+    budget: TimeBudget, tree: pathlib.Path, base: str, changed: Set[str]
+) -> Tuple[bool, List[str]]:
+    """Type-check *tree*; only *changed* files and their importers when a full check would overrun *budget*."""
+
+    files = budget.tree_files
+    if budget.fits(files):
+        return await asyncio.to_thread(typecheck_ts, tree)
+    scope = await asyncio.to_thread(_typecheck_scope, base, tree, changed)
+    budget.degrade("scoped-typecheck", f"{_projection(budget, files)}; checking {len(scope)} files")
+    return await asyncio.to_thread(typecheck_ts, tree, scope)
+
+
+def _typecheck_scope(base: str, tree: pathlib.Path, changed: Set[str]) -> List[str]:
+    """Changed source files in *tree*, and the files importing them (found in *base*)."""
+
+    present = {path for path in changed if path.endswith(tuple(SOURCE_SUFFIXES)) and (tree / path).is_file()}
+    scope = present | set(verify_scope(base, present, SOURCE_SUFFIXES))
+    return sorted(path for path in scope if (tree / path).is_file())
+
+
+def _projection(budget: TimeBudget, files: int) -> str:
+    return f"projected {budget.estimate(files):.0f}s for {files} files, {budget.remaining() or 0:.0f}s left"
+
+
+def _open_tree_cache() -> TreeCache | None:
+    budget = load_config().core.tree_cache_mb
+    if budget <= 0:
+        return None
+    try:
+        return TreeCache.for_repo(budget_mb=budget)
+    except (OSError, subprocess.CalledProcessError) as exc:
+        logger.debug("Tree cache unavailable: %s", exc)
+        return None
+
+
+def _file_selector() -> FileSelector:
+    return FileSelector.from_config(load_config())
+
+
+def _full_checkout(tree_cache: TreeCache | None, selector: FileSelector, rev: str) -> Checkout:
+    """Return the checkout and file-selection steps for the whole tree of *rev*."""
+
+    def select() -> FileSelection:
+        return select_tree_files(selector, rev, list_tree(rev))
+
+    return functools.partial(_checkout_tree, tree_cache, rev), select
+
+
+def _stream_worktree(worker: TSWorker, selector: FileSelector, rev: str, policy: OpaquePolicy) -> pathlib.Path:
+    """Stream the working tree to *worker* as an overlay on *rev* and return its root.
+
+    Only files that differ from *rev* are read; the worker takes every other
+    file from the snapshot of *rev*.
+    """
+
+    root = worktree_root()
+    changed, removed = worktree_changes(rev, root)
+    listing = list_tree(rev)
+    selection = select_worktree_files(selector, root, sorted((listing.keys() - set(removed)) | set(changed)))
+    logger.info("worktree files: %s; %d changed, %d removed", selection.summary(), len(changed), len(removed))
+    in_rev = set(select_tree_files(selector, rev, listing).included)
+    differs = set(changed)
+    paths = [path for path in selection.included if path in differs or path not in in_rev]
+    paths, withheld = split_opaque(root, paths, policy)
+    gone = (in_rev - set(selection.included)) | set(withheld)
+    worker.stream_snapshot("right", root, paths, removed=sorted(gone))
+    return root
+
+
+def _checkout_tree(tree_cache: TreeCache | None, rev: str) -> pathlib.Path:
+    """Check out *rev* through the tree cache, or into a throwaway directory without one."""
+
+    if tree_cache is not None:
+        return tree_cache.checkout(rev)
+    return checkout_tree_to_temp(rev)
+
+
+def _release_trees(tree_cache: TreeCache | None, trees: Iterable[pathlib.Path]) -> None:
+    if tree_cache is not None:
+        # Cached trees stay on disk for later runs; only the lease is released.
+        tree_cache.close()
+    else:
+        _cleanup_temp_dirs(trees)
+
+
+def _plan(base: str, a: str, b: str) -> MergePlan | None:
+    try:
+        return plan_merge(
+            base,
+            a,
+            b,
+            selector=_file_selector(),
+            policy=OpaquePolicy.from_language(_ts_config()),
+            partition=_backend_scheduler().partition,
+        )
+    except subprocess.CalledProcessError as exc:
+        logger.warning("Merge planning failed (%s); running the full semantic pipeline", exc)
+        return None
+
+
+def _backend_scheduler() -> BackendScheduler:
+    return BackendScheduler.from_config(load_config())
+
+
+def _backend_parts(backends: BackendScheduler, revs: Dict[str, str]) -> Dict[str, List[str]]:
+    """Partition the files either side changed among the enabled backends."""
+
+    if not backends.languages:
+        return {}
+    changed = {path for side in ("left", "right") for path in changed_files_between(revs["base"], revs[side])}
+    return backends.partition(changed)
+
+
+def _ts_config() -> LanguageConfig:
+    return load_config().languages.get("typescript", LanguageConfig(enabled=True))
+
+
+def _open_symbol_index(mode: str) -> SymbolIndex | None:
+    try:
+        return SymbolIndex.for_repo(mode)
+    except (subprocess.CalledProcessError, sqlite3.Error, OSError) as exc:
+        logger.debug("Symbol index unavailable: %s", exc)
+        return None
+
+
+def _store_symbol_maps(
+    index: SymbolIndex,
+    revs: Dict[str, str],
+    symbol_maps: Dict[str, object],
+    paths: Sequence[str] | None = None,
+) -> None:
+    for side, rev in revs.items():
+        entries = symbol_maps.get(side)
+        if not isinstance(entries, list):
+            continue
+        try:
+            commit = resolve_rev(rev)
+            if paths is not None:
+                index.store(commit, entries, paths=paths)
+            elif not index.has(commit):
+                index.store(commit, entries)
+        except (subprocess.CalledProcessError, sqlite3.Error) as exc:
+            logger.debug("Could not record symbol map for %s: %s", rev, exc)
+
+
+def _copy_tree_into_cwd(tmp_path: pathlib.Path) -> None:
+    tmp_path = pathlib.Path(tmp_path)
+    cwd = pathlib.Path.cwd()
+    for path in tmp_path.rglob("*"):
+        if path.is_file():
+            target = cwd / path.relative_to(tmp_path)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(path, target)
+
+
+def _take_opaque(merged_tree: pathlib.Path, trees: Dict[str, pathlib.Path], decisions: OpaqueMerge) -> None:
+    for rel, side in decisions.take.items():
+        source = trees[side] / rel
+        target = pathlib.Path(merged_tree) / rel
+        if source.exists():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(source, target)
+        else:
+            target.unlink(missing_ok=True)
+
+
+def _copy_paths(source: pathlib.Path, dest: pathlib.Path, write: Iterable[str], delete: Iterable[str]) -> None:
+    for rel in write:
+        target = dest / rel
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # Replace the entry rather than write through it; symlinks are copied as links.
+        target.unlink(missing_ok=True)
+        shutil.copy2(pathlib.Path(source) / rel, target, follow_symlinks=False)
+    for rel in delete:
+        (dest / rel).unlink(missing_ok=True)
+
+
+def _write_conflict_reports(
+    conflicts: Sequence[Conflict],
+    conflicts_json: bool,
+    tree: pathlib.Path | None = None,
+    locate: Locate | None = None,
+) -> None:
+    count = write_reports(conflicts, pathlib.Path.cwd(), tree, locate, json_copy=conflicts_json)
+    logger.info("%d conflicts reported in %s", count, CONFLICTS_NDJSON)
+
+
+def _symbol_map_ranges(symbol_maps: Dict[str, object]) -> Locate:
+    """Locate base addresses by the declarations in the worker's base symbol map."""
+
+    entries = symbol_maps.get("base")
+    ranges = {
+        entry["addressId"]: (entry["file"], entry["start"], entry["end"])
+        for entry in (entries if isinstance(entries, list) else [])
+    }
+    return ranges.get
+
+
+@contextlib.contextmanager
+def _indexed_ranges(mode: str, commit: str) -> Iterator[Locate | None]:
+    """Locate base addresses of *commit* by the symbol index, if it has them."""
+
+    index = _open_symbol_index(mode)
+    if index is None:
+        yield None
+        return
+
+    def locate(address_id: str) -> Tuple[str, int, int] | None:
+        try:
+            entry = index.lookup_address(commit, address_id)
+        except sqlite3.Error:
+            return None
+        return (entry.file, entry.start, entry.end) if entry else None
+
+    try:
+        yield locate
+    finally:
+        index.close()
+
+
+def _report_type_errors(diagnostics: Iterable[str]) -> None:
+    for line in diagnostics:
+        click.echo(line, err=True)
+
+
+def _cleanup_temp_dirs(paths: Iterable[pathlib.Path]) -> None:
+    for path in paths:
+        try:
+            shutil.rmtree(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            # Ignore best-effort cleanup failures.
+            pass
@@ -0,0 +1,367 @@
+"""Pre-flight classification of a three-way merge.
+
+Most merges touch disjoint parts of the tree. :func:`plan_merge` looks at the
+paths each side changed relative to the merge base and decides, per path, the
+cheapest strategy that is still correct:
+
+* changed on one side only — take that side's version as-is;
+* changed identically on both sides — take either version;
+* changed on both sides, not selected for the language backend (see
+  :mod:`semmerge.fileset`) — Git's own three-way text merge;
+* changed on both sides, large or generated (see :mod:`semmerge.opaque`) —
+  a conflict, since such files are never parsed;
+* changed on both sides, selected source file — the semantic pipeline;
+* changed on both sides, claimed by another language backend (see
+  :mod:`semmerge.backends`) — Git's text merge as well; the backend's op
+  logs only take part in composition, so they can report conflicts.
+
+Only the semantic and backend files (plus the files the semantic ones
+import, for identity context) are checked out and sent to the language
+workers.
+"""
+from __future__ import annotations
+
+import os
+import posixpath
+import re
+import subprocess
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+from .applier import touched_paths
+from .fileset import FileSelection, FileSelector
+from .git_api import blob_sizes, changed_files_between, list_tree, list_tree_entries, read_blobs, resolve_revs
+from .loggingx import logger
+from .opaque import OpaquePolicy
+from .ops import Op
+
+_IMPORT_RE = re.compile(
+    rb"""(?:\bfrom\s*|\bimport\s*\(\s*|\brequire\s*\(\s*|\bimport\s+)["'](\.{1,2}/[^"']+)["']"""
+)
+_RESOLVE_SUFFIXES = ("", ".ts", ".tsx", ".js", ".jsx", "/index.ts", "/index.tsx", "/index.js", "/index.jsx")
+_SYMLINK = "120000"
+_EXECUTABLE = "100755"
+
+
+@dataclass
+class MergePlan:
+    """Per-path merge strategy for ``base``/``left``/``right`` commits."""
+
+    base: str
+    left: str
+    right: str
+    take_left: List[str] = field(default_factory=list)
+    take_right: List[str] = field(default_factory=list)
+    identical: List[str] = field(default_factory=list)
+    text_merge: List[str] = field(default_factory=list)
+    semantic: List[str] = field(default_factory=list)
+    context: List[str] = field(default_factory=list)
+    opaque: Dict[str, str] = field(default_factory=dict)
+    backends: Dict[str, List[str]] = field(default_factory=dict)
+    selection: FileSelection = field(default_factory=FileSelection)
+
+    @property
+    def fast(self) -> bool:
+        """``True`` when no path needs the semantic pipeline or another backend."""
+
+        return not self.semantic and not self.backends
+
+    @property
+    def backend_paths(self) -> List[str]:
+        """Paths handed to backends other than TypeScript."""
+
+        return sorted(path for paths in self.backends.values() for path in paths)
+
+    @property
+    def semantic_scope(self) -> List[str]:
+        """Paths to check out for the semantic pipeline."""
+
+        return sorted({*self.semantic, *self.context})
+
+    def summary(self) -> str:
+        return (
+            f"{len(self.take_left)} from A, {len(self.take_right)} from B, "
+            f"{len(self.identical)} identical, {len(self.text_merge)} text-merged, "
+            f"{len(self.opaque)} opaque conflicts, "
+            f"{len(self.semantic)} semantic (+{len(self.context)} context), "
+            f"{len(self.backend_paths)} for other backends; "
+            f"files changed on both sides: {self.selection.summary()}"
+        )
+
+
+@dataclass
+class TextMergeResult:
+    """Outcome of materializing the non-semantic part of a plan."""
+
+    written: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+    conflicted: List[str] = field(default_factory=list)
+
+
+def plan_merge(
+    base: str,
+    left: str,
+    right: str,
+    selector: FileSelector | None = None,
+    policy: OpaquePolicy | None = None,
+    partition: Callable[[Iterable[str]], Dict[str, List[str]]] | None = None,
+) -> MergePlan:
+    """Classify every path changed between ``base`` and either side.
+
+    *selector* decides which files the semantic pipeline may see; it is
+    evaluated against ``left``'s tree (project files included). Files that
+    *policy* deems opaque on either side never reach the pipeline. Of the
+    remaining files, *partition* (see
+    :meth:`~semmerge.backends.BackendScheduler.partition`) picks those that
+    other language backends see too. They stay in ``text_merge``: backends
+    produce ops the applier cannot replay, so their content always comes
+    from Git's merge.
+    """
+
+    selector = selector or FileSelector()
+    policy = policy or OpaquePolicy()
+    base_c, left_c, right_c = resolve_revs([base, left, right])
+    plan = MergePlan(base=base_c, left=left_c, right=right_c)
+    changed_left = set(changed_files_between(base_c, left_c))
+    changed_right = set(changed_files_between(base_c, right_c))
+    both = changed_left & changed_right
+
+    plan.take_left = sorted(changed_left - both)
+    plan.take_right = sorted(changed_right - both)
+    if both:
+        left_blobs = list_tree(left_c)
+        right_blobs = list_tree(right_c)
+        differing = []
+        for path in sorted(both):
+            if left_blobs.get(path) == right_blobs.get(path):
+                plan.identical.append(path)
+            else:
+                differing.append(path)
+        plan.selection = selector.select(
+            left_blobs, read=lambda paths: read_blobs(left_c, paths), candidates=differing
+        )
+        selected = set(plan.selection.included)
+        plan.opaque = _opaque_paths(policy, (left_c, right_c), sorted(selected))
+        plan.semantic = [path for path in differing if path in selected and path not in plan.opaque]
+        plan.text_merge = [path for path in differing if path not in selected]
+        if partition is not None and plan.text_merge:
+            plan.backends = partition(plan.text_merge)
+    if plan.semantic:
+        referenced = _referenced_paths(plan, set(plan.semantic)) - set(plan.semantic)
+        referenced = {p for p in referenced if not selector.ignored(p)}
+        opaque_context = _opaque_paths(policy, (base_c, left_c, right_c), sorted(referenced))
+        plan.context = sorted(referenced - set(opaque_context))
+
+    for label, paths in (
+        ("take A", plan.take_left),
+        ("take B", plan.take_right),
+        ("identical", plan.identical),
+        ("text merge", plan.text_merge),
+        ("opaque", plan.opaque),
+        ("semantic", plan.semantic),
+        ("context", plan.context),
+        ("other backend", plan.backend_paths),
+    ):
+        for path in paths:
+            logger.debug("plan: %s %s", label, path)
+    return plan
+
+
+def materialize_plan(plan: MergePlan, root: Path) -> TextMergeResult:
+    """Write every non-semantic path of *plan* into *root*.
+
+    Paths keep the mode of the version they come from: symlinks are
+    recreated as links and executables get their exec bits. Text merges of
+    symlinks and binary files are not attempted; A's version is kept and the
+    path reported as conflicted.
+    """
+
+    result = TextMergeResult()
+    root = Path(root)
+    modes = _TreeModes()
+    for rev, paths in (
+        (plan.left, plan.take_left),
+        (plan.right, plan.take_right),
+        (plan.left, plan.identical),
+    ):
+        for path, data in read_blobs(rev, paths).items():
+            _write_or_delete(root, path, data, modes[rev].get(path), result)
+
+    if plan.text_merge:
+        base_blobs = read_blobs(plan.base, plan.text_merge)
+        left_blobs = read_blobs(plan.left, plan.text_merge)
+        right_blobs = read_blobs(plan.right, plan.text_merge)
+        for path in plan.text_merge:
+            mode, clean_mode = _merge_mode(*(modes[rev].get(path) for rev in (plan.base, plan.left, plan.right)))
+            if _SYMLINK in (modes[plan.left].get(path), modes[plan.right].get(path)):
+                # Link targets are not merged as text.
+                mode, merged, clean = modes[plan.left].get(path), left_blobs[path], False
+            else:
+                merged, clean = _merge_file(base_blobs[path], left_blobs[path], right_blobs[path])
+            _write_or_delete(root, path, merged, mode, result)
+            if not (clean and clean_mode):
+                result.conflicted.append(path)
+    return result
+
+
+class _TreeModes(dict):
+    """``{rev: {path: mode}}``, listing each tree on first use."""
+
+    def __missing__(self, rev: str) -> Dict[str, str]:
+        modes = {path: mode for path, (mode, _oid) in list_tree_entries(rev).items()}
+        self[rev] = modes
+        return modes
+
+
+def _merge_mode(base: str | None, left: str | None, right: str | None) -> Tuple[str | None, bool]:
+    """Three-way merge of file modes; returns ``(mode, clean)``, keeping A's mode on a conflict."""
+
+    if left == right or right is None or right == base:
+        return left, True
+    if left is None or left == base:
+        return right, True
+    return left, False
+
+
+def _write_or_delete(
+    root: Path, path: str, data: bytes | None, mode: str | None, result: TextMergeResult
+) -> None:
+    target = root / path
+    if data is None:
+        target.unlink(missing_ok=True)
+        result.deleted.append(path)
+        return
+    target.parent.mkdir(parents=True, exist_ok=True)
+    # Replace the entry rather than write through it: it may be a symlink.
+    target.unlink(missing_ok=True)
+    if mode == _SYMLINK:
+        os.symlink(os.fsdecode(data), target)
+    else:
+        target.write_bytes(data)
+        if mode == _EXECUTABLE:
+            # As git checks out executables: exec bits wherever read bits are set.
+            current = target.stat().st_mode
+            target.chmod(current | (current & 0o444) >> 2)
+    result.written.append(path)
+
+
+def _merge_file(base: bytes | None, left: bytes | None, right: bytes | None) -> Tuple[bytes | None, bool]:
+    """Three-way merge one file with ``git merge-file``; returns ``(content, clean)``.
+
+    Binary files cannot be merged: A's version is returned as a conflict.
+    """
+
+    if left is None and right is None:
+        return None, True
+    if left is None or right is None:
+        # Deleted on one side, modified on the other: keep the surviving version, flag it.
+        return left if left is not None else right, False
+    if any(b"\0" in data for data in (base or b"", left, right)):
+        return left, False
+    with tempfile.TemporaryDirectory(prefix="semmerge_text_") as tmp:
+        files = []
+        for name, data in (("left", left), ("base", base or b""), ("right", right)):
+            path = Path(tmp) / name
+            path.write_bytes(data)
+            files.append(str(path))
+        proc = subprocess.run(
+            ["git", "merge-file", "-p", "-L", "A", "-L", "base", "-L", "B", *files],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+    if proc.returncode < 0 or proc.returncode > 127:
+        # git merge-file refuses files it considers binary (exit 255).
+        logger.debug("git merge-file failed (%d): %s", proc.returncode, proc.stderr.decode("utf-8", "replace").strip())
+        return left, False
+    return proc.stdout, proc.returncode == 0
+
+
+def _opaque_paths(policy: OpaquePolicy, revs: Iterable[str], paths: List[str]) -> Dict[str, str]:
+    """Return ``{path: reason}`` for *paths* that are opaque in any of *revs*.
+
+    Sizes come from ``cat-file --batch-check``; only blobs under the size
+    limit are read to look for generated markers and minified lines.
+    """
+
+    opaque: Dict[str, str] = {}
+    for rev in revs:
+        pending = [path for path in paths if path not in opaque]
+        small = []
+        for path, size in blob_sizes(rev, pending).items():
+            if size is None:
+                continue
+            if policy.max_bytes > 0 and size > policy.max_bytes:
+                opaque[path] = "size"
+            else:
+                small.append(path)
+        for path, data in read_blobs(rev, small).items():
+            reason = policy.classify(len(data), data) if data is not None else None
+            if reason is not None:
+                opaque[path] = reason
+    return opaque
+
+
+def _referenced_paths(plan: MergePlan, paths: Set[str]) -> Set[str]:
+    """Return files imported (relatively) by *paths* on any of the three revisions."""
+
+    known: Set[str] = set()
+    for rev in (plan.base, plan.left, plan.right):
+        known.update(list_tree(rev))
+    found: Set[str] = set()
+    for rev in (plan.base, plan.left, plan.right):
+        for path, data in read_blobs(rev, sorted(paths)).items():
+            if data is None:
+                continue
+            found |= imported_paths(path, data, known)
+    return found
+
+
+def imported_paths(importer: str, data: bytes, known: Set[str]) -> Set[str]:
+    """Return the files among *known* that *importer* (content *data*) imports relatively."""
+
+    found: Set[str] = set()
+    for spec in _IMPORT_RE.findall(data):
+        resolved = _resolve_import(importer, spec.decode("utf-8", "replace"), known)
+        if resolved is not None:
+            found.add(resolved)
+    return found
+
+
+def _resolve_import(importer: str, spec: str, known: Set[str]) -> str | None:
+    target = posixpath.normpath(posixpath.join(posixpath.dirname(importer), spec))
+    for suffix in _RESOLVE_SUFFIXES:
+        candidate = target + suffix
+        if candidate in known:
+            return candidate
+    stem, ext = posixpath.splitext(target)
+    # ESM-style TypeScript imports name the emitted ``.js`` file.
+    if ext in {".js", ".jsx"}:
+        for suffix in (".ts", ".tsx"):
+            if stem + suffix in known:
+                return stem + suffix
+    return None
+
+
+def semantic_paths_after_merge(merged_tree: Path, plan: MergePlan) -> Tuple[List[str], List[str]]:
+    """Return ``(write, delete)`` path lists for copying a semantic result out.
+
+    Context and backend files are excluded (their content comes from the
+    plan itself: as-is or Git's text merge); semantic paths the pipeline
+    removed are reported for deletion.
+    """
+
+    merged_tree = Path(merged_tree)
+    planned = {*plan.context, *plan.backend_paths}
+    present = {p.relative_to(merged_tree).as_posix() for p in merged_tree.rglob("*") if p.is_file()}
+    write = sorted(present - planned)
+    delete = sorted(set(plan.semantic) - present)
+    return write, delete
+
+
+def filter_ops_to_scope(ops: Iterable[Op], scope: Iterable[str]) -> List[Op]:
+    """Keep only ops that touch a path in *scope*."""
+
+    allowed = set(scope)
+    return [op for op in ops if touched_paths(op) & allowed]
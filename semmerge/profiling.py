@@ -0,0 +1,252 @@
+"""On-demand profiling of one command across the orchestrator and the worker.
+
+``semdiff``/``semmerge --profile DIR`` run under a :class:`ProfileSession`,
+which writes one bundle per run to ``DIR/<command>-<time>-<pid>/``:
+
+* ``orchestrator.pstats``: :mod:`cProfile` of the main thread (open it with
+  :mod:`pstats` or any pstats viewer).
+* ``python-samples.folded``: the stacks of every thread that is on a CPU,
+  sampled every :data:`SAMPLE_INTERVAL_S`, one ``phase;frame;...;frame count``
+  line per stack, as flame graph tools read them. Where ``/proc`` is
+  unavailable, every thread is sampled, blocked or not.
+* ``worker/``: the ``--cpu-prof`` and ``--heap-prof`` profiles of each
+  TypeScript worker. Profiled workers are never reused from the warm pool, and
+  are stopped by closing their input so that Node writes the profiles on exit.
+* ``rpc.json``: worker RPC messages and payload bytes per method and direction.
+* ``summary.txt``: phase timings, the functions with the most self time in
+  each phase, for Python and the worker alike, and the RPC payload sizes.
+
+Phases are marked with :func:`phase` (:meth:`TimeBudget.phase
+<semmerge.progress.TimeBudget.phase>` does so for merges). Worker samples are
+placed in phases by timestamp: V8's profiler and :func:`time.monotonic` read
+the same monotonic clock.
+
+Every hook in this module is a no-op when no session is active.
+"""
+from __future__ import annotations
+
+import contextlib
+import cProfile
+import json
+import os
+import pathlib
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from types import CodeType
+from typing import Any, ContextManager, Dict, Iterator, List, Tuple
+
+from .loggingx import logger
+
+SAMPLE_INTERVAL_S = 0.005
+# Functions listed per phase and process in summary.txt.
+TOP_FUNCTIONS = 10
+# Seconds a profiled worker gets to write its profiles after its input is closed.
+WORKER_EXIT_S = 30.0
+
+_session: "ProfileSession | None" = None
+
+
+class ProfileSession:
+    """Profile data of one command, written to *bundle* when the session ends."""
+
+    def __init__(self, bundle: pathlib.Path, command: str) -> None:
+        self.bundle = bundle
+        self.command = command
+        self.worker_dir = bundle / "worker"
+        self.phases: List[Tuple[str, float, float | None]] = []
+        self.samples: Counter[Tuple[str, ...]] = Counter()
+        self.rpc: Dict[str, Dict[str, int]] = defaultdict(Counter)  # type: ignore[arg-type]
+        self._current: List[str] = []
+        self._lock = threading.Lock()
+        self._profile = cProfile.Profile()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name="semmerge-profiler", daemon=True)
+        self._started = 0.0
+        self._wall = 0.0
+
+    def start(self) -> None:
+        self.worker_dir.mkdir(parents=True, exist_ok=True)
+        self._started = time.monotonic()
+        self._sampler.start()
+        self._profile.enable()
+
+    def stop(self) -> None:
+        self._profile.disable()
+        self._stop.set()
+        self._sampler.join()
+        self._wall = time.monotonic() - self._started
+        self._profile.dump_stats(str(self.bundle / "orchestrator.pstats"))
+        with (self.bundle / "python-samples.folded").open("w", encoding="utf-8") as fh:
+            for stack, count in sorted(self.samples.items()):
+                fh.write(f"{';'.join(stack)} {count}\n")
+        (self.bundle / "rpc.json").write_text(json.dumps(self.rpc, indent=2, sort_keys=True), encoding="utf-8")
+        (self.bundle / "summary.txt").write_text(self.summary(), encoding="utf-8")
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        with self._lock:
+            index = len(self.phases)
+            self.phases.append((name, time.monotonic(), None))
+            self._current.append(name)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases[index] = (name, self.phases[index][1], time.monotonic())
+                self._current.remove(name)
+
+    def phase_at(self, when: float) -> str:
+        """Name of the innermost phase running at monotonic time *when*."""
+
+        found = "other"
+        for name, start, end in self.phases:
+            if start <= when and (end is None or when < end):
+                found = name
+        return found
+
+    def record_rpc(self, method: str, direction: str, size: int) -> None:
+        with self._lock:
+            stats = self.rpc[method]
+            stats[f"{direction}Messages"] += 1
+            stats[f"{direction}Bytes"] += size
+            stats[f"{direction}LargestBytes"] = max(stats[f"{direction}LargestBytes"], size)
+
+    def summary(self) -> str:
+        lines = [f"semmerge profile: {self.command}", f"Wall time {self._wall:.2f}s", "", "Phases:"]
+        totals: Dict[str, float] = defaultdict(float)
+        for name, start, end in self.phases:
+            totals[name] += (end if end is not None else self._started + self._wall) - start
+        lines += [f"  {name:<12} {seconds:8.2f}s" for name, seconds in totals.items()] or ["  (none marked)"]
+
+        python: Dict[str, Counter[str]] = defaultdict(Counter)
+        for (name, *stack), count in self.samples.items():
+            python[name][stack[-1]] += count
+        worker: Dict[str, Counter[str]] = defaultdict(Counter)
+        for profile in sorted(self.worker_dir.glob("*.cpuprofile")):
+            for name, hot in worker_hot_functions(profile, self.phase_at).items():
+                worker[name].update(hot)
+        lines += ["", "Hot functions by phase (self time):"]
+        for name in [*totals, *sorted((python.keys() | worker.keys()) - totals.keys())]:
+            lines.append(f"  {name}")
+            for process, hot, unit in (("python", python[name], SAMPLE_INTERVAL_S * 1000), ("worker", worker[name], 1)):
+                total = sum(hot.values())
+                for label, amount in hot.most_common(TOP_FUNCTIONS):
+                    ms = amount * unit
+                    lines.append(f"    {process:<7} {ms:9.0f} ms {100 * amount / total:5.1f}%  {label}")
+            if not python[name] and not worker[name]:
+                lines.append("    (no samples)")
+
+        lines += ["", "RPC payloads:", f"  {'method':<18} {'sent':>8} {'bytes':>12} {'received':>9} {'bytes':>12}"]
+        for method, stats in sorted(self.rpc.items()):
+            lines.append(
+                f"  {method:<18} {stats['sentMessages']:>8} {stats['sentBytes']:>12}"
+                f" {stats['receivedMessages']:>9} {stats['receivedBytes']:>12}"
+            )
+        return "\n".join(lines) + "\n"
+
+    def _sample(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(SAMPLE_INTERVAL_S):
+            native = {thread.ident: thread.native_id for thread in threading.enumerate()}
+            with self._lock:
+                current = self._current[-1] if self._current else "other"
+            for ident, frame in sys._current_frames().items():
+                if ident == me or not _on_cpu(native.get(ident)):
+                    continue
+                stack: List[str] = []
+                while frame is not None:
+                    stack.append(_label(frame.f_code))
+                    frame = frame.f_back  # type: ignore[assignment]
+                self.samples[(current, *reversed(stack))] += 1
+
+
+def capture(directory: str | pathlib.Path | None, command: str) -> ContextManager[None]:
+    """Profile the enclosed command into a new bundle under *directory*; nothing without one."""
+
+    if directory is None:
+        return contextlib.nullcontext()
+    return _capture(pathlib.Path(directory), command)
+
+
+@contextlib.contextmanager
+def _capture(directory: pathlib.Path, command: str) -> Iterator[None]:
+    global _session
+    if _session is not None:
+        raise RuntimeError("A profile is already being captured in this process")
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    session = ProfileSession(directory / f"{command.split()[0]}-{stamp}-{os.getpid()}", command)
+    session.start()
+    _session = session
+    try:
+        yield
+    finally:
+        _session = None
+        session.stop()
+        logger.info("Profile written to %s", session.bundle)
+
+
+def active() -> bool:
+    return _session is not None
+
+
+def phase(name: str) -> ContextManager[None]:
+    """Mark the enclosed block as phase *name* of the active profile."""
+
+    return _session.phase(name) if _session is not None else contextlib.nullcontext()
+
+
+def worker_flags() -> List[str]:
+    """Node options that make a worker write CPU and heap profiles into the active bundle."""
+
+    if _session is None:
+        return []
+    out = str(_session.worker_dir)
+    return ["--cpu-prof", "--cpu-prof-dir", out, "--heap-prof", "--heap-prof-dir", out]
+
+
+def rpc_payload(method: str, direction: str, line: str) -> None:
+    """Count one RPC message of *method* ``sent`` to or ``received`` from a worker."""
+
+    if _session is not None:
+        _session.record_rpc(method, direction, len(line.encode("utf-8")))
+
+
+def worker_hot_functions(path: pathlib.Path, phase_at: Any) -> Dict[str, Counter[str]]:
+    """Self time in milliseconds per function of a V8 ``.cpuprofile``, by phase (``phase_at(seconds)``)."""
+
+    profile = json.loads(path.read_text(encoding="utf-8"))
+    labels: Dict[int, str] = {}
+    for node in profile.get("nodes", []):
+        frame = node["callFrame"]
+        name = frame.get("functionName") or "(anonymous)"
+        url = frame.get("url") or ""
+        labels[node["id"]] = f"{name} ({url.rsplit('/', 1)[-1]}:{frame.get('lineNumber', -1) + 1})" if url else name
+    hot: Dict[str, Counter[str]] = defaultdict(Counter)
+    when = profile.get("startTime", 0)
+    deltas = [*profile.get("timeDeltas", []), 0]
+    # timeDeltas[i] is the time since the previous sample; sample i lasts until sample i + 1.
+    for index, node_id in enumerate(profile.get("samples", [])):
+        when += deltas[index]
+        label = labels.get(node_id, "(unknown)")
+        if label != "(idle)":
+            hot[phase_at(when / 1e6)][label] += deltas[index + 1] / 1000
+    return hot
+
+
+def _label(code: CodeType) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _on_cpu(native_id: int | None) -> bool:
+    """Whether the thread is running (or runnable); ``True`` when the OS does not say."""
+
+    if native_id is None:
+        return True
+    try:
+        with open(f"/proc/self/task/{native_id}/stat", "rb") as fh:
+            stat = fh.read()
+    except OSError:
+        return True
+    return stat[stat.rfind(b")") + 2 : stat.rfind(b")") + 3] == b"R"
@@ -0,0 +1,140 @@
+"""Progress display and the time budget of a merge (NFR-PERF-003).
+
+:class:`ProgressView` renders the worker's ``$/progress`` notifications
+(files parsed and indexed per side): a status line on a terminal, otherwise
+a log line every few seconds once a merge runs long.
+
+:class:`TimeBudget` times every phase of a merge against
+``[core] time_budget_s``. A phase projected to overrun what is left of the
+budget switches to a cheaper strategy, and the switch is recorded in
+:attr:`TimeBudget.degraded` and logged:
+
+* ``syntax-index``: the worker indexes without the type checker. It decides
+  this itself, from its indexing rate, against the budget left when the
+  request was sent.
+* ``skip-format``: merged files are not run through the formatter.
+* ``scoped-typecheck``: only changed files and their importers are
+  type-checked.
+
+Projections for formatting and type-checking scale the worker's cost per
+file; they are rough, and meant to catch large overruns, not to be exact.
+"""
+from __future__ import annotations
+
+import contextlib
+import logging
+import sys
+import threading
+import time
+from typing import IO, Any, Dict, Iterator, List, Mapping
+
+from . import profiling
+from .loggingx import logger
+
+# Seconds to start a tool through npx (Prettier, tsc), added to projections.
+_TOOL_START_S = 1.0
+
+
+class TimeBudget:
+    """Phase timings of one merge, and the cheaper strategies taken to stay within *seconds*."""
+
+    def __init__(self, seconds: float | None) -> None:
+        self.seconds = seconds if seconds and seconds > 0 else None
+        self.started = time.monotonic()
+        self.timings: Dict[str, float] = {}
+        self.degraded: List[str] = []
+        # Files of the base tree the worker indexed: what a full type-check covers.
+        self.tree_files = 0
+        self._per_file: float | None = None
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def remaining(self) -> float | None:
+        """Seconds left, never negative; ``None`` without a budget."""
+
+        return None if self.seconds is None else max(0.0, self.seconds - self.elapsed())
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as phase *name* (added up if it runs more than once)."""
+
+        start = time.monotonic()
+        try:
+            with profiling.phase(name):
+                yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.monotonic() - start
+
+    def worker_report(self, result: Mapping[str, Any]) -> None:
+        """Take the timings, file counts and degradations from a worker ``buildAndDiff`` result."""
+
+        worker_ms = result.get("timings") or {}
+        for name, ms in worker_ms.items():
+            self.timings[f"worker {name}"] = ms / 1000
+        counts = result.get("files") or {}
+        self.tree_files = counts.get("base", 0)
+        files = sum(counts.values())
+        if files:
+            self._per_file = (worker_ms.get("parse", 0) + worker_ms.get("index", 0)) / 1000 / files
+        for what in result.get("degraded") or []:
+            self.degrade(what, "indexing was projected to overrun")
+
+    def fits(self, files: int) -> bool:
+        """Whether a tool run over *files* files is projected to finish within the budget."""
+
+        if self.seconds is None:
+            return True
+        return self.elapsed() + self.estimate(files) <= self.seconds
+
+    def estimate(self, files: int) -> float:
+        return _TOOL_START_S + (self._per_file or 0.0) * files
+
+    def degrade(self, what: str, reason: str) -> None:
+        self.degraded.append(what)
+        logger.warning("Time budget of %gs: %s (%s)", self.seconds or 0, what, reason)
+
+    def report(self) -> None:
+        """Log the phase timings: at INFO when the budget was exceeded or a phase degraded, else DEBUG."""
+
+        total = self.elapsed()
+        over = self.seconds is not None and total > self.seconds
+        level = logging.INFO if over or self.degraded else logging.DEBUG
+        phases = ", ".join(f"{name} {seconds:.1f}s" for name, seconds in self.timings.items())
+        budget = f" of {self.seconds:g}s budget" if self.seconds is not None else ""
+        logger.log(level, "Phase timings (%.1fs%s): %s", total, budget, phases or "none")
+
+
+class ProgressView:
+    """Render worker progress events on *stream* (stderr by default)."""
+
+    def __init__(self, stream: IO[str] | None = None, interval: float = 5.0) -> None:
+        self._stream = stream if stream is not None else sys.stderr
+        self._tty = bool(getattr(self._stream, "isatty", lambda: False)())
+        self._interval = interval
+        # Without a terminal, stay quiet for merges that finish within one interval.
+        self._last = time.monotonic()
+        self._shown = False
+        self._lock = threading.Lock()
+
+    def __call__(self, event: Mapping[str, Any]) -> None:
+        text = f"{event.get('phase')} {event.get('side')}: {event.get('done')}/{event.get('total')} files"
+        with self._lock:
+            if self._tty:
+                self._stream.write(f"\r\x1b[Ksemmerge: {text}")
+                self._stream.flush()
+                self._shown = True
+                return
+            now = time.monotonic()
+            if now - self._last >= self._interval:
+                self._last = now
+                logger.info("Progress: %s", text)
+
+    def close(self) -> None:
+        """Clear the status line."""
+
+        with self._lock:
+            if self._shown:
+                self._stream.write("\r\x1b[K")
+                self._stream.flush()
+                self._shown = False
@@ -0,0 +1,522 @@
+"""Long-running merge service (``semmerge serve``).
+
+The service accepts ``semmerge`` and ``semdiff`` jobs over a local HTTP API,
+on a TCP port bound to the loopback interface or on a Unix socket:
+
+* ``POST /jobs`` with ``{"command", "repo", "args", "priority"}`` queues a job
+  and returns it; an identical job that is still queued or running is
+  returned instead of a new one;
+* ``GET /jobs/<id>`` returns a job's state;
+* ``GET /jobs/<id>/events`` streams its events as NDJSON until it finishes
+  (``queued``, ``started``, ``log``, ``output``, ``finished``);
+* ``GET /stats`` reports queue depth, running jobs and wait/run latencies.
+
+Jobs run in a bounded pool of long-lived processes, so imports, the
+TypeScript worker (and its parse caches) and the on-disk tree cache and
+symbol index stay warm from one job to the next. Jobs for the same
+repository run one at a time, in priority then submission order; that is
+what serializes merge-driver runs.
+
+Only the standard library is imported at module level. The client side
+(:func:`run_remote`) lives in :mod:`semmerge.client`.
+"""
+from __future__ import annotations
+
+import contextlib
+import heapq
+import http.server
+import io
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import socket
+import socketserver
+import statistics
+import subprocess
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Iterator, List, Set, Tuple
+
+from .client import connect, default_socket, run_remote  # noqa: F401 - re-exported
+from .loggingx import logger
+
+COMMANDS = frozenset({"semmerge", "semdiff"})
+# Finished jobs kept for status queries.
+_HISTORY = 1000
+# Latency samples kept for ``/stats``.
+_SAMPLES = 512
+
+# (job id, event) tuples from the runners; ``None`` stops the reader.
+EventQueue = Any
+RunJob = Callable[[str, str, str, List[str]], int]
+
+
+@dataclass
+class Job:
+    """A queued, running or finished service job."""
+
+    id: str
+    command: str
+    repo: str
+    args: List[str]
+    priority: int = 0
+    state: str = "queued"
+    exit_code: int | None = None
+    error: str | None = None
+    submitted: float = field(default_factory=time.time)
+    started: float | None = None
+    finished: float | None = None
+    events: List[Dict[str, Any]] = field(default_factory=list)
+    _changed: threading.Condition = field(default_factory=threading.Condition, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self.state in ("done", "failed")
+
+    @property
+    def key(self) -> Tuple[str, str, Tuple[str, ...]]:
+        return self.repo, self.command, tuple(self.args)
+
+    def emit(self, event: Dict[str, Any]) -> None:
+        with self._changed:
+            self.events.append(event)
+            self._changed.notify_all()
+
+    def follow(self, timeout: float | None = None) -> Iterator[Dict[str, Any]]:
+        """Yield every event, blocking for new ones until the job finishes."""
+
+        seen = 0
+        while True:
+            with self._changed:
+                while seen == len(self.events) and not self.done:
+                    if not self._changed.wait(timeout):
+                        return
+                pending = self.events[seen:]
+                finished = self.done
+            seen += len(pending)
+            yield from pending
+            if finished and seen == len(self.events):
+                return
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "command": self.command,
+            "repo": self.repo,
+            "args": self.args,
+            "priority": self.priority,
+            "state": self.state,
+            "exitCode": self.exit_code,
+            "error": self.error,
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+class Scheduler:
+    """Run jobs on a bounded pool, one job per repository at a time.
+
+    *run* executes a job inside a pool worker and returns its exit code; it
+    reports progress through :func:`report`. With ``processes=False`` the
+    pool is made of threads (used by the tests).
+    """
+
+    def __init__(self, workers: int = 2, run: RunJob | None = None, processes: bool = True) -> None:
+        self.workers = max(1, workers)
+        self._run = run or run_job
+        self._processes = processes
+        self._cond = threading.Condition()
+        self._jobs: Dict[str, Job] = {}
+        self._history: Deque[str] = deque()
+        self._queued: List[Tuple[int, int, Job]] = []
+        self._seq = itertools.count()
+        self._busy: Set[str] = set()
+        # Running job -> outstanding completion signals (pool result, end of its event stream).
+        self._pending: Dict[str, int] = {}
+        self._outcomes: Dict[str, Tuple[str, int | None, str | None]] = {}
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._waits: Deque[float] = deque(maxlen=_SAMPLES)
+        self._runs: Deque[float] = deque(maxlen=_SAMPLES)
+        if processes:
+            context = multiprocessing.get_context("spawn")
+            self._events: EventQueue = context.Queue()
+        else:
+            self._events = queue.SimpleQueue()
+        self._executor = self._new_executor()
+        self._reader = threading.Thread(target=self._read_events, name="semmerge-events", daemon=True)
+        self._reader.start()
+
+    def submit(self, command: str, repo: str, args: List[str], priority: int = 0) -> Job:
+        """Queue a job, or return the identical job already queued or running."""
+
+        if command not in COMMANDS:
+            raise ValueError(f"unknown command {command!r}")
+        job = Job(id=uuid.uuid4().hex, command=command, repo=repo, args=list(args), priority=priority)
+        with self._cond:
+            for existing in self._jobs.values():
+                if not existing.done and existing.key == job.key:
+                    return existing
+            self._jobs[job.id] = job
+            # Lower priority values run first; equal priorities in submission order.
+            heapq.heappush(self._queued, (priority, next(self._seq), job))
+            job.emit({"event": "queued", "id": job.id})
+            self._dispatch()
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "queued": len(self._queued),
+                "running": self._running,
+                "completed": self._completed,
+                "failed": self._failed,
+                "busyRepos": len(self._busy),
+                "waitSeconds": _summarize(self._waits),
+                "runSeconds": _summarize(self._runs),
+            }
+
+    def close(self) -> None:
+        with self._cond:
+            for _priority, _seq, job in self._queued:
+                job.state, job.error = "failed", "service stopped"
+                job.emit({"event": "finished", "state": job.state, "exitCode": None, "error": job.error})
+            self._queued.clear()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._events.put(None)
+        self._reader.join(timeout=5)
+
+    # Internal helpers -------------------------------------------------
+
+    def _new_executor(self) -> Executor:
+        if self._processes:
+            return ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_runner,
+                initargs=(self._events,),
+            )
+        return ThreadPoolExecutor(max_workers=self.workers, initializer=_init_runner, initargs=(self._events,))
+
+    def _dispatch(self) -> None:
+        """Start queued jobs while workers are free; caller holds ``_cond``."""
+
+        deferred: List[Tuple[int, int, Job]] = []
+        while self._queued and self._running < self.workers:
+            entry = heapq.heappop(self._queued)
+            job = entry[2]
+            if job.repo in self._busy:
+                deferred.append(entry)
+                continue
+            self._busy.add(job.repo)
+            self._running += 1
+            job.state, job.started = "running", time.time()
+            self._waits.append(job.started - job.submitted)
+            job.emit({"event": "started", "id": job.id})
+            self._pending[job.id] = 2
+            executor = self._executor
+            future = executor.submit(_execute, self._run, job.id, job.command, job.repo, job.args)
+            future.add_done_callback(lambda fut, job=job, executor=executor: self._finished(job, fut, executor))
+        for entry in deferred:
+            heapq.heappush(self._queued, entry)
+
+    def _finished(self, job: Job, future: Future[int], executor: Executor) -> None:
+        with self._cond:
+            try:
+                self._outcomes[job.id] = ("done", future.result(), None)
+            except BaseException as exc:  # noqa: BLE001 - reported to the client
+                self._outcomes[job.id] = ("failed", None, str(exc) or type(exc).__name__)
+                if isinstance(exc, BrokenProcessPool) and job.id in self._pending:
+                    # The runner died with its event stream: nothing more will arrive.
+                    self._pending[job.id] = 1
+                    if executor is self._executor:
+                        logger.warning("Merge service worker process died; restarting the pool")
+                        self._executor = self._new_executor()
+            self._signal(job)
+
+    def _signal(self, job: Job) -> None:
+        """Record one completion signal; the job finishes once both have arrived."""
+
+        with self._cond:
+            if job.id not in self._pending:
+                return
+            self._pending[job.id] -= 1
+            if self._pending[job.id] > 0:
+                return
+            del self._pending[job.id]
+            job.state, job.exit_code, job.error = self._outcomes.pop(job.id)
+            job.finished = time.time()
+            self._runs.append(job.finished - (job.started or job.finished))
+            self._running -= 1
+            self._busy.discard(job.repo)
+            if job.state == "done":
+                self._completed += 1
+            else:
+                self._failed += 1
+            job.emit({"event": "finished", "state": job.state, "exitCode": job.exit_code, "error": job.error})
+            self._history.append(job.id)
+            while len(self._history) > _HISTORY:
+                self._jobs.pop(self._history.popleft(), None)
+            self._dispatch()
+
+    def _read_events(self) -> None:
+        while True:
+            item = self._events.get()
+            if item is None:
+                return
+            job_id, event = item
+            job = self.get(job_id)
+            if job is None:
+                continue
+            if event is None:
+                self._signal(job)
+            else:
+                job.emit(event)
+
+
+def _summarize(samples: Deque[float]) -> Dict[str, float | int]:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean": round(statistics.fmean(ordered), 4),
+        "p50": round(ordered[len(ordered) // 2], 4),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+        "max": round(ordered[-1], 4),
+    }
+
+
+# Pool-side ---------------------------------------------------------------
+
+_events: EventQueue | None = None
+_local = threading.local()
+
+
+def _init_runner(events: EventQueue) -> None:
+    global _events
+    _events = events
+
+
+def _execute(run: RunJob, job_id: str, command: str, repo: str, args: List[str]) -> int:
+    _local.job = job_id
+    try:
+        return run(job_id, command, repo, args)
+    finally:
+        _local.job = None
+        # Sent through the event queue so it arrives after everything the job reported.
+        if _events is not None:
+            _events.put((job_id, None))
+
+
+def report(event: Dict[str, Any]) -> None:
+    """Report *event* for the job running in this pool worker."""
+
+    job_id = getattr(_local, "job", None)
+    if _events is not None and job_id is not None:
+        _events.put((job_id, event))
+
+
+class _ForwardLogs(logging.Handler):
+    def emit(self, record: logging.LogRecord) -> None:
+        report({"event": "log", "level": record.levelname, "message": record.getMessage()})
+
+
+class _ForwardOutput(io.TextIOBase):
+    def __init__(self) -> None:
+        self._partial = ""
+
+    def write(self, text: str) -> int:
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            report({"event": "output", "line": line})
+        return len(text)
+
+    def flush(self) -> None:
+        if self._partial:
+            report({"event": "output", "line": self._partial})
+            self._partial = ""
+
+
+def run_job(job_id: str, command: str, repo: str, args: List[str]) -> int:  # noqa: ARG001 - RunJob signature
+    """Run one CLI command in *repo* inside a pool worker and return its exit code."""
+
+    import click
+
+    from . import __main__ as cli
+    from .pipeline import keep_workers_warm
+
+    # Pool workers handle one job at a time: keep a warm TypeScript worker between jobs.
+    keep_workers_warm()
+    handler = _ForwardLogs()
+    logger.addHandler(handler)
+    output = _ForwardOutput()
+    previous = os.getcwd()
+    try:
+        os.chdir(repo)
+        with contextlib.redirect_stdout(output):
+            code = cli.main.main(args=[command, *args], prog_name="semmerge", standalone_mode=False)
+        return code if isinstance(code, int) else 0
+    except SystemExit as exc:
+        return exc.code if isinstance(exc.code, int) else (0 if exc.code is None else 1)
+    except click.ClickException as exc:
+        report({"event": "log", "level": "ERROR", "message": exc.format_message()})
+        return exc.exit_code
+    finally:
+        output.flush()
+        logger.removeHandler(handler)
+        os.chdir(previous)
+
+
+# HTTP --------------------------------------------------------------------
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    server: "_ServiceMixin"
+    protocol_version = "HTTP/1.0"
+
+    def do_GET(self) -> None:  # noqa: N802 - http.server API
+        scheduler = self.server.scheduler
+        parts = [part for part in self.path.split("?")[0].split("/") if part]
+        if parts == ["stats"]:
+            self._json(200, scheduler.stats())
+        elif len(parts) in (2, 3) and parts[0] == "jobs":
+            job = scheduler.get(parts[1])
+            if job is None:
+                self._json(404, {"error": "unknown job"})
+            elif len(parts) == 2:
+                self._json(200, job.to_dict())
+            elif parts[2] == "events":
+                self._stream(job)
+            else:
+                self._json(404, {"error": "not found"})
+        else:
+            self._json(404, {"error": "not found"})
+
+    def do_POST(self) -> None:  # noqa: N802 - http.server API
+        if self.path.split("?")[0].rstrip("/") != "/jobs":
+            self._json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            command = str(body["command"])
+            repo = _repo_root(str(body["repo"]))
+            args = [str(arg) for arg in body.get("args", [])]
+            job = self.server.scheduler.submit(command, repo, args, priority=int(body.get("priority", 0)))
+        except (KeyError, TypeError, ValueError, OSError, subprocess.CalledProcessError) as exc:
+            self._json(400, {"error": str(exc)})
+            return
+        self._json(202, job.to_dict())
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002 - http.server API
+        logger.debug("serve: " + format, *args)
+
+    def _json(self, status: int, payload: Dict[str, Any]) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, job: Job) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        try:
+            for event in job.follow():
+                self.wfile.write(json.dumps(event).encode("utf-8") + b"\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            logger.debug("serve: client left the event stream of %s", job.id)
+
+
+class _ServiceMixin:
+    scheduler: Scheduler
+
+
+class _TCPServer(_ServiceMixin, http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class _UnixServer(_ServiceMixin, socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self) -> Tuple[socket.socket, Any]:
+        request, _addr = super().get_request()
+        # BaseHTTPRequestHandler expects a (host, port) client address.
+        return request, ("local", 0)
+
+
+def make_server(
+    scheduler: Scheduler, socket_path: str | None = None, host: str = "127.0.0.1", port: int = 8765
+) -> socketserver.BaseServer:
+    """Bind the HTTP API to *socket_path*, or to *host*:*port* without one."""
+
+    server: _TCPServer | _UnixServer
+    if socket_path:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(socket_path)
+        server = _UnixServer(socket_path, _Handler)
+        # Jobs run as this user: keep other users off the socket (it may sit in /tmp).
+        os.chmod(socket_path, 0o600)
+    else:
+        server = _TCPServer((host, port), _Handler)
+    server.scheduler = scheduler
+    return server
+
+
+def serve(socket_path: str | None = None, host: str = "127.0.0.1", port: int = 8765, workers: int = 2) -> None:
+    """Serve jobs until interrupted."""
+
+    scheduler = Scheduler(workers=workers)
+    server = make_server(scheduler, socket_path, host, port)
+    where = socket_path or f"http://{host}:{server.server_address[1]}"  # type: ignore[index]
+    logger.info("semmerge serve listening on %s with %d workers", where, scheduler.workers)
+    # Stop on SIGTERM (``kill``, service managers) as on Ctrl-C: closing the
+    # pool is what stops its processes' TypeScript workers.
+    previous = signal.signal(signal.SIGTERM, _interrupt)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+        server.server_close()
+        scheduler.close()
+        if socket_path:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(socket_path)
+
+
+def _interrupt(signum: int, frame: Any) -> None:  # noqa: ARG001 - signal handler signature
+    raise KeyboardInterrupt
+
+
+def _repo_root(path: str) -> str:
+    proc = subprocess.run(
+        ["git", "-C", path, "rev-parse", "--show-toplevel"],
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+    return os.path.realpath(proc.stdout.strip())
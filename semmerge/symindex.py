@@ -0,0 +1,267 @@
+"""Persistent per-commit symbol map index.
+
+The TypeScript worker reports a symbol map for every revision it indexes.
+:class:`SymbolIndex` keeps those maps in a SQLite database under
+``.git/semmerge/`` so later merges, range diffs and conflict reports can look
+symbols up without rebuilding a program, and so the worker can be seeded with
+the symbols of files whose content it has already indexed. Only the
+commits stored most recently are kept.
+"""
+from __future__ import annotations
+
+import pathlib
+import sqlite3
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Mapping
+
+from .git_api import git_dir
+
+_SCHEMA_VERSION = 5
+# Commits (per index mode) whose symbols are kept; older ones are pruned on store.
+_COMMITS_KEPT = 64
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS commits (
+    commit_id TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    complete INTEGER NOT NULL,
+    stored INTEGER NOT NULL,
+    PRIMARY KEY (commit_id, mode)
+);
+CREATE TABLE IF NOT EXISTS symbols (
+    commit_id TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    symbol_id TEXT NOT NULL,
+    address_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT,
+    path TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    "end" INTEGER NOT NULL,
+    file_hash TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    type_checked INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS symbols_by_symbol ON symbols (commit_id, mode, symbol_id);
+CREATE INDEX IF NOT EXISTS symbols_by_address ON symbols (commit_id, mode, address_id);
+CREATE INDEX IF NOT EXISTS symbols_by_path ON symbols (commit_id, mode, path);
+CREATE INDEX IF NOT EXISTS symbols_by_hash ON symbols (mode, file_hash);
+"""
+
+_COLUMNS = 'symbol_id, address_id, kind, name, path, start, "end", file_hash, fingerprint, type_checked'
+
+
+@dataclass(frozen=True)
+class SymbolEntry:
+    """A declaration recorded for one commit."""
+
+    symbolId: str
+    addressId: str
+    kind: str
+    name: str | None
+    file: str
+    start: int
+    end: int
+    fileHash: str
+    fingerprint: str = ""
+    # Resolved through the type checker, so the symbols depend on other files than this one.
+    typeChecked: bool = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "symbolId": self.symbolId,
+            "addressId": self.addressId,
+            "kind": self.kind,
+            "name": self.name,
+            "file": self.file,
+            "start": self.start,
+            "end": self.end,
+            "fileHash": self.fileHash,
+            "fingerprint": self.fingerprint,
+            "typeChecked": self.typeChecked,
+        }
+
+    @staticmethod
+    def from_dict(data: Mapping[str, Any]) -> "SymbolEntry":
+        return SymbolEntry(
+            symbolId=str(data["symbolId"]),
+            addressId=str(data["addressId"]),
+            kind=str(data.get("kind", "")),
+            name=data.get("name"),
+            file=str(data.get("file", "")),
+            start=int(data.get("start", 0)),
+            end=int(data.get("end", 0)),
+            fileHash=str(data.get("fileHash", "")),
+            fingerprint=str(data.get("fingerprint", "")),
+            typeChecked=bool(data.get("typeChecked", False)),
+        )
+
+
+class SymbolIndex:
+    """SQLite-backed symbolId↔addressId index keyed by commit.
+
+    Symbol IDs depend on the worker's indexing mode (see ``sast.IndexMode``), so
+    every map is stored and looked up under the *mode* that produced it.
+    """
+
+    def __init__(self, path: pathlib.Path, mode: str = "tiered") -> None:
+        self.path = pathlib.Path(path)
+        self.mode = mode
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # The orchestrator hands the index to worker threads, one at a time.
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        # Lookups are read-mostly; let SQLite serve pages straight from the mapped file.
+        self._conn.execute("PRAGMA mmap_size = 268435456")
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        (version,) = self._conn.execute("PRAGMA user_version").fetchone()
+        if version != _SCHEMA_VERSION:
+            # The index is a cache; rebuild it rather than migrating.
+            with self._conn:
+                self._conn.execute("DROP TABLE IF EXISTS symbols")
+                self._conn.execute("DROP TABLE IF EXISTS commits")
+        self._conn.executescript(_SCHEMA)
+        self._conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+    @staticmethod
+    def for_repo(mode: str = "tiered") -> "SymbolIndex":
+        """Open the index stored in the current repository's ``.git`` directory."""
+
+        return SymbolIndex(git_dir() / "semmerge" / "symbols.sqlite", mode=mode)
+
+    def has(self, commit: str) -> bool:
+        row = self._conn.execute(
+            "SELECT 1 FROM commits WHERE commit_id = ? AND mode = ? AND complete", (commit, self.mode)
+        ).fetchone()
+        return row is not None
+
+    def store(
+        self,
+        commit: str,
+        entries: Iterable[Mapping[str, Any]],
+        paths: Iterable[str] | None = None,
+    ) -> None:
+        """Record the symbol map of *commit*, replacing any previous copy.
+
+        When *paths* is given only those files are replaced and the commit is
+        not marked as fully indexed (see :meth:`has`). Commits beyond the
+        :data:`_COMMITS_KEPT` stored most recently are dropped.
+        """
+
+        rows = [
+            (
+                commit,
+                self.mode,
+                entry.symbolId,
+                entry.addressId,
+                entry.kind,
+                entry.name,
+                entry.file,
+                entry.start,
+                entry.end,
+                entry.fileHash,
+                entry.fingerprint,
+                entry.typeChecked,
+            )
+            for entry in map(SymbolEntry.from_dict, entries)
+        ]
+        with self._conn:
+            if paths is None:
+                self._conn.execute("DELETE FROM symbols WHERE commit_id = ? AND mode = ?", (commit, self.mode))
+            else:
+                self._conn.executemany(
+                    "DELETE FROM symbols WHERE commit_id = ? AND mode = ? AND path = ?",
+                    [(commit, self.mode, path) for path in paths],
+                )
+            self._conn.executemany(
+                f"INSERT INTO symbols (commit_id, mode, {_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.execute(
+                "INSERT INTO commits (commit_id, mode, complete, stored) "
+                "VALUES (?, ?, ?, (SELECT COALESCE(MAX(stored), 0) + 1 FROM commits)) "
+                "ON CONFLICT (commit_id, mode) DO UPDATE SET "
+                "complete = MAX(complete, excluded.complete), stored = excluded.stored",
+                (commit, self.mode, paths is None),
+            )
+            self._prune()
+
+    def lookup_symbol(self, commit: str, symbol_id: str) -> List[SymbolEntry]:
+        return self._select("AND symbol_id = ?", (commit, symbol_id))
+
+    def lookup_address(self, commit: str, address_id: str) -> SymbolEntry | None:
+        found = self._select("AND address_id = ?", (commit, address_id))
+        return found[0] if found else None
+
+    def entries_in_file(self, commit: str, path: str) -> List[SymbolEntry]:
+        return self._select("AND path = ?", (commit, path))
+
+    def seed(self, file_hashes: Iterable[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Return previously indexed symbols for each known content hash.
+
+        The result is keyed by file hash and uses the worker's seed format
+        (positions only; addresses are rebuilt from the file's current path).
+        Files whose symbols came from the type checker are left out: they
+        also depend on the files the checker read, which the hash does not
+        cover.
+        """
+
+        wanted = sorted(set(file_hashes))
+        seeds: Dict[str, List[Dict[str, Any]]] = {}
+        origin: Dict[str, tuple[str, str]] = {}
+        # Stay well below SQLite's bound-parameter limit.
+        for offset in range(0, len(wanted), 500):
+            chunk = wanted[offset : offset + 500]
+            marks = ",".join("?" for _ in chunk)
+            cursor = self._conn.execute(
+                f"SELECT commit_id, {_COLUMNS} FROM symbols WHERE mode = ? AND file_hash IN ({marks}) "
+                "AND NOT type_checked ORDER BY commit_id, path, start",
+                [self.mode, *chunk],
+            )
+            for commit, symbol_id, _address, kind, name, path, start, end, file_hash, fingerprint, _ in cursor:
+                # Identical content may appear at several paths or commits; one copy is enough.
+                if origin.setdefault(file_hash, (commit, path)) != (commit, path):
+                    continue
+                seeds.setdefault(file_hash, []).append(
+                    {
+                        "symbolId": symbol_id,
+                        "kind": kind,
+                        "name": name,
+                        "start": start,
+                        "end": end,
+                        "fingerprint": fingerprint,
+                    }
+                )
+        return seeds
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _prune(self) -> None:
+        stale = self._conn.execute(
+            "SELECT commit_id FROM commits WHERE mode = ? ORDER BY stored DESC LIMIT -1 OFFSET ?",
+            (self.mode, _COMMITS_KEPT),
+        ).fetchall()
+        pairs = [(commit, self.mode) for (commit,) in stale]
+        self._conn.executemany("DELETE FROM symbols WHERE commit_id = ? AND mode = ?", pairs)
+        self._conn.executemany("DELETE FROM commits WHERE commit_id = ? AND mode = ?", pairs)
+
+    def _select(self, where: str, args: tuple[Any, ...]) -> List[SymbolEntry]:
+        cursor = self._conn.execute(
+            f"SELECT {_COLUMNS} FROM symbols WHERE commit_id = ? AND mode = ? {where} ORDER BY path, start",
+            (args[0], self.mode, *args[1:]),
+        )
+        return [
+            SymbolEntry(
+                symbolId=symbol_id,
+                addressId=address_id,
+                kind=kind,
+                name=name,
+                file=path,
+                start=start,
+                end=end,
+                fileHash=file_hash,
+                fingerprint=fingerprint,
+                typeChecked=bool(type_checked),
+            )
+            for symbol_id, address_id, kind, name, path, start, end, file_hash, fingerprint, type_checked in cursor
+        ]
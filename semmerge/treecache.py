@@ -0,0 +1,287 @@
+"""Persistent cache of extracted revision trees.
+
+Merge queues check out the same base commit over and over. :class:`TreeCache`
+keeps extracted trees under ``.git/semmerge/trees/<tree-oid>/`` so a repeated
+revision costs nothing, and builds a new tree by hard-linking every blob it
+shares with the closest cached neighbour and extracting only the paths that
+differ. Trees are evicted least-recently-used against a disk budget.
+
+Cached trees are shared and must be treated as read-only: callers copy them
+before modifying anything (``apply_ops`` already does).
+
+Concurrency: every user holds a shared ``flock`` on ``trees/.lock`` while it
+uses cached trees, and eviction only runs under an exclusive lock, so a tree
+is never removed from under a running merge. A run that finds the cache in
+use defers eviction to the last run releasing it (``trees/.evict-pending``),
+so overlapping runs cannot keep the cache growing. New trees are built in a private
+temporary directory and renamed into place atomically; when two processes
+build the same tree the loser discards its copy.
+"""
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+import shutil
+import subprocess
+import tempfile
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+from .git_api import git_dir, list_tree_entries, read_blobs, resolve_revs
+from .loggingx import logger
+
+try:  # pragma: no cover - platform dependent
+    import fcntl
+except ImportError:  # pragma: no cover - Windows has no flock; run without cross-process locking
+    fcntl = None  # type: ignore[assignment]
+
+Manifest = Dict[str, Tuple[str, str]]
+
+# Only the most recently used trees are considered as hardlink sources.
+_NEIGHBOUR_CANDIDATES = 8
+# Marks an eviction skipped because the cache was in use.
+_EVICT_PENDING = ".evict-pending"
+
+
+class TreeCache:
+    """LRU cache of checked-out trees keyed by tree OID."""
+
+    def __init__(self, root: pathlib.Path, budget_mb: int = 2048) -> None:
+        self.root = pathlib.Path(root)
+        self.budget = budget_mb * 1024 * 1024
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock_fd: int | None = None
+
+    @staticmethod
+    def for_repo(budget_mb: int = 2048) -> "TreeCache":
+        """Open the cache stored in the current repository's ``.git`` directory."""
+
+        return TreeCache(git_dir() / "semmerge" / "trees", budget_mb=budget_mb)
+
+    def __enter__(self) -> "TreeCache":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def checkout(self, rev: str) -> pathlib.Path:
+        """Return a cached, read-only tree for *rev*."""
+
+        return self.checkout_many([rev])[0]
+
+    def checkout_many(self, revs: Sequence[str]) -> List[pathlib.Path]:
+        """Return cached, read-only trees for *revs*, building missing ones.
+
+        The first call acquires the cache lease (evicting first when nobody
+        else holds it); the lease is kept until :meth:`close`.
+        """
+
+        trees = resolve_revs([f"{rev}^{{tree}}" for rev in revs])
+        self._acquire()
+        out: List[pathlib.Path] = []
+        for tree in trees:
+            path = self.root / tree
+            manifest = self._manifest_path(tree)
+            if path.is_dir() and manifest.is_file():
+                os.utime(manifest)
+                logger.debug("tree cache hit %s", tree)
+            else:
+                self._build(tree)
+            out.append(path)
+        return out
+
+    def close(self) -> None:
+        """Release the cache lease, evicting first if an eviction was deferred and nobody else holds it."""
+
+        if self._lock_fd is None:
+            return
+        fd, self._lock_fd = self._lock_fd, None
+        try:
+            if fcntl is not None and (self.root / _EVICT_PENDING).exists():
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    pass  # Still in use: the last run to release the cache evicts.
+                else:
+                    self.evict()
+        finally:
+            os.close(fd)
+
+    def evict(self) -> None:
+        """Evict least-recently-used trees until the cache fits the budget.
+
+        Callers must hold the exclusive lock (see :meth:`_acquire` and
+        :meth:`close`). The budget is enforced before a run adds its own
+        trees, or when the last of several overlapping runs releases the
+        cache, so the cache can exceed it by the trees of the runs in flight.
+        """
+
+        (self.root / _EVICT_PENDING).unlink(missing_ok=True)
+        # Nobody can be building while the exclusive lock is held: leftovers are from crashed runs.
+        for stale in self.root.glob(".tmp-*"):
+            if stale.is_dir():
+                shutil.rmtree(stale, ignore_errors=True)
+            else:
+                stale.unlink(missing_ok=True)
+        for orphan in self.root.iterdir():
+            # A run that died between renaming a tree into place and writing its manifest.
+            if orphan.is_dir() and not orphan.name.startswith(".") and not self._manifest_path(orphan.name).is_file():
+                shutil.rmtree(orphan, ignore_errors=True)
+
+        trees = sorted(self._cached_trees(), key=lambda tree: self._manifest_path(tree).stat().st_mtime)
+        inodes: Dict[str, set[Tuple[int, int]]] = {}
+        sizes: Dict[Tuple[int, int], int] = {}
+        for tree in trees:
+            held = set()
+            for dirpath, _dirs, files in os.walk(self.root / tree):
+                for name in files:
+                    st = os.lstat(os.path.join(dirpath, name))
+                    key = (st.st_dev, st.st_ino)
+                    held.add(key)
+                    sizes[key] = st.st_size
+            inodes[tree] = held
+        holders = Counter(key for held in inodes.values() for key in held)
+        total = sum(sizes.values())
+
+        for tree in trees:
+            if total <= self.budget:
+                break
+            for key in inodes[tree]:
+                holders[key] -= 1
+                if holders[key] == 0:
+                    total -= sizes[key]
+            self._manifest_path(tree).unlink(missing_ok=True)
+            shutil.rmtree(self.root / tree, ignore_errors=True)
+            logger.debug("tree cache evicted %s", tree)
+
+    def _acquire(self) -> None:
+        if self._lock_fd is not None:
+            return
+        fd = os.open(self.root / ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        self._lock_fd = fd
+        if fcntl is None:  # pragma: no cover - Windows
+            self.evict()
+            return
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            # Another run is using (or evicting) the cache; leave eviction to whoever releases it last.
+            (self.root / _EVICT_PENDING).touch()
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            return
+        try:
+            self.evict()
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_SH)
+
+    def _build(self, tree: str) -> None:
+        entries = list_tree_entries(tree)
+        tmp = pathlib.Path(tempfile.mkdtemp(prefix=".tmp-", dir=self.root))
+        try:
+            neighbour, neighbour_manifest = self._best_neighbour(entries)
+            if neighbour is None:
+                _extract_archive(tree, tmp)
+                linked = 0
+            else:
+                linked = _link_from(neighbour, neighbour_manifest, entries, tree, tmp)
+            logger.debug(
+                "tree cache built %s (%d files, %d hardlinked from %s)",
+                tree,
+                len(entries),
+                linked,
+                neighbour.name if neighbour is not None else "-",
+            )
+            try:
+                os.rename(tmp, self.root / tree)
+            except OSError:
+                # A concurrent run finished the same tree first; use its copy.
+                shutil.rmtree(tmp, ignore_errors=True)
+            manifest = self._manifest_path(tree)
+            if not manifest.is_file():
+                staged = self.root / f".tmp-{tree}-{os.getpid()}.json"
+                staged.write_text(json.dumps(entries), encoding="utf-8")
+                os.replace(staged, manifest)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+    def _best_neighbour(self, entries: Manifest) -> Tuple[pathlib.Path | None, Manifest]:
+        best: Tuple[pathlib.Path | None, Manifest] = (None, {})
+        best_shared = 0
+        recent = sorted(
+            self._cached_trees(),
+            key=lambda tree: self._manifest_path(tree).stat().st_mtime,
+            reverse=True,
+        )[:_NEIGHBOUR_CANDIDATES]
+        wanted = {oid for _mode, oid in entries.values()}
+        for tree in recent:
+            try:
+                manifest = {
+                    path: (mode, oid)
+                    for path, (mode, oid) in json.loads(self._manifest_path(tree).read_text("utf-8")).items()
+                }
+            except (OSError, ValueError):
+                continue
+            shared = sum(1 for _mode, oid in manifest.values() if oid in wanted)
+            if shared > best_shared:
+                best, best_shared = (self.root / tree, manifest), shared
+        return best
+
+    def _cached_trees(self) -> List[str]:
+        return [
+            path.stem
+            for path in self.root.glob("*.json")
+            if not path.name.startswith(".") and (self.root / path.stem).is_dir()
+        ]
+
+    def _manifest_path(self, tree: str) -> pathlib.Path:
+        return self.root / f"{tree}.json"
+
+
+def _extract_archive(tree: str, dest: pathlib.Path) -> None:
+    archive = subprocess.Popen(["git", "archive", tree], stdout=subprocess.PIPE)
+    try:
+        subprocess.run(["tar", "-xf", "-"], cwd=dest, stdin=archive.stdout, check=True)
+    finally:
+        if archive.stdout is not None:
+            archive.stdout.close()
+        if archive.wait() != 0:
+            raise subprocess.CalledProcessError(archive.returncode, "git archive")
+
+
+def _link_from(neighbour: pathlib.Path, manifest: Manifest, entries: Manifest, tree: str, dest: pathlib.Path) -> int:
+    """Populate *dest* with *entries*, hard-linking blobs present in *neighbour*."""
+
+    by_oid: Dict[str, str] = {}
+    for path, (mode, oid) in manifest.items():
+        if mode != "120000":
+            by_oid.setdefault(oid, path)
+    missing: List[str] = []
+    linked = 0
+    for path, (mode, oid) in entries.items():
+        source = by_oid.get(oid)
+        # Executable bits live on the inode, so only link blobs with the same mode.
+        if mode == "120000" or source is None or manifest[source][0] != mode:
+            missing.append(path)
+            continue
+        target = dest / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(neighbour / source, target)
+            linked += 1
+        except OSError:
+            missing.append(path)
+    for path, data in read_blobs(tree, missing).items():
+        if data is None:
+            continue
+        mode = entries[path][0]
+        target = dest / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if mode == "120000":
+            os.symlink(os.fsdecode(data), target)
+            continue
+        target.write_bytes(data)
+        if mode == "100755":
+            target.chmod(0o755)
+    return linked
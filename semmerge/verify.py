@@ -1,25 +1,42 @@
 """Verification routines for merged outputs."""
 from __future__ import annotations
 
+import json
 import pathlib
 import subprocess
-from typing import List, Tuple
+from typing import List, Sequence, Tuple
 
 from .loggingx import logger
 
+_SCOPED_TSCONFIG = ".semmerge-tsconfig.json"
 
-def typecheck_ts(tree_path: pathlib.Path) -> Tuple[bool, List[str]]:
+
+def typecheck_ts(tree_path: pathlib.Path, files: Sequence[str] | None = None) -> Tuple[bool, List[str]]:
     """Run ``tsc --noEmit`` for the project rooted at ``tree_path``.
 
+    When *files* is given only those files (and what they import) are
+    checked, with the compiler options of the tree's ``tsconfig.json``.
+
     When the TypeScript compiler is not installed the function returns success
     and an empty diagnostics list, matching the fallback behaviour described in
     the requirements.
     """
 
     tree_path = pathlib.Path(tree_path)
+    project = "."
+    scoped: pathlib.Path | None = None
+    if files is not None:
+        if not files:
+            return True, []
+        scoped = tree_path / _SCOPED_TSCONFIG
+        config: dict = {"files": list(files), "include": []}
+        if (tree_path / "tsconfig.json").is_file():
+            config["extends"] = "./tsconfig.json"
+        scoped.write_text(json.dumps(config), encoding="utf-8")
+        project = _SCOPED_TSCONFIG
     try:
         proc = subprocess.run(
-            ["npx", "tsc", "-p", ".", "--noEmit"],
+            ["npx", "tsc", "-p", project, "--noEmit"],
             cwd=tree_path,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
@@ -28,5 +45,8 @@ def typecheck_ts(tree_path: pathlib.Path) -> Tuple[bool, List[str]]:
     except FileNotFoundError:
         logger.debug("TypeScript compiler not available; skipping type-check")
         return True, []
+    finally:
+        if scoped is not None:
+            scoped.unlink(missing_ok=True)
     output = proc.stdout.splitlines()
     return proc.returncode == 0, output
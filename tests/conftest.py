@@ -0,0 +1,45 @@
+import subprocess
+from pathlib import Path
+
+import pytest
+
+
+class GitRepo:
+    """A scratch repository; commits are made as a fixed test identity."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    def git(self, *args: str) -> str:
+        proc = subprocess.run(
+            ["git", "-c", "user.name=t", "-c", "user.email=t@example.com", *args],
+            cwd=self.path,
+            check=True,
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        return proc.stdout.strip()
+
+    def commit(self, files: dict, message: str) -> str:
+        """Write *files* (``None`` deletes one), commit everything and return the commit id."""
+
+        for rel, content in files.items():
+            target = self.path / rel
+            if content is None:
+                target.unlink()
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_text(content)
+        self.git("add", "-A")
+        self.git("commit", "-q", "-m", message)
+        return self.git("rev-parse", "HEAD")
+
+
+@pytest.fixture
+def git_repo(tmp_path) -> GitRepo:
+    """An empty repository in ``tmp_path / "repo"``."""
+
+    repo = GitRepo(tmp_path / "repo")
+    repo.path.mkdir()
+    repo.git("init", "-q")
+    return repo
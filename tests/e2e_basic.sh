@@ -32,7 +32,7 @@ git mv a.ts lib/a.ts
 git commit -am "move a.ts to lib" -q
 
 git checkout -q main
-git config merge.semerge.driver "python3 $PROJECT_ROOT/scripts/semmerge-driver.py %O %A %B"
+git config merge.semerge.driver "python3 $PROJECT_ROOT/scripts/semmerge-driver.py %O %A %B %P"
 cat > .gitattributes <<'ATTR'
 *.ts merge=semmerge
 ATTR
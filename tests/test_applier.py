@@ -0,0 +1,74 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from semmerge.applier import apply_ops
+from semmerge.ops import Op, Target
+
+
+def test_on_file_fires_once_after_last_touch(tmp_path):
+    base = tmp_path / "base"
+    (base / "src").mkdir(parents=True)
+    (base / "src/a.ts").write_text("export function foo() {}\nexport const qq = foo();\n")
+    (base / "src/b.ts").write_text("export const y = 1;\n")
+    ops = [
+        Op.new("renameSymbol", Target("s1"), {"file": "src/a.ts", "oldName": "foo", "newName": "bar"}),
+        Op.new("moveFile", Target("s2"), {"oldPath": "src/b.ts", "newPath": "src/c.ts"}),
+        Op.new("modifyImport", Target("s3"), {"file": "src/a.ts", "oldImport": "qq", "newImport": "zz"}),
+    ]
+    seen = []
+
+    def on_file(tree: Path, path: Path) -> None:
+        seen.append((path.relative_to(tree).as_posix(), path.read_text()))
+
+    merged = apply_ops(base, ops, on_file=on_file)
+
+    assert seen == [
+        ("src/c.ts", "export const y = 1;\n"),
+        ("src/a.ts", "export function bar() {}\nexport const zz = bar();\n"),
+    ]
+    assert (merged / "src/a.ts").read_text() == seen[1][1]
+
+
+def test_rename_references_are_applied_as_span_edits(tmp_path):
+    base = tmp_path / "base"
+    (base / "src").mkdir(parents=True)
+    util = "export function foo() {}\n"
+    main = 'import { foo } from "./util";\r\nconst s = "foo 😀";\r\nexport const o = { foo };\r\nfoo();\r\n'
+    (base / "src/util.ts").write_text(util, newline="")
+    (base / "src/main.ts").write_text(main, newline="")
+    (base / "src/other.ts").write_text("const foo = 1;\n")
+
+    def span(text, needle, nth=0):
+        start = -1
+        for _ in range(nth + 1):
+            start = text.index(needle, start + 1)
+        # Worker offsets are UTF-16 code units.
+        units = len(text[:start].encode("utf-16-le")) // 2
+        return units, units + len(needle)
+
+    refs = [
+        {"file": "src/util.ts", "start": 16, "end": 19},
+        {"file": "src/main.ts", **dict(zip(("start", "end"), span(main, "foo")))},
+        {"file": "src/main.ts", **dict(zip(("start", "end"), span(main, "foo", 2))), "shorthand": True},
+        {"file": "src/main.ts", **dict(zip(("start", "end"), span(main, "foo", 3)))},
+    ]
+    ops = [
+        Op.new("moveFile", Target("s0"), {"oldPath": "src/main.ts", "newPath": "src/app.ts"}),
+        Op.new(
+            "renameSymbol",
+            Target("s1"),
+            {"file": "src/util.ts", "oldName": "foo", "newName": "bar", "references": refs},
+        ),
+    ]
+    seen = []
+
+    merged = apply_ops(base, ops, on_file=lambda tree, path: seen.append(path.relative_to(tree).as_posix()))
+
+    assert (merged / "src/util.ts").read_text() == "export function bar() {}\n"
+    assert (merged / "src/app.ts").read_bytes().decode() == (
+        'import { bar } from "./util";\r\nconst s = "foo 😀";\r\nexport const o = { foo: bar };\r\nbar();\r\n'
+    )
+    assert (merged / "src/other.ts").read_text() == "const foo = 1;\n"
+    assert sorted(seen) == ["src/app.ts", "src/util.ts"]
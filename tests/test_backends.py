@@ -0,0 +1,114 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from semmerge import pipeline
+from semmerge.backends import BackendScheduler, load_backend
+from semmerge.config import LanguageConfig
+
+
+def _languages() -> dict:
+    return {
+        "typescript": LanguageConfig(enabled=True, project_globs=["**/tsconfig.json"]),
+        "alpha": LanguageConfig(enabled=True, project_globs=["lib/**"], backend="echo"),
+        "beta": LanguageConfig(enabled=True, project_globs=["**/*.echo"], backend="echo"),
+        "gamma": LanguageConfig(enabled=False, project_globs=["**"], backend="echo"),
+    }
+
+
+def _tree(root: Path, files: dict) -> Path:
+    for rel, content in files.items():
+        target = root / rel
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(content)
+    return root
+
+
+def test_partition_uses_globs_in_language_order():
+    scheduler = BackendScheduler(_languages(), ignored=lambda path: path.startswith("vendor/"))
+
+    parts = scheduler.partition(
+        ["lib/a.echo", "lib/b.txt", "src/c.echo", "lib/d.ts", "vendor/e.echo", "README.md", "src/c.echo"]
+    )
+
+    assert scheduler.languages == ["alpha", "beta"]
+    assert parts == {"alpha": ["lib/a.echo", "lib/b.txt"], "beta": ["src/c.echo"]}
+    assert BackendScheduler({"typescript": LanguageConfig(enabled=True)}).partition(["a.echo"]) == {}
+
+
+def test_backends_run_in_separate_processes_with_deterministic_results(tmp_path):
+    base = _tree(tmp_path / "base", {"lib/a.echo": "1", "src/b.echo": "1", "src/c.echo": "1"})
+    left = _tree(tmp_path / "left", {"lib/a.echo": "2", "src/b.echo": "1", "src/c.echo": "1", "src/new.echo": "n"})
+    right = _tree(tmp_path / "right", {"lib/a.echo": "1", "src/b.echo": "3"})
+    trees = {"base": base, "left": left, "right": right}
+    scheduler = BackendScheduler(_languages())
+    parts = scheduler.partition(["lib/a.echo", "src/b.echo", "src/c.echo", "src/new.echo"])
+
+    first = asyncio.run(scheduler.run(trees, parts))
+    again = asyncio.run(scheduler.run(trees, parts))
+
+    left_ops, right_ops = first
+    assert [(op.type, op.params["file"]) for op in left_ops] == [
+        ("editStmtBlock", "lib/a.echo"),
+        ("addDecl", "src/new.echo"),
+    ]
+    assert [(op.type, op.params["file"]) for op in right_ops] == [
+        ("editStmtBlock", "src/b.echo"),
+        ("deleteDecl", "src/c.echo"),
+    ]
+    pids = {op.params["file"]: op.provenance["pid"] for op in [*left_ops, *right_ops]}
+    assert pids["lib/a.echo"] != pids["src/b.echo"]
+    assert os.getpid() not in pids.values()
+    assert [[op.id for op in log] for log in again] == [[op.id for op in log] for log in first]
+
+
+def test_backend_failures_name_the_language(tmp_path):
+    trees = {side: _tree(tmp_path / side, {"A.java": side}) for side in ("base", "left", "right")}
+    placeholder = "semmerge.lang.java.bridge:JavaWorker"
+    java = LanguageConfig(enabled=True, project_globs=["**/*.java"], backend=placeholder)
+    scheduler = BackendScheduler({"java": java})
+
+    with pytest.raises(RuntimeError, match="java backend failed"):
+        asyncio.run(scheduler.run(trees, scheduler.partition(["A.java"])))
+    with pytest.raises(ValueError):
+        load_backend("cobol")
+
+
+def test_unregistered_backends_are_rejected_up_front():
+    # The Java and C# bridges are placeholders; enabling them must not get as far as a merge.
+    for name in ("java", "csharp"):
+        with pytest.raises(ValueError, match=rf"Unknown language backend '{name}' for \[languages.{name}\]"):
+            BackendScheduler({name: LanguageConfig(enabled=True, project_globs=["**/*"])})
+    assert BackendScheduler({"java": LanguageConfig(enabled=False)}).languages == []
+
+
+class _NoTypeScript:
+    """Stands in for the TypeScript worker when no TypeScript file changed."""
+
+    def stream_snapshot(self, name, tree, paths=None, removed=None):  # noqa: ANN001
+        pass
+
+    def build_and_diff(self, base_tree, left_tree, right_tree, **kwargs):  # noqa: ANN001
+        return [], [], {}
+
+
+def test_planned_merge_keeps_both_edits_of_files_a_backend_claims(git_repo, monkeypatch):
+    config = '[languages.notes]\nenabled = true\nbackend = "echo"\nproject_globs = ["**/*.txt"]\n'
+    base = git_repo.commit({".semmerge.toml": config, "notes.txt": "one\ntwo\nthree\n"}, "base")
+    left = git_repo.commit({"notes.txt": "ONE\ntwo\nthree\n"}, "left")
+    git_repo.git("checkout", "-q", base)
+    right = git_repo.commit({"notes.txt": "one\ntwo\nTHREE\n"}, "right")
+    git_repo.git("checkout", "-q", left)
+    monkeypatch.chdir(git_repo.path)
+    monkeypatch.setattr(pipeline, "_start_worker", lambda mode: _NoTypeScript())
+    monkeypatch.setattr(pipeline, "_release_worker", lambda worker: None)
+    monkeypatch.setattr(pipeline, "typecheck_ts", lambda tree, files=None: (True, []))
+    monkeypatch.setattr(pipeline, "emit_files", lambda tree, paths: None)
+
+    assert pipeline.run_semmerge(base, left, right, inplace=True) == 0
+    assert (git_repo.path / "notes.txt").read_text() == "ONE\ntwo\nTHREE\n"
@@ -6,13 +6,22 @@ import pytest
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 
 from semmerge import __main__ as cli
+from semmerge import pipeline
 
 
 class DummyWorker:
     def __init__(self, close_calls: list[bool]) -> None:
         self._close_calls = close_calls
 
-    def build_and_diff(self, base_tree, left_tree, right_tree):  # noqa: ANN001
+    def start(self) -> None:
+        pass
+
+    def stream_snapshot(self, name, tree, paths=None) -> None:  # noqa: ANN001
+        pass
+
+    def build_and_diff(  # noqa: ANN001
+        self, base_tree, left_tree, right_tree, symbol_index=None, progress=None, budget=None
+    ):
         return ["left"], ["right"], {}
 
     def close(self) -> None:
@@ -23,19 +32,22 @@ def test_semerge_propagates_exceptions_before_apply_ops(monkeypatch, tmp_path):
     sentinel = RuntimeError("compose failure")
     close_calls: list[bool] = []
 
-    monkeypatch.setattr(cli, "TSWorker", lambda: DummyWorker(close_calls))
+    monkeypatch.setattr(pipeline, "TSWorker", lambda **kwargs: DummyWorker(close_calls))
+    monkeypatch.setattr(pipeline, "_open_symbol_index", lambda mode: None)
+    monkeypatch.setattr(pipeline, "_open_tree_cache", lambda: None)
+    monkeypatch.setattr(pipeline, "list_tree", lambda rev: {})
 
     def fake_checkout_tree_to_temp(rev: str) -> Path:
         path = tmp_path / rev
         path.mkdir(exist_ok=True)
         return path
 
-    monkeypatch.setattr(cli, "checkout_tree_to_temp", fake_checkout_tree_to_temp)
+    monkeypatch.setattr(pipeline, "checkout_tree_to_temp", fake_checkout_tree_to_temp)
 
     def raise_on_compose(*args, **kwargs):  # noqa: ANN002, ANN003
         raise sentinel
 
-    monkeypatch.setattr(cli, "compose_oplogs", raise_on_compose)
+    monkeypatch.setattr(pipeline, "compose_oplogs", raise_on_compose)
 
     with pytest.raises(RuntimeError) as excinfo:
         cli.semmerge.callback("base", "a", "b", inplace=False, git=False)
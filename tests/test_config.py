@@ -0,0 +1,25 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from semmerge.config import load_config
+
+
+def test_unknown_index_mode_is_rejected(tmp_path):
+    (tmp_path / ".semmerge.toml").write_text('[languages.typescript]\nenabled = true\nindex_mode = "fulll"\n')
+
+    with pytest.raises(ValueError, match="Unknown index_mode 'fulll' for language 'typescript'"):
+        load_config(tmp_path)
+
+    (tmp_path / ".semmerge.toml").write_text('[languages.typescript]\nenabled = true\nindex_mode = "full"\n')
+    assert load_config(tmp_path).languages["typescript"].index_mode == "full"
+
+
+def test_time_budget_is_opt_in(tmp_path):
+    assert load_config(tmp_path).core.time_budget_s == 0
+
+    (tmp_path / ".semmerge.toml").write_text("[core]\ntime_budget_s = 45\n")
+    assert load_config(tmp_path).core.time_budget_s == 45
@@ -0,0 +1,82 @@
+import json
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from semmerge import conflict as conflict_module
+from semmerge import pipeline
+from semmerge.conflict import (
+    CONFLICTS_JSON,
+    CONFLICTS_NDJSON,
+    conflict_divergent_rename,
+    conflict_text_merge,
+    with_slices,
+    write_reports,
+)
+from semmerge.ops import Op, Target
+
+
+def _rename_conflict(name: str, new_a: str, new_b: str, symbol_id: str = ""):
+    target = Target(symbolId=symbol_id or name, addressId=f"{name}-address")
+    return conflict_divergent_rename(
+        Op.new("renameSymbol", target, {"oldName": name, "newName": new_a}),
+        Op.new("renameSymbol", target, {"oldName": name, "newName": new_b}),
+    )
+
+
+def test_slices_are_cut_per_file_in_utf16_offsets(tmp_path, monkeypatch):
+    (tmp_path / "a.ts").write_text('const s = "\U0001F600";\nexport function f() {}\nexport function g() {}\n')
+    (tmp_path / "b.ts").write_text("export const h = 1;\n")
+    # UTF-16 offsets: the emoji counts as two units.
+    ranges = {"f-address": ("a.ts", 16, 38), "g-address": ("a.ts", 39, 61), "h-address": ("b.ts", 0, 19)}
+    reads: list = []
+    read_spans = conflict_module._read_spans
+
+    def counting_read_spans(path, spans):
+        reads.append(path.name)
+        return read_spans(path, spans)
+
+    monkeypatch.setattr(conflict_module, "_read_spans", counting_read_spans)
+    conflicts = [_rename_conflict("h", "h1", "h2"), conflict_text_merge("x.json"), _rename_conflict("f", "f1", "f2")]
+    conflicts.append(_rename_conflict("g", "g1", "g2"))
+
+    payloads = list(with_slices(conflicts, tmp_path, ranges.get))
+
+    assert reads == ["a.ts", "b.ts"]
+    assert [payload["symbolId"] for payload in payloads] == ["", "f", "g", "h"]
+    assert payloads[0]["minimalSlice"] == {"path": "x.json", "start": 0, "end": 0, "code": ""}
+    assert payloads[1]["minimalSlice"] == {"path": "a.ts", "start": 16, "end": 38, "code": "export function f() {}"}
+    assert payloads[2]["minimalSlice"]["code"] == "export function g() {}"
+    assert payloads[3]["minimalSlice"]["code"] == "export const h = 1;"
+
+
+def test_slices_of_same_shape_declarations_follow_the_base_address(tmp_path):
+    (tmp_path / "a.ts").write_text("export function f() {}\nexport function g() {}\n")
+    # Symbol ids hash the signature shape, so f and g share one.
+    symbol_maps = {
+        "base": [
+            {"symbolId": "fn()->void", "addressId": "f-address", "file": "a.ts", "start": 0, "end": 22},
+            {"symbolId": "fn()->void", "addressId": "g-address", "file": "a.ts", "start": 23, "end": 45},
+        ]
+    }
+    conflicts = [_rename_conflict("f", "f1", "f2", symbol_id="fn()->void")]
+
+    payloads = list(with_slices(conflicts, tmp_path, pipeline._symbol_map_ranges(symbol_maps)))
+
+    assert payloads[0]["addressIds"]["base"] == "f-address"
+    assert payloads[0]["minimalSlice"]["code"] == "export function f() {}"
+
+
+def test_reports_stream_ndjson_and_write_the_json_document_on_request(tmp_path):
+    conflicts = [conflict_text_merge("a.json"), conflict_text_merge("b.json")]
+
+    assert write_reports(conflicts, tmp_path, json_copy=True) == 2
+    lines = (tmp_path / CONFLICTS_NDJSON).read_text().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == ["conf-text-a.json", "conf-text-b.json"]
+    assert json.loads((tmp_path / CONFLICTS_JSON).read_text()) == [json.loads(line) for line in lines]
+
+    # Without the JSON document, a stale one from an earlier merge is removed.
+    assert write_reports(conflicts[:1], tmp_path) == 1
+    assert len((tmp_path / CONFLICTS_NDJSON).read_text().splitlines()) == 1
+    assert not (tmp_path / CONFLICTS_JSON).exists()
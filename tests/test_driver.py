@@ -0,0 +1,105 @@
+import importlib.util
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from semmerge import pipeline
+from semmerge.incremental import MergeStateStore
+
+_SCRIPT = Path(__file__).resolve().parent.parent / "scripts" / "semmerge-driver.py"
+_spec = importlib.util.spec_from_file_location("semmerge_driver", _SCRIPT)
+driver = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(driver)
+
+HEAD = "a" * 40
+THEIRS = "b" * 40
+
+
+def test_merge_head_comes_from_the_githead_variables(monkeypatch):
+    for name in [name for name in os.environ if name.startswith("GITHEAD_")]:
+        monkeypatch.delenv(name)
+    monkeypatch.setenv(f"GITHEAD_{HEAD}", "HEAD")
+    monkeypatch.setenv(f"GITHEAD_{THEIRS}", "topic")
+
+    assert driver.merge_head(HEAD) == THEIRS
+    monkeypatch.setenv("GITHEAD_REF", "topic")
+    assert driver.merge_head(HEAD) == "topic"
+
+
+def test_one_git_merge_runs_the_semantic_merge_once(tmp_path, monkeypatch):
+    runs: list = []
+    monkeypatch.setattr(driver, "run_local", lambda root, args: runs.append(args) or 1)
+    monkeypatch.setenv("SEMMERGE_SERVER", "")
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    lock = tmp_path / "index.lock"
+    lock.touch()
+
+    assert [driver.merge_once(tmp_path, tmp_path, ["base", "a", "b"]) for _ in range(3)] == [1, 1, 1]
+    assert len(runs) == 1
+    # The next git merge holds a new index lock.
+    lock.unlink()
+    lock.touch()
+    assert driver.merge_once(tmp_path, tmp_path, ["base", "a", "b"]) == 1
+    assert len(runs) == 2
+
+
+def test_result_is_copied_from_the_merged_path(tmp_path):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "a.ts").write_text("merged\n")
+    ours = tmp_path / ".merge_file_abc123"
+    ours.write_text("ours\n")
+
+    driver.copy_result(tmp_path, str(ours), "src/a.ts")
+    assert ours.read_text() == "merged\n"
+    # Without %P, git's temporary file cannot be mapped back to the path it stands for.
+    with pytest.raises(SystemExit, match="add %P"):
+        driver.copy_result(tmp_path, str(ours), None)
+
+
+class _RecordingWorker:
+    """Stands in for the TypeScript worker, recording which requests a merge makes."""
+
+    def __init__(self, calls: list) -> None:
+        self.calls = calls
+
+    def stream_snapshot(self, name, tree, paths=None, removed=None):  # noqa: ANN001
+        pass
+
+    def build_and_diff(self, base_tree, left_tree, right_tree, **kwargs):  # noqa: ANN001
+        self.calls.append("buildAndDiff")
+        return [], [], {}
+
+    def diff(self, base_tree, right_tree):  # noqa: ANN001
+        self.calls.append("diff")
+        return []
+
+
+def test_driver_re_merge_resumes_from_the_earlier_merge(git_repo, monkeypatch):
+    base = git_repo.commit({"src/a.ts": "export const a = 1;\n", "notes.txt": "one\ntwo\nthree\n"}, "base")
+    left = git_repo.commit({"src/a.ts": "export const a = 2;\n", "notes.txt": "ONE\ntwo\nthree\n"}, "left")
+    git_repo.git("checkout", "-q", base)
+    right = git_repo.commit({"src/a.ts": "export const a = 3;\n", "notes.txt": "one\ntwo\nTHREE\n"}, "right")
+    newer = git_repo.commit({"src/a.ts": "export const a = 4;\n"}, "right gains a commit")
+    git_repo.git("checkout", "-q", left)
+    calls: list = []
+    monkeypatch.chdir(git_repo.path)
+    monkeypatch.setattr(pipeline, "_start_worker", lambda mode: _RecordingWorker(calls))
+    monkeypatch.setattr(pipeline, "_release_worker", lambda worker: None)
+    monkeypatch.setattr(pipeline, "typecheck_ts", lambda tree, files=None: (True, []))
+    monkeypatch.setattr(pipeline, "emit_files", lambda tree, paths: None)
+
+    # The arguments the driver passes: a planned merge, in place.
+    assert driver.run_local(git_repo.path, [base, left, right, "--inplace", "--git"]) == 0
+    assert calls == ["buildAndDiff"]
+    state = MergeStateStore.for_repo().load(base, left, pipeline._ts_config().index_mode)
+    assert state is not None and state.right == right and state.scope == ["src/a.ts"]
+
+    git_repo.git("reset", "-q", "--hard")
+    assert driver.run_local(git_repo.path, [base, left, newer, "--inplace", "--git"]) == 0
+    assert calls == ["buildAndDiff", "diff"]
+    assert (git_repo.path / "notes.txt").read_text() == "ONE\ntwo\nTHREE\n"
+    assert MergeStateStore.for_repo().load(base, left, pipeline._ts_config().index_mode).right == newer
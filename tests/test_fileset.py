@@ -0,0 +1,83 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from semmerge import pipeline
+from semmerge.fileset import FileSelector
+from semmerge.opaque import OpaquePolicy
+
+LISTING = [
+    "tsconfig.json",
+    "src/a.ts",
+    "src/b.gen.ts",
+    "src/keep.gen.ts",
+    "node_modules/dep/index.ts",
+    "fixtures/f.ts",
+    "dist/out.js",
+    "test/t.ts",
+    "README.md",
+]
+
+
+def test_default_selector_skips_non_source_and_node_modules():
+    selection = FileSelector().select(LISTING)
+
+    assert "node_modules/dep/index.ts" not in selection.included
+    assert "README.md" not in selection.included
+    assert selection.skipped == {"ignored": 1, "non-source": 2}
+
+
+def test_ignore_file_patterns_and_negation():
+    selector = FileSelector(ignore_patterns=["# comment", "fixtures/", "*.gen.ts", "!keep.gen.ts"])
+
+    selection = selector.select(LISTING)
+
+    assert selection.included == ["src/a.ts", "src/keep.gen.ts", "dist/out.js", "test/t.ts"]
+
+
+def test_tsconfig_include_exclude_decide_membership():
+    tsconfig = b"""{
+      // comments and trailing commas are allowed
+      "compilerOptions": { "outDir": "dist", },
+      "include": ["src", "./test/**/*.ts"],
+      "exclude": ["src/*.gen.ts"],
+    }"""
+    selector = FileSelector(project_globs=["**/tsconfig.json"])
+
+    selection = selector.select(LISTING, read=lambda paths: {p: tsconfig for p in paths})
+
+    assert selection.included == ["src/a.ts", "test/t.ts"]
+    assert selection.skipped["outside project"] == 4
+
+
+def test_source_globs_select_directly():
+    selection = FileSelector(project_globs=["src/**/*.ts"]).select(LISTING)
+
+    assert selection.included == ["src/a.ts", "src/b.gen.ts", "src/keep.gen.ts"]
+
+
+class _RecordingWorker:
+    def __init__(self) -> None:
+        self.streamed: dict = {}
+
+    def stream_snapshot(self, name, tree, paths=None, removed=None):  # noqa: ANN001
+        self.streamed[name] = (tree, list(paths or []), removed)
+
+
+def test_worktree_overlay_holds_only_files_that_differ_from_the_revision(git_repo, monkeypatch):
+    repo = git_repo.path
+    files = {f"src/{name}.ts": f"export const {name} = 1;\n" for name in ("a", "b", "c")}
+    git_repo.commit({**files, ".gitignore": "build/\n"}, "base")
+    (repo / "src/a.ts").write_text("export const a = 2;\n")
+    (repo / "src/b.ts").unlink()
+    (repo / "src/d.ts").write_text("export const d = 1;\n")
+    (repo / "build").mkdir()
+    (repo / "build/out.js").write_text("ignored\n")
+    monkeypatch.chdir(repo / "src")
+    worker = _RecordingWorker()
+
+    root = pipeline._stream_worktree(worker, FileSelector(), "HEAD", OpaquePolicy())
+
+    assert root.resolve() == repo.resolve()
+    assert worker.streamed["right"] == (root, ["src/a.ts", "src/d.ts"], ["src/b.ts"])
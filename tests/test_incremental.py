@@ -0,0 +1,146 @@
+import asyncio
+import json
+import shutil
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from semmerge import pipeline
+from semmerge.git_api import list_tree, read_blobs, write_tree
+from semmerge.incremental import (
+    MergeState,
+    MergeStateStore,
+    affected_paths,
+    rebase_right_ops,
+    rediff_scope,
+    verify_scope,
+)
+from semmerge.ops import Op, Target
+from semmerge.symindex import SymbolIndex
+
+
+def _state(left_ops, right_ops, composed) -> MergeState:
+    return MergeState("b" * 40, "l" * 40, "r" * 40, "tiered", "t" * 40, left_ops, right_ops, composed)
+
+
+def test_changed_right_ops_are_replaced_and_only_their_files_rebuilt():
+    rename = Op.new(
+        "renameSymbol",
+        Target("s1", "src/util.ts::foo::0"),
+        {
+            "file": "src/util.ts",
+            "oldName": "foo",
+            "newName": "bar",
+            "references": [{"file": "src/main.ts", "start": 9, "end": 12}],
+        },
+    )
+    old_edit = Op.new("editStmtBlock", Target("s2"), {"file": "src/k.ts", "newBody": "1"})
+    other = Op.new("editStmtBlock", Target("s3"), {"file": "src/z.ts", "newBody": "z"})
+    state = _state([rename], [old_edit, other], [rename, old_edit, other])
+
+    assert rediff_scope(state, ["src/k.ts", "README.md"], ["src/k.ts"]) == {"src/k.ts"}
+    assert rediff_scope(state, ["src/k.ts", "tsconfig.json"], ["src/k.ts"]) is None
+    # A planned merge's logs cover only its semantic files.
+    state.scope = ["src/k.ts"]
+    assert rediff_scope(state, ["src/k.ts"], ["src/k.ts"]) == {"src/k.ts"}
+    assert rediff_scope(state, ["src/k.ts", "README.md"], ["src/k.ts"]) is None
+    state.scope = None
+
+    new_edit = Op.new("editStmtBlock", Target("s2"), {"file": "src/k.ts", "newBody": "3"})
+    right_ops = rebase_right_ops(state, {"src/k.ts"}, [new_edit])
+    assert right_ops == [other, new_edit]
+    assert affected_paths(state.composed, [rename, other, new_edit]) == {"src/k.ts"}
+
+    # A re-diffed rename without a reference index keeps the stored op (and its references).
+    unresolved = Op.new(
+        "renameSymbol", Target("s1", "src/util.ts::foo::0"), {"file": "src/util.ts", "oldName": "foo", "newName": "bar"}
+    )
+    assert rebase_right_ops(_state([], [rename], [rename]), {"src/util.ts", "src/main.ts"}, [unresolved]) == [rename]
+    # New renames reach files outside the re-diffed scope.
+    assert rebase_right_ops(state, {"src/k.ts"}, [unresolved]) is None
+    moved = Op.new("moveFile", Target("s2"), {"oldPath": "src/k.ts", "newPath": "src/m.ts"})
+    assert affected_paths(state.composed, [rename, other, moved]) is None
+
+
+def test_state_store_round_trip(tmp_path):
+    store = MergeStateStore(tmp_path)
+    op = Op.new("addDecl", Target("s1"), {"file": "src/a.ts", "text": "x"})
+    state = _state([op], [], [op])
+    state.scope = ["src/a.ts"]
+    store.save(state)
+
+    loaded = store.load(state.base, state.left, "tiered")
+    assert loaded is not None and loaded.to_dict() == state.to_dict()
+    assert store.load(state.base, state.left, "full") is None
+
+
+def test_write_tree_replaces_only_named_paths_and_verify_scope_finds_importers(git_repo, tmp_path, monkeypatch):
+    git_repo.commit(
+        {
+            "src/k.ts": "export const k = 1;\n",
+            "src/main.ts": 'import { k } from "./k";\nexport const m = k;\n',
+            "src/gone.ts": "export {};\n",
+        },
+        "base",
+    )
+    monkeypatch.chdir(git_repo.path)
+
+    merged = tmp_path / "merged"
+    (merged / "src").mkdir(parents=True)
+    (merged / "src/k.ts").write_text("export const k = 2;\n")
+    (merged / "src/main.ts").write_text("not written: unchanged paths come from the start tree\n")
+    tree = write_tree("HEAD", merged, ["src/k.ts", "src/gone.ts"])
+
+    assert sorted(list_tree(tree)) == ["src/k.ts", "src/main.ts"]
+    blobs = read_blobs(tree, ["src/k.ts", "src/main.ts"])
+    assert blobs["src/k.ts"] == b"export const k = 2;\n"
+    assert blobs["src/main.ts"].startswith(b"import { k }")
+    assert verify_scope(tree, {"src/k.ts", "src/gone.ts"}, (".ts",)) == ["src/k.ts", "src/main.ts"]
+
+
+class _DiffWorker:
+    def __init__(self, delta) -> None:  # noqa: ANN001
+        self.delta = delta
+
+    def diff(self, base_tree, right_tree):  # noqa: ANN001
+        return self.delta
+
+
+def test_remerge_reports_conflicts_located_by_the_symbol_index(git_repo, tmp_path, monkeypatch):
+    monkeypatch.chdir(git_repo.path)
+    base = git_repo.commit({"src/a.ts": "export function f() {}\n"}, "base")
+    left = git_repo.commit({"src/a.ts": "export function h() {}\n"}, "left")
+    git_repo.git("checkout", "-q", base)
+    right = git_repo.commit({"src/a.ts": "export function g() {}\n"}, "right")
+    again = git_repo.commit({"src/a.ts": "export function g() {}\n// again\n"}, "right again")
+
+    def rename(name: str) -> Op:
+        return Op.new("renameSymbol", Target("sym-f", "src/a.ts::f::0"), {"oldName": "f", "newName": name})
+
+    mode = pipeline._ts_config().index_mode
+    merged_tree = git_repo.git("rev-parse", f"{left}^{{tree}}")
+    MergeStateStore.for_repo().save(MergeState(base, left, right, mode, merged_tree, [rename("h")], [rename("g")], []))
+    index = SymbolIndex.for_repo(mode)
+    entry = {"symbolId": "sym-f", "addressId": "src/a.ts::f::0", "kind": "function", "name": "f"}
+    # A same-shape declaration shares f's symbol id and sorts before it.
+    twin = {**entry, "addressId": "src/0.ts::k::0", "name": "k", "file": "src/0.ts", "start": 0, "end": 9}
+    index.store(
+        base, [{**twin, "fileHash": "k"}, {**entry, "file": "src/a.ts", "start": 0, "end": 22, "fileHash": "h"}]
+    )
+    index.close()
+
+    async def checkout_and_stream(worker, checkouts, trees, policy, opaque):  # noqa: ANN001
+        for side in ("base", "right"):
+            trees[side] = tmp_path / side
+            shutil.copytree(git_repo.path / "src", trees[side] / "src")
+
+    monkeypatch.setattr(pipeline, "_start_worker", lambda mode: _DiffWorker([rename("g")]))
+    monkeypatch.setattr(pipeline, "_release_worker", lambda worker: None)
+    monkeypatch.setattr(pipeline, "_checkout_and_stream", checkout_and_stream)
+    git_repo.git("checkout", "-q", base)
+
+    assert asyncio.run(pipeline._remerge(base, left, again, inplace=True)) == 1
+    (report,) = map(json.loads, (git_repo.path / ".semmerge-conflicts.ndjson").read_text().splitlines())
+    assert report["category"] == "DivergentRename"
+    assert report["minimalSlice"] == {"path": "src/a.ts", "start": 0, "end": 22, "code": "export function f() {}"}
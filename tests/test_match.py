@@ -0,0 +1,149 @@
+import shutil
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from semmerge.lang.ts.bridge import TSWorker, worker_command
+
+pytestmark = pytest.mark.skipif(
+    shutil.which("node") is None or worker_command(ROOT / "workers/ts/dist", "node") is None,
+    reason="needs node and a built TypeScript worker",
+)
+
+ORDER = "export interface Order { price: number; weight: number; qty: number }\n"
+
+
+def _handler(name: str, field: str, factor: str) -> str:
+    # Same signature for every handler, so only body similarity can tell them apart.
+    return (
+        f"export function {name}(order: Order): number {{\n"
+        f"  const base = order.{field} * order.qty;\n"
+        f"  if (base > 100) {{\n    return base * {factor};\n  }}\n  return base;\n}}\n"
+    )
+
+
+def _tree(root: Path, files: dict) -> Path:
+    for rel, content in files.items():
+        (root / rel).parent.mkdir(parents=True, exist_ok=True)
+        (root / rel).write_text(content)
+    return root
+
+
+def _diff(base: Path, right: Path):
+    worker = TSWorker(index_mode="syntax")
+    try:
+        return worker.diff(base, right)
+    finally:
+        worker.close()
+
+
+def test_similar_declarations_pair_as_renames_and_moves_but_not_near_duplicates(tmp_path):
+    base = _tree(
+        tmp_path / "base",
+        {
+            "src/orders.ts": ORDER
+            + _handler("totalPrice", "price", "0.9")
+            + _handler("totalWeight", "weight", "1.1")
+            + _handler("totalItems", "qty", "1")
+            # Unrelated one-liners whose token streams differ in a single type name.
+            + "export function toNumber(x: number) { return x; }\n",
+        },
+    )
+    right = _tree(
+        tmp_path / "right",
+        {
+            "src/orders.ts": ORDER
+            + _handler("orderPrice", "price", "0.95")
+            + _handler("orderItems", "qty", "1.05")
+            + "export function toText(x: string) { return x; }\n",
+            "src/weights.ts": 'import { Order } from "./orders";\n' + _handler("totalWeight", "weight", "1.15"),
+        },
+    )
+
+    ops = _diff(base, right)
+
+    renames = {(op.params["oldName"], op.params["newName"]): op for op in ops if op.type == "renameSymbol"}
+    assert set(renames) == {("totalPrice", "orderPrice"), ("totalItems", "orderItems")}
+    assert all(op.params["confidence"] >= 0.75 for op in renames.values())
+    moves = {(op.params["oldAddress"].split("::")[1], op.params["newFile"]) for op in ops if op.type == "moveDecl"}
+    assert ("totalWeight", "src/weights.ts") in moves
+    assert {op.type for op in ops if op.params.get("file") in (None, "src/orders.ts")} >= {"deleteDecl", "addDecl"}
+    paired = [op for op in ops if "toNumber" in str(op.params) or "toText" in str(op.params)]
+    assert paired == []
+
+
+def test_same_shape_declarations_pair_by_fingerprint_and_unchanged_files_are_skipped(tmp_path):
+    # f, g and h share a signature shape, so their symbol ids collide.
+    unchanged = "export function h(x: number) {\n  return x;\n}\n"
+    base = _tree(
+        tmp_path / "base",
+        {
+            "src/a.ts": "export function f(x: number) {\n  return x + 1;\n}\n"
+            "export function g(x: number) {\n  return x + 2;\n}\n",
+            "src/b.ts": unchanged,
+        },
+    )
+    right = _tree(
+        tmp_path / "right",
+        {
+            "src/a.ts": "export function f(x: number) {\n  return x + 10;\n}\n"
+            "export function g(x: number, y: number) {\n  return x + 2;\n}\n",
+            "src/b.ts": unchanged,
+        },
+    )
+
+    ops = _diff(base, right)
+
+    edits = [op for op in ops if op.type == "editStmtBlock"]
+    assert [op.target.addressId for op in edits] == ["src/a.ts::f::0"]
+    assert edits[0].params["oldFingerprint"] != edits[0].params["newFingerprint"]
+    (signature,) = [op for op in ops if op.type == "changeSignature"]
+    assert signature.params["name"] == "g" and signature.params["newSymbolId"] != signature.target.symbolId
+    assert not [op for op in ops if "src/b.ts" in str(op.params) or "src/b.ts" in op.target.addressId]
+
+
+def _codemod_handler(name: str, i: int, cmp: str) -> str:
+    field = ("price", "weight", "qty")[i % 3]
+    return (
+        f"export function {name}(order: Order): number {{\n"
+        f"  const limit{i} = {i * 7 + 3};\n"
+        f'  const label{i} = "order {i}";\n'
+        f"  if (order.{field} {cmp} limit{i}) {{\n    console.log(label{i}, limit{i});\n"
+        f"    return order.qty * {i % 13 + 2};\n  }}\n"
+        f"  return limit{i} - {i % 11};\n}}\n"
+    )
+
+
+def test_large_codemod_pairs_every_renamed_declaration_quickly(tmp_path):
+    count = 1500
+    per_file = 100
+    base = _tree(
+        tmp_path / "base",
+        {
+            f"src/m{k // per_file}.ts": ORDER
+            + "".join(_codemod_handler(f"handler{i}", i, ">") for i in range(k, k + per_file))
+            for k in range(0, count, per_file)
+        },
+    )
+    # Every handler is renamed and has its comparison tweaked; every other module moves to lib/.
+    right = _tree(
+        tmp_path / "right",
+        {
+            f"{'lib' if k % (2 * per_file) else 'src'}/m{k // per_file}.ts": ORDER
+            + "".join(_codemod_handler(f"process{i}", i, ">=") for i in range(k, k + per_file))
+            for k in range(0, count, per_file)
+        },
+    )
+
+    started = time.perf_counter()
+    ops = _diff(base, right)
+    elapsed = time.perf_counter() - started
+
+    renames = {op.params["oldName"]: op.params["newName"] for op in ops if op.type == "renameSymbol"}
+    assert renames == {f"handler{i}": f"process{i}" for i in range(count)}
+    assert elapsed < 30, f"diffing the codemod took {elapsed:.1f}s"
@@ -0,0 +1,49 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from semmerge.opaque import OpaquePolicy, merge_opaque, split_opaque
+
+
+def test_classify_by_size_marker_and_line_length():
+    policy = OpaquePolicy(max_bytes=1024, max_line_length=100)
+
+    assert policy.classify(2048, b"") == "size"
+    assert policy.classify(40, b"// @generated by protoc\nexport {};\n") == "generated"
+    assert policy.classify(300, b"var a=1;" * 30) == "minified"
+    assert policy.classify(30, b"export const a = 1;\n") is None
+
+
+def test_split_opaque_reads_files_from_disk(tmp_path):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src/a.ts").write_text("export const a = 1;\n")
+    (tmp_path / "src/big.ts").write_bytes(b"x" * 4096)
+    (tmp_path / "src/empty.ts").write_bytes(b"")
+
+    regular, opaque = split_opaque(
+        tmp_path, ["src/a.ts", "src/big.ts", "src/empty.ts", "src/missing.ts"], OpaquePolicy(max_bytes=1024)
+    )
+
+    assert regular == ["src/a.ts", "src/empty.ts"]
+    assert opaque == {"src/big.ts": "size"}
+
+
+def test_merge_opaque_takes_one_sided_changes_and_flags_divergence(tmp_path):
+    trees = {side: tmp_path / side for side in ("base", "left", "right")}
+    for tree in trees.values():
+        tree.mkdir()
+    files = {
+        "one.js": ("base", "left", "base"),
+        "other.js": ("base", "base", "right"),
+        "same.js": ("base", "both", "both"),
+        "clash.js": ("base", "left", "right"),
+    }
+    for name, contents in files.items():
+        for side, content in zip(("base", "left", "right"), contents):
+            (trees[side] / name).write_text(content)
+
+    result = merge_opaque(files, trees)
+
+    assert result.take == {"one.js": "left", "other.js": "right", "same.js": "left"}
+    assert result.conflicted == ["clash.js"]
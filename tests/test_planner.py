@@ -0,0 +1,218 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from semmerge import pipeline
+from semmerge.planner import filter_ops_to_scope, materialize_plan, plan_merge, semantic_paths_after_merge
+from semmerge.ops import Op, Target
+
+
+def _repo(git_repo):
+    base = git_repo.commit(
+        {
+            "src/a.ts": "export function a() { return 1; }\n",
+            "src/b.ts": "export function b() { return 2; }\n",
+            "src/shared.ts": 'import { util } from "./util.js";\nexport const s = util();\n',
+            "src/util.ts": "export function util() { return 0; }\n",
+            "notes.txt": "one\ntwo\nthree\n",
+        },
+        "base",
+    )
+    return git_repo.path, base
+
+
+def test_plan_classifies_disjoint_and_overlapping_changes(git_repo, tmp_path, monkeypatch):
+    repo, base = _repo(git_repo)
+    monkeypatch.chdir(repo)
+    left = git_repo.commit(
+        {
+            "src/a.ts": "export function a() { return 10; }\n",
+            "src/shared.ts": 'import { util } from "./util.js";\nexport const s = util() + 1;\n',
+            "notes.txt": "ONE\ntwo\nthree\n",
+        },
+        "left",
+    )
+    git_repo.git("checkout", "-q", base)
+    right = git_repo.commit(
+        {
+            "src/b.ts": None,
+            "src/shared.ts": 'import { util } from "./util.js";\nexport const s = util() + 2;\n',
+            "notes.txt": "one\ntwo\nTHREE\n",
+        },
+        "right",
+    )
+
+    plan = plan_merge(base, left, right)
+
+    assert plan.take_left == ["src/a.ts"]
+    assert plan.take_right == ["src/b.ts"]
+    assert plan.text_merge == ["notes.txt"]
+    assert plan.semantic == ["src/shared.ts"]
+    assert plan.context == ["src/util.ts"]
+    assert not plan.fast
+
+    out = tmp_path / "out"
+    result = materialize_plan(plan, out)
+    assert (out / "src/a.ts").read_text() == "export function a() { return 10; }\n"
+    assert result.deleted == ["src/b.ts"]
+    assert (out / "notes.txt").read_text() == "ONE\ntwo\nTHREE\n"
+    assert result.conflicted == []
+
+
+def test_plan_is_fast_when_sides_are_disjoint(git_repo, monkeypatch):
+    repo, base = _repo(git_repo)
+    monkeypatch.chdir(repo)
+    left = git_repo.commit({"src/a.ts": "export function a() { return 10; }\n"}, "left")
+    git_repo.git("checkout", "-q", base)
+    right = git_repo.commit({"src/b.ts": "export function b() { return 20; }\n"}, "right")
+
+    plan = plan_merge(base, left, right)
+
+    assert plan.fast
+    assert plan.semantic_scope == []
+
+
+def test_plan_routes_files_claimed_by_other_backends(git_repo, monkeypatch):
+    repo, base = _repo(git_repo)
+    monkeypatch.chdir(repo)
+    left = git_repo.commit({"notes.txt": "ONE\ntwo\nthree\n"}, "left")
+    git_repo.git("checkout", "-q", base)
+    right = git_repo.commit({"notes.txt": "one\ntwo\nTHREE\n"}, "right")
+
+    def partition(paths):  # noqa: ANN001
+        return {"echo": sorted(path for path in paths if path.endswith(".txt"))}
+
+    plan = plan_merge(base, left, right, partition=partition)
+
+    # Backends only contribute ops for composition; the content still comes from Git's text merge.
+    assert plan.text_merge == ["notes.txt"]
+    assert plan.backends == {"echo": ["notes.txt"]}
+    assert not plan.fast
+
+    out = repo.parent / "out"
+    assert materialize_plan(plan, out).conflicted == []
+    assert (out / "notes.txt").read_text() == "ONE\ntwo\nTHREE\n"
+    merged = repo.parent / "merged"
+    (merged / "src").mkdir(parents=True)
+    (merged / "notes.txt").write_text("one\ntwo\nthree\n")
+    (merged / "src/a.ts").write_text("export function a() { return 3; }\n")
+    assert semantic_paths_after_merge(merged, plan) == (["src/a.ts"], [])
+
+
+def test_materialize_keeps_symlinks_and_exec_bits(git_repo, monkeypatch):
+    repo = git_repo.path
+    monkeypatch.chdir(repo)
+    (repo / "latest").symlink_to("config.ts")
+    base = git_repo.commit({"config.ts": "export const c = 1;\n", "other.ts": "export const o = 1;\n"}, "base")
+    left = git_repo.commit({"config.ts": "export const c = 2;\n"}, "left")
+    git_repo.git("checkout", "-q", base)
+    (repo / "latest").unlink()
+    (repo / "latest").symlink_to("other.ts")
+    (repo / "run.sh").write_text("#!/bin/sh\n")
+    (repo / "run.sh").chmod(0o755)
+    right = git_repo.commit({}, "right")
+    git_repo.git("checkout", "-q", left)
+
+    plan = plan_merge(base, left, right)
+    assert plan.take_right == ["latest", "run.sh"]
+    materialize_plan(plan, repo)
+
+    # The link is replaced, not written through onto its old target.
+    assert os.readlink(repo / "latest") == "other.ts"
+    assert (repo / "config.ts").read_text() == "export const c = 2;\n"
+    assert os.access(repo / "run.sh", os.X_OK)
+
+
+def test_binary_files_changed_on_both_sides_keep_a_and_conflict(git_repo, tmp_path, monkeypatch):
+    repo = git_repo.path
+    monkeypatch.chdir(repo)
+    (repo / "img.bin").write_bytes(b"\x89PNG\0base")
+    base = git_repo.commit({}, "base")
+    (repo / "img.bin").write_bytes(b"\x89PNG\0left")
+    left = git_repo.commit({}, "left")
+    git_repo.git("checkout", "-q", base)
+    (repo / "img.bin").write_bytes(b"\x89PNG\0right")
+    right = git_repo.commit({}, "right")
+
+    plan = plan_merge(base, left, right)
+    assert plan.text_merge == ["img.bin"]
+    result = materialize_plan(plan, tmp_path / "out")
+
+    assert result.conflicted == ["img.bin"]
+    assert (tmp_path / "out" / "img.bin").read_bytes() == b"\x89PNG\0left"
+
+
+def test_filter_ops_to_scope_keeps_ops_touching_scope():
+    inside = Op.new("editStmtBlock", Target("s1"), {"file": "src/a.ts"})
+    moved = Op.new("moveDecl", Target("s2"), {"oldFile": "src/x.ts", "newFile": "src/a.ts"})
+    outside = Op.new("editStmtBlock", Target("s3"), {"file": "src/b.ts"})
+
+    assert filter_ops_to_scope([inside, moved, outside], ["src/a.ts"]) == [inside, moved]
+
+
+class _NoOps:
+    """Stands in for the TypeScript worker: both sides' edits diff to no ops."""
+
+    def stream_snapshot(self, name, tree, paths=None, removed=None):  # noqa: ANN001
+        pass
+
+    def build_and_diff(self, base_tree, left_tree, right_tree, **kwargs):  # noqa: ANN001
+        return [], [], {}
+
+
+def _planned_merge(git_repo, monkeypatch, right_notes: str):
+    repo, base = _repo(git_repo)
+    left = git_repo.commit(
+        {"src/a.ts": "export function a() { return 10; }\n", "notes.txt": "ONE\ntwo\nthree\n"}, "left"
+    )
+    git_repo.git("checkout", "-q", base)
+    right = git_repo.commit({"src/a.ts": "export function a() { return 20; }\n", "notes.txt": right_notes}, "right")
+    git_repo.git("checkout", "-q", left)
+    monkeypatch.chdir(repo)
+    monkeypatch.setattr(pipeline, "_start_worker", lambda mode: _NoOps())
+    monkeypatch.setattr(pipeline, "_release_worker", lambda worker: None)
+    monkeypatch.setattr(pipeline, "emit_files", lambda tree, paths: None)
+    return repo, base, left, right
+
+
+def test_planned_inplace_merge_type_checks_a_staged_tree_and_leaves_cwd_alone_on_failure(git_repo, monkeypatch):
+    repo, base, left, right = _planned_merge(git_repo, monkeypatch, "one\ntwo\nTHREE\n")
+    checked = []
+
+    def typecheck(tree, files=None):  # noqa: ANN001
+        checked.append((Path(tree), (Path(tree) / "notes.txt").read_text(), (Path(tree) / "src/b.ts").is_file()))
+        return False, ["src/a.ts(1,1): error TS2322"]
+
+    monkeypatch.setattr(pipeline, "typecheck_ts", typecheck)
+
+    assert pipeline.run_semmerge(base, left, right, inplace=True) == 2
+    ((tree, notes, complete),) = checked
+    assert tree != repo and notes == "ONE\ntwo\nTHREE\n" and complete
+    assert git_repo.git("status", "--porcelain") == ""
+
+    monkeypatch.setattr(pipeline, "typecheck_ts", lambda tree, files=None: (True, []))
+    assert pipeline.run_semmerge(base, left, right, inplace=True) == 0
+    assert (repo / "notes.txt").read_text() == "ONE\ntwo\nTHREE\n"
+
+
+def test_planned_merges_report_text_conflicts_with_or_without_inplace(git_repo, monkeypatch):
+    repo, base, left, right = _planned_merge(git_repo, monkeypatch, "uno\ntwo\nthree\n")
+    monkeypatch.setattr(pipeline, "typecheck_ts", lambda tree, files=None: (True, []))
+
+    for inplace in (False, True):
+        assert pipeline.run_semmerge(base, left, right, inplace=inplace) == 1
+        reports = [json.loads(line) for line in (repo / ".semmerge-conflicts.ndjson").read_text().splitlines()]
+        assert [(r["category"], r["minimalSlice"]["path"]) for r in reports] == [("TextConflict", "notes.txt")]
+        (repo / ".semmerge-conflicts.ndjson").unlink()
+        assert git_repo.git("status", "--porcelain") == ""
+
+    # The fast path (no semantic file changed on both sides) stages its text merges the same way.
+    git_repo.git("checkout", "-q", right)
+    fast_right = git_repo.commit({"src/a.ts": "export function a() { return 1; }\n"}, "right, a.ts as in base")
+    git_repo.git("checkout", "-q", left)
+    assert pipeline.run_semmerge(base, left, fast_right, inplace=True) == 1
+    (repo / ".semmerge-conflicts.ndjson").unlink()
+    assert git_repo.git("status", "--porcelain") == ""
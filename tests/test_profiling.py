@@ -0,0 +1,72 @@
+import json
+import pstats
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from semmerge import profiling
+
+
+def _spin(seconds: float) -> int:
+    deadline = time.monotonic() + seconds
+    total = 0
+    while time.monotonic() < deadline:
+        total += 1
+    return total
+
+
+def _fake_worker_profile(directory: Path, start: float) -> None:
+    # Two 10 ms samples of parseFile, taken 30 ms after *start* (in the "diff" phase), and one idle sample.
+    profile = {
+        "nodes": [
+            {"id": 1, "callFrame": {"functionName": "(root)", "url": "", "lineNumber": -1}},
+            {"id": 2, "callFrame": {"functionName": "parseFile", "url": "file:///w/sast.js", "lineNumber": 9}},
+            {"id": 3, "callFrame": {"functionName": "(idle)", "url": "", "lineNumber": -1}},
+        ],
+        "startTime": int(start * 1e6),
+        "samples": [2, 2, 3],
+        "timeDeltas": [30000, 10000, 10000],
+    }
+    (directory / "CPU.test.cpuprofile").write_text(json.dumps(profile))
+
+
+def test_capture_writes_a_bundle_with_per_phase_hot_functions(tmp_path):
+    assert not profiling.active() and profiling.worker_flags() == []
+
+    with profiling.capture(tmp_path, "semdiff a b"):
+        assert profiling.active()
+        flags = profiling.worker_flags()
+        worker_dir = Path(flags[flags.index("--cpu-prof-dir") + 1])
+        with profiling.phase("diff"):
+            _fake_worker_profile(worker_dir, time.monotonic())
+            _spin(0.2)
+        profiling.rpc_payload("diff", "sent", '{"x": "é"}\n')
+        profiling.rpc_payload("diff", "received", "{}\n")
+
+    (bundle,) = tmp_path.iterdir()
+    assert bundle.name.startswith("semdiff-")
+    assert {path.name for path in bundle.iterdir()} == {
+        "orchestrator.pstats",
+        "python-samples.folded",
+        "rpc.json",
+        "summary.txt",
+        "worker",
+    }
+    assert pstats.Stats(str(bundle / "orchestrator.pstats")).total_calls > 0
+    assert any(line.startswith("diff;") and "_spin" in line for line in (bundle / "python-samples.folded").open())
+    assert json.loads((bundle / "rpc.json").read_text())["diff"] == {
+        "receivedBytes": 3,
+        "receivedLargestBytes": 3,
+        "receivedMessages": 1,
+        "sentBytes": 12,
+        "sentLargestBytes": 12,
+        "sentMessages": 1,
+    }
+    summary = (bundle / "summary.txt").read_text()
+    diff_section = summary.split("\n  diff\n", 1)[1]
+    assert "_spin (test_profiling.py:" in diff_section
+    assert "worker         20 ms 100.0%  parseFile (sast.js:10)" in diff_section
+    assert "(idle)" not in summary
+    assert not profiling.active()
@@ -0,0 +1,70 @@
+import asyncio
+import io
+import logging
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from semmerge import pipeline
+from semmerge.progress import ProgressView, TimeBudget
+
+
+class _Terminal(io.StringIO):
+    def isatty(self) -> bool:
+        return True
+
+
+def test_budget_projects_from_worker_rate_and_records_degradations(caplog):
+    budget = TimeBudget(10)
+    budget.worker_report(
+        {
+            "timings": {"parse": 3000, "index": 3000, "diff": 500},
+            "files": {"base": 100, "left": 100, "right": 100},
+            "degraded": ["syntax-index"],
+        }
+    )
+
+    assert budget.tree_files == 100
+    assert budget.timings["worker index"] == 3.0
+    assert budget.estimate(100) == 3.0  # npx start + 100 files at 20 ms
+    assert budget.fits(100)
+    assert not budget.fits(1000)
+    assert TimeBudget(0).fits(10**6) and TimeBudget(0).remaining() is None
+    with caplog.at_level(logging.INFO, logger="semmerge"):
+        with budget.phase("apply"):
+            pass
+        budget.report()
+    assert budget.degraded == ["syntax-index"]
+    assert "Phase timings" in caplog.text and "worker parse 3.0s" in caplog.text and "apply 0.0s" in caplog.text
+
+
+def test_progress_view_draws_a_status_line_on_terminals_and_logs_otherwise(caplog):
+    terminal = _Terminal()
+    view = ProgressView(terminal)
+    view({"phase": "index", "side": "left", "done": 5, "total": 10})
+    view.close()
+    assert terminal.getvalue() == "\r\x1b[Ksemmerge: index left: 5/10 files\r\x1b[K"
+
+    quiet = ProgressView(io.StringIO(), interval=60)
+    chatty = ProgressView(io.StringIO(), interval=0)
+    with caplog.at_level(logging.INFO, logger="semmerge"):
+        quiet({"phase": "parse", "side": "base", "done": 1, "total": 2})
+        chatty({"phase": "parse", "side": "base", "done": 2, "total": 2})
+    assert [record.getMessage() for record in caplog.records] == ["Progress: parse base: 2/2 files"]
+
+
+def test_apply_without_formatting_skips_the_formatter(monkeypatch, tmp_path):
+    formatted: list = []
+    monkeypatch.setattr(pipeline, "emit_files", lambda tree, paths: formatted.append(paths))
+
+    def apply_ops(base_tree, ops, on_file, reset=None):  # noqa: ANN001
+        on_file(tmp_path, tmp_path / "a.ts")
+        return tmp_path
+
+    monkeypatch.setattr(pipeline, "apply_ops", apply_ops)
+
+    assert asyncio.run(pipeline._apply_and_format(tmp_path, [], formatting=False)) == tmp_path
+    assert formatted == []
+    asyncio.run(pipeline._apply_and_format(tmp_path, []))
+    assert formatted == [[tmp_path / "a.ts"]]
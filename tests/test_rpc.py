@@ -0,0 +1,125 @@
+import asyncio
+import subprocess
+import sys
+import textwrap
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from semmerge.lang.ts.rpc import RpcClient, RpcError, RpcTimeout
+
+# Answers "echo" after params.delay seconds (so answers overtake each other), first reporting progress
+# if params.progress is set; never answers "hang"
+# unless cancelled, ignores cancellation of "stuck", and exits on "exit".
+FAKE_WORKER = textwrap.dedent(
+    """
+    import json, sys, threading, time
+
+    lock = threading.Lock()
+    cancellable = {}
+
+    def send(message):
+        with lock:
+            sys.stdout.write(json.dumps(message) + "\\n")
+            sys.stdout.flush()
+
+    def echo(req):
+        if req["params"].get("progress"):
+            params = {"id": req["id"], "phase": "parse", "side": "base", "done": 1, "total": 2}
+            send({"jsonrpc": "2.0", "method": "$/progress", "params": params})
+        time.sleep(req["params"].get("delay", 0))
+        send({"jsonrpc": "2.0", "id": req["id"], "result": req["params"]})
+
+    for line in sys.stdin:
+        req = json.loads(line)
+        if req["method"] == "echo":
+            threading.Thread(target=echo, args=(req,)).start()
+        elif req["method"] == "hang":
+            cancellable[req["id"]] = True
+        elif req["method"] == "$/cancelRequest" and req["params"]["id"] in cancellable:
+            error = {"code": -32800, "message": "Request cancelled"}
+            send({"jsonrpc": "2.0", "id": req["params"]["id"], "error": error})
+        elif req["method"] == "fail":
+            send({"jsonrpc": "2.0", "id": req["id"], "error": {"code": -32000, "message": "boom"}})
+        elif req["method"] == "exit":
+            break
+    """
+)
+
+
+@pytest.fixture
+def client(tmp_path):
+    script = tmp_path / "worker.py"
+    script.write_text(FAKE_WORKER)
+    proc = subprocess.Popen(
+        [sys.executable, str(script)], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+    )
+    assert proc.stdin and proc.stdout
+    yield RpcClient(proc.stdin, proc.stdout, name="fake worker")
+    proc.kill()
+    proc.wait()
+
+
+def _wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_concurrent_requests_are_correlated_by_id(client):
+    slow = client.request("echo", {"n": 1, "delay": 0.5})
+    fast = [client.request("echo", {"n": n}) for n in range(2, 6)]
+
+    assert [future.result(5)["n"] for future in fast] == [2, 3, 4, 5]
+    assert not slow.done()
+    assert slow.result(5) == {"n": 1, "delay": 0.5}
+    with pytest.raises(RpcError, match="boom") as failure:
+        client.call("fail", {}, timeout=5)
+    assert failure.value.code == -32000
+    assert client.in_flight == 0
+
+
+def test_progress_goes_to_the_request_it_names(client):
+    seen: list = []
+    other: list = []
+    client.request("echo", {"delay": 0.2}, on_progress=other.append)
+
+    assert client.call("echo", {"progress": True}, timeout=5, on_progress=seen.append) == {"progress": True}
+    assert [event["done"] for event in seen] == [1]
+    assert other == []
+
+
+def test_deadlines_cancel_requests_in_the_worker(client):
+    with pytest.raises(RpcTimeout, match="hang did not finish within 0.2s"):
+        client.call("hang", {}, timeout=0.2)
+    # The worker acknowledges the cancellation, so it is not considered stuck.
+    assert _wait_until(lambda: not client.stalled)
+    assert client.call("echo", {"ok": True}, timeout=5) == {"ok": True}
+
+    async def cancelled_task():
+        task = asyncio.ensure_future(client.acall("hang", {}))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        with pytest.raises(RpcTimeout):
+            await client.acall("stuck", {}, timeout=0.1)
+
+    asyncio.run(cancelled_task())
+    # "stuck" never answers its cancellation.
+    assert _wait_until(lambda: client.in_flight == 0)
+    assert client.stalled
+
+
+def test_worker_exit_fails_pending_and_later_requests(client):
+    pending = client.request("hang", {})
+    client.notify("exit", {})
+
+    with pytest.raises(RuntimeError, match="fake worker exited unexpectedly"):
+        pending.result(5)
+    with pytest.raises(RuntimeError, match="exited unexpectedly"):
+        client.call("echo", {}, timeout=5)
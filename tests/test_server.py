@@ -0,0 +1,122 @@
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from semmerge import server
+
+
+def _git_repo(path: Path) -> Path:
+    path.mkdir()
+    subprocess.run(["git", "init", "-q", str(path)], check=True)
+    return path
+
+
+def test_jobs_for_one_repo_run_one_at_a_time(tmp_path):
+    active: dict[str, int] = {}
+    overlap: list[str] = []
+    concurrent = threading.Event()
+    lock = threading.Lock()
+
+    def run(job_id, command, repo, args):  # noqa: ANN001
+        with lock:
+            active[repo] = active.get(repo, 0) + 1
+            if active[repo] > 1:
+                overlap.append(repo)
+            if len(active) > 1 and all(active.values()):
+                concurrent.set()
+        server.report({"event": "output", "line": f"{repo} {args[0]}"})
+        time.sleep(0.05)
+        with lock:
+            active[repo] -= 1
+        return 0
+
+    scheduler = server.Scheduler(workers=3, run=run, processes=False)
+    try:
+        jobs = [scheduler.submit("semdiff", repo, [str(n)]) for n in range(3) for repo in ("r1", "r2")]
+        for job in jobs:
+            events = list(job.follow(timeout=5))
+            assert events[0]["event"] == "queued"
+            assert events[-1] == {"event": "finished", "state": "done", "exitCode": 0, "error": None}
+            assert {"event": "output", "line": f"{job.repo} {job.args[0]}"} in events
+        stats = scheduler.stats()
+    finally:
+        scheduler.close()
+
+    assert overlap == []
+    assert concurrent.is_set()
+    assert stats["completed"] == 6 and stats["queued"] == 0 and stats["running"] == 0
+    assert stats["waitSeconds"]["count"] == 6
+
+
+def test_identical_pending_jobs_are_coalesced():
+    release = threading.Event()
+
+    def run(job_id, command, repo, args):  # noqa: ANN001
+        release.wait(5)
+        return 1
+
+    scheduler = server.Scheduler(workers=1, run=run, processes=False)
+    try:
+        first = scheduler.submit("semmerge", "r", ["base", "a", "b"])
+        again = scheduler.submit("semmerge", "r", ["base", "a", "b"])
+        other = scheduler.submit("semmerge", "r", ["base", "a", "c"])
+        assert again is first and other is not first
+        release.set()
+        assert list(first.follow(timeout=5))[-1]["exitCode"] == 1
+        list(other.follow(timeout=5))
+    finally:
+        scheduler.close()
+
+
+def test_http_api_over_unix_socket(tmp_path):
+    repo = _git_repo(tmp_path / "repo")
+
+    def run(job_id, command, repo, args):  # noqa: ANN001
+        server.report({"event": "log", "level": "INFO", "message": f"{command} in {Path(repo).name}"})
+        return 2
+
+    scheduler = server.Scheduler(workers=1, run=run, processes=False)
+    socket_path = str(tmp_path / "serve.sock")
+    httpd = server.make_server(scheduler, socket_path=socket_path)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        events: list[dict] = []
+        code = server.run_remote(f"unix:{socket_path}", "semmerge", str(repo), ["b", "x", "y"], on_event=events.append)
+        assert code == 2
+        assert {"event": "log", "level": "INFO", "message": "semmerge in repo"} in events
+
+        conn = server.connect(f"unix:{socket_path}")
+        conn.request("GET", "/stats")
+        response = conn.getresponse()
+        assert response.status == 200
+        assert b'"completed": 1' in response.read()
+        conn.close()
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        scheduler.close()
+
+
+def test_sigterm_stops_the_service_like_an_interrupt(tmp_path):
+    socket_path = tmp_path / "serve.sock"
+    script = "import sys; from semmerge.server import serve; serve(sys.argv[1], workers=1)"
+    proc = subprocess.Popen(
+        [sys.executable, "-c", script, str(socket_path)],
+        cwd=Path(__file__).resolve().parent.parent,
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while not socket_path.exists() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert socket_path.exists()
+        proc.terminate()
+        # The shutdown path ran: the pool was closed and the socket removed.
+        assert proc.wait(timeout=30) == 0
+        assert not socket_path.exists()
+    finally:
+        proc.kill()
@@ -0,0 +1,97 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+# Import budget for the CLI module beyond click itself, and overall (generous, for slow CI hosts).
+OWN_BUDGET_MS = 30
+TOTAL_BUDGET_MS = 150
+# Modules only a running command may load.
+PIPELINE_MODULES = {
+    "asyncio",
+    "orjson",
+    "multiprocessing",
+    "concurrent.futures",
+    "semmerge.pipeline",
+    "semmerge.applier",
+    "semmerge.git_api",
+    "semmerge.lang.ts.bridge",
+    "semmerge.server",
+}
+
+
+def _import_times(statement: str) -> dict[str, float]:
+    """Return cumulative import times (ms) by module from ``python -X importtime``."""
+
+    env = {**os.environ, "PYTHONPATH": str(ROOT)}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=ROOT,
+        env=env,
+        check=True,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    times: dict[str, float] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _self, cumulative, name = line[len("import time:") :].split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative) / 1000
+    return times
+
+
+def test_cli_imports_only_click():
+    # Best of three runs, to keep scheduler noise out of the budget.
+    runs = [_import_times("import semmerge.__main__") for _ in range(3)]
+    times = min(runs, key=lambda t: t["semmerge.__main__"])
+
+    assert not PIPELINE_MODULES & times.keys()
+    total = times["semmerge.__main__"]
+    assert total - times.get("click", 0) < OWN_BUDGET_MS
+    assert total < TOTAL_BUDGET_MS
+
+
+def test_driver_client_imports_no_cli_or_server():
+    times = _import_times("import semmerge.client")
+
+    assert not {"click", "http.server", "socketserver", *PIPELINE_MODULES} & times.keys()
+
+
+def test_worker_starts_from_snapshot_only_for_its_node(tmp_path, monkeypatch):
+    from semmerge.lang.ts.bridge import _dist_hash, worker_command
+
+    monkeypatch.delenv("SEMMERGE_SNAPSHOT", raising=False)
+    node = tmp_path / "bin" / "node"
+    node.parent.mkdir()
+    node.write_text("node")
+    dist = tmp_path / "dist"
+    assert worker_command(dist, str(node)) is None
+
+    (dist / "snapshot").mkdir(parents=True)
+    entry = dist / "index.js"
+    entry.write_text("main()")
+    (dist / "diff.js").write_text("diff()")
+    blob = dist / "snapshot" / "worker.blob"
+    blob.write_bytes(b"blob")
+    meta = {"node": str(node.resolve()), "size": 4, "mtime": int(node.stat().st_mtime), "dist": _dist_hash(dist)}
+    (dist / "snapshot" / "worker.json").write_text(json.dumps(meta))
+
+    assert worker_command(dist, str(node)) == [str(node), "--snapshot-blob", str(blob)]
+    monkeypatch.setenv("SEMMERGE_SNAPSHOT", "0")
+    assert worker_command(dist, str(node)) == [str(node), str(entry)]
+    monkeypatch.delenv("SEMMERGE_SNAPSHOT")
+    node.write_text("another node")
+    assert worker_command(dist, str(node)) == [str(node), str(entry)]
+    node.write_text("node")
+    os.utime(node, (meta["mtime"], meta["mtime"]))
+    # Touching a module is harmless; changing any module, not only index.js, retires the snapshot.
+    os.utime(entry, None)
+    assert worker_command(dist, str(node)) == [str(node), "--snapshot-blob", str(blob)]
+    (dist / "diff.js").write_text("diff(changed)")
+    assert worker_command(dist, str(node)) == [str(node), str(entry)]
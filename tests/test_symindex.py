@@ -0,0 +1,137 @@
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from semmerge import symindex
+from semmerge.lang.ts.bridge import TSWorker, worker_command
+from semmerge.symindex import SymbolIndex
+
+
+def _entry(name: str, start: int, file: str = "src/a.ts", file_hash: str = "h1") -> dict:
+    return {
+        "symbolId": f"sym-{name}",
+        "addressId": f"{file}::{name}::{start}",
+        "kind": "FunctionDeclaration",
+        "name": name,
+        "file": file,
+        "start": start,
+        "end": start + 10,
+        "fileHash": file_hash,
+        "fingerprint": f"fp-{name}",
+    }
+
+
+def test_store_and_lookup_round_trip(tmp_path):
+    index = SymbolIndex(tmp_path / "symbols.sqlite")
+    try:
+        index.store("c1", [_entry("f", 0), _entry("g", 20)])
+
+        assert index.has("c1")
+        assert not index.has("c2")
+        assert [e.name for e in index.lookup_symbol("c1", "sym-g")] == ["g"]
+        found = index.lookup_address("c1", "src/a.ts::f::0")
+        assert found is not None and found.symbolId == "sym-f"
+        assert [e.start for e in index.entries_in_file("c1", "src/a.ts")] == [0, 20]
+    finally:
+        index.close()
+
+
+def test_only_the_most_recently_stored_commits_are_kept(tmp_path, monkeypatch):
+    monkeypatch.setattr(symindex, "_COMMITS_KEPT", 2)
+    index = SymbolIndex(tmp_path / "symbols.sqlite")
+    try:
+        index.store("c1", [_entry("f", 0)])
+        index.store("c2", [_entry("f", 0)])
+        index.store("c3", [_entry("f", 0, file_hash="h3")], paths=["src/a.ts"])
+        assert not index.has("c1") and index.lookup_symbol("c1", "sym-f") == []
+        assert [index.has(commit) for commit in ("c2", "c3")] == [True, False]
+
+        # Storing again, even part of a commit, keeps it fully indexed and makes it the most recent.
+        index.store("c2", [_entry("g", 20)], paths=["src/a.ts"])
+        index.store("c4", [_entry("f", 0)])
+        assert index.has("c2") and index.lookup_symbol("c3", "sym-f") == []
+        assert index.seed(["h1", "h3"]).keys() == {"h1"}
+        (rows,) = index._conn.execute("SELECT COUNT(*) FROM symbols").fetchone()
+        assert rows == 2
+    finally:
+        index.close()
+
+
+def test_seed_groups_by_hash_and_dedupes_copies(tmp_path):
+    index = SymbolIndex(tmp_path / "symbols.sqlite")
+    try:
+        index.store("c1", [_entry("f", 0), _entry("f", 0, file="lib/a.ts")])
+        index.store("c2", [_entry("f", 0), _entry("h", 5, file="src/b.ts", file_hash="h2")])
+
+        seeds = index.seed(["h1", "h2", "unknown"])
+
+        assert set(seeds) == {"h1", "h2"}
+        assert seeds["h1"] == [
+            {
+                "symbolId": "sym-f",
+                "kind": "FunctionDeclaration",
+                "name": "f",
+                "start": 0,
+                "end": 10,
+                "fingerprint": "fp-f",
+            }
+        ]
+        assert [s["name"] for s in seeds["h2"]] == ["h"]
+    finally:
+        index.close()
+
+
+def test_maps_are_isolated_per_index_mode(tmp_path):
+    tiered = SymbolIndex(tmp_path / "symbols.sqlite", mode="tiered")
+    try:
+        tiered.store("c1", [_entry("f", 0)])
+    finally:
+        tiered.close()
+
+    syntax = SymbolIndex(tmp_path / "symbols.sqlite", mode="syntax")
+    try:
+        assert not syntax.has("c1")
+        assert syntax.seed(["h1"]) == {}
+    finally:
+        syntax.close()
+
+
+def test_seed_skips_files_indexed_through_the_type_checker(tmp_path):
+    index = SymbolIndex(tmp_path / "symbols.sqlite")
+    try:
+        index.store("c1", [_entry("f", 0), {**_entry("g", 0, file="src/b.ts", file_hash="h2"), "typeChecked": True}])
+
+        assert set(index.seed(["h1", "h2"])) == {"h1"}
+        assert index.entries_in_file("c1", "src/b.ts")[0].typeChecked
+    finally:
+        index.close()
+
+
+@pytest.mark.skipif(
+    shutil.which("node") is None or worker_command(ROOT / "workers/ts/dist", "node") is None,
+    reason="needs node and a built TypeScript worker",
+)
+def test_checked_symbols_are_not_reused_when_a_dependency_changes(tmp_path):
+    main = 'import { Id } from "./types";\nexport function load(id: Id): void {}\n'
+    trees = {}
+    for side, alias in (("base", "string"), ("left", "string"), ("right", "number")):
+        trees[side] = tmp_path / side
+        (trees[side] / "src").mkdir(parents=True)
+        (trees[side] / "src/main.ts").write_text(main)
+        (trees[side] / "src/types.ts").write_text(f"export type Id = {alias};\n")
+
+    worker = TSWorker(index_mode="tiered")
+    try:
+        _, _, maps = worker.build_and_diff(trees["base"], trees["left"], trees["right"])
+    finally:
+        worker.close()
+
+    load = {side: next(e for e in entries if e["name"] == "load") for side, entries in maps.items()}
+    assert load["base"]["typeChecked"] and load["base"]["fileHash"] == load["right"]["fileHash"]
+    assert load["base"]["symbolId"] == load["left"]["symbolId"]
+    assert load["base"]["symbolId"] != load["right"]["symbolId"]
@@ -0,0 +1,86 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from semmerge.treecache import TreeCache
+
+
+def test_checkout_reuses_and_hardlinks_neighbour_trees(git_repo, tmp_path, monkeypatch):
+    first = git_repo.commit({"src/a.ts": "export const a = 1;\n", "src/b.ts": "export const b = 2;\n"}, "one")
+    second = git_repo.commit({"src/b.ts": "export const b = 3;\n"}, "two")
+    monkeypatch.chdir(git_repo.path)
+
+    with TreeCache(tmp_path / "cache") as cache:
+        (one,) = cache.checkout_many([first])
+        again, two = cache.checkout_many([first, second])
+
+        assert again == one
+        assert (two / "src/b.ts").read_text() == "export const b = 3;\n"
+        # Unchanged blobs share an inode with the neighbour tree.
+        assert os.stat(two / "src/a.ts").st_ino == os.stat(one / "src/a.ts").st_ino
+        assert os.stat(two / "src/b.ts").st_ino != os.stat(one / "src/b.ts").st_ino
+
+
+def test_evict_drops_least_recently_used_trees(git_repo, tmp_path, monkeypatch):
+    first = git_repo.commit({"big.txt": "x" * 4096}, "one")
+    second = git_repo.commit({"big.txt": "y" * 4096}, "two")
+    monkeypatch.chdir(git_repo.path)
+
+    with TreeCache(tmp_path / "cache") as cache:
+        old, new = cache.checkout_many([first, second])
+        os.utime(tmp_path / "cache" / f"{old.name}.json", (0, 0))
+        cache.budget = 6000
+        cache.evict()
+
+        assert not old.exists()
+        assert new.exists()
+
+
+_HOLD_SHARED_LEASE = """
+import fcntl, os, sys
+fd = os.open(sys.argv[1], os.O_RDWR | os.O_CREAT, 0o644)
+fcntl.flock(fd, fcntl.LOCK_SH)
+print("held", flush=True)
+sys.stdin.read()
+"""
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="needs flock")
+def test_eviction_skipped_while_the_cache_is_in_use_runs_when_the_last_user_leaves(git_repo, tmp_path, monkeypatch):
+    first = git_repo.commit({"big.txt": "x" * 4096}, "one")
+    second = git_repo.commit({"big.txt": "y" * 4096}, "two")
+    monkeypatch.chdir(git_repo.path)
+    root = tmp_path / "cache"
+    with TreeCache(root) as cache:
+        old, new = cache.checkout_many([first, second])
+    os.utime(root / f"{old.name}.json", (0, 0))
+
+    # Another process (a concurrent merge, say) holds a lease while two runs use the cache.
+    holder = subprocess.Popen(
+        [sys.executable, "-c", _HOLD_SHARED_LEASE, str(root / ".lock")],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        assert holder.stdout.readline() == "held\n"
+        with TreeCache(root) as short:
+            short.budget = 6000
+            short.checkout(second)
+        last = TreeCache(root)
+        last.budget = 6000
+        last.checkout(second)
+        assert old.exists()
+        assert (root / ".evict-pending").exists()
+    finally:
+        holder.communicate("")
+
+    last.close()
+    assert not old.exists()
+    assert new.exists()
+    assert not (root / ".evict-pending").exists()
@@ -1,24 +1,115 @@
-export function diffNodes(base, side) {
-    const baseMap = new Map(base.map((n) => [n.symbolId, n]));
-    const sideMap = new Map(side.map((n) => [n.symbolId, n]));
-    const diffs = [];
-    for (const [sid, bnode] of baseMap) {
-        const snode = sideMap.get(sid);
-        if (!snode) {
-            diffs.push({ kind: "delete", a: bnode });
-            continue;
+import { matchDeclarations } from "./match.js";
+export function diffNodes(base, side, baseText, sideText) {
+    // Files whose content hash is identical on both sides cannot contribute changes.
+    const sideHashes = new Map(side.map((n) => [n.range.file, n.fileHash]));
+    const baseHashes = new Map(base.map((n) => [n.range.file, n.fileHash]));
+    const baseRest = base.filter((n) => sideHashes.get(n.range.file) !== n.fileHash);
+    const sideRest = side.filter((n) => baseHashes.get(n.range.file) !== n.fileHash);
+    const pending = new Set(sideRest);
+    const pairs = [];
+    const unmatched = [];
+    // Match in decreasing order of certainty; each pass only sees what earlier passes left over.
+    const passes = [
+        (n) => `${n.symbolId}|${n.fingerprint}|${n.name}`,
+        (n) => `${n.symbolId}|${n.fingerprint}`,
+        (n) => `${n.range.file}|${n.kind}|${n.name}`,
+        (n) => `${n.symbolId}|${n.kind}|${n.name}`,
+    ];
+    let remaining = baseRest;
+    for (const key of passes) {
+        const candidates = group([...pending], key);
+        const next = [];
+        for (const bnode of remaining) {
+            const snode = take(candidates, key(bnode), bnode);
+            if (snode) {
+                pending.delete(snode);
+                pairs.push([bnode, snode]);
+            }
+            else {
+                next.push(bnode);
+            }
         }
-        if (bnode.addressId !== snode.addressId) {
-            diffs.push({ kind: "move", a: bnode, b: snode });
+        remaining = next;
+    }
+    // Same structural signature but otherwise unrelated: only pair when the match is unambiguous.
+    const bySymbol = group(remaining, (n) => n.symbolId);
+    const sideBySymbol = group([...pending], (n) => n.symbolId);
+    for (const bnode of remaining) {
+        const bs = bySymbol.get(bnode.symbolId) ?? [];
+        const ss = sideBySymbol.get(bnode.symbolId) ?? [];
+        if (bs.length === 1 && ss.length === 1 && pending.has(ss[0])) {
+            pending.delete(ss[0]);
+            pairs.push([bnode, ss[0]]);
         }
-        if (bnode.name && snode.name && bnode.name !== snode.name) {
-            diffs.push({ kind: "rename", a: bnode, b: snode });
+        else {
+            unmatched.push(bnode);
         }
     }
-    for (const snode of side) {
-        if (!baseMap.has(snode.symbolId)) {
-            diffs.push({ kind: "add", b: snode });
+    const diffs = [];
+    for (const [bnode, snode] of pairs) {
+        pairDiffs(diffs, bnode, snode);
+    }
+    let deletes = unmatched;
+    let adds = sideRest.filter((n) => pending.has(n));
+    if (baseText && sideText) {
+        const matched = matchDeclarations(deletes, adds, baseText, sideText);
+        for (const m of matched.matches) {
+            pairDiffs(diffs, m.a, m.b, m.confidence);
         }
+        deletes = matched.deletes;
+        adds = matched.adds;
+    }
+    for (const bnode of deletes) {
+        diffs.push({ kind: "delete", a: bnode });
+    }
+    for (const snode of adds) {
+        diffs.push({ kind: "add", b: snode });
     }
     return diffs;
 }
+function pairDiffs(diffs, bnode, snode, confidence) {
+    const extra = confidence === undefined ? {} : { confidence };
+    if (bnode.addressId !== snode.addressId) {
+        diffs.push({ kind: "move", a: bnode, b: snode, ...extra });
+    }
+    if (bnode.name && snode.name && bnode.name !== snode.name) {
+        diffs.push({ kind: "rename", a: bnode, b: snode, ...extra });
+    }
+    if (bnode.symbolId !== snode.symbolId) {
+        diffs.push({ kind: "changeSig", a: bnode, b: snode, ...extra });
+    }
+    else if (bnode.fingerprint !== snode.fingerprint) {
+        diffs.push({ kind: "edit", a: bnode, b: snode, ...extra });
+    }
+}
+function group(nodes, key) {
+    const out = new Map();
+    for (const n of nodes) {
+        const k = key(n);
+        const bucket = out.get(k);
+        if (bucket)
+            bucket.push(n);
+        else
+            out.set(k, [n]);
+    }
+    return out;
+}
+function take(candidates, key, like) {
+    const bucket = candidates.get(key);
+    if (!bucket || bucket.length === 0)
+        return undefined;
+    // Prefer the candidate that stayed in the same file, then the one closest to the old position.
+    let best = 0;
+    for (let i = 1; i < bucket.length; i++) {
+        if (closer(bucket[i], bucket[best], like))
+            best = i;
+    }
+    return bucket.splice(best, 1)[0];
+}
+function closer(x, y, like) {
+    const xSame = x.range.file === like.range.file;
+    const ySame = y.range.file === like.range.file;
+    if (xSame !== ySame)
+        return xSame;
+    return Math.abs(x.range.start - like.range.start) < Math.abs(y.range.start - like.range.start);
+}
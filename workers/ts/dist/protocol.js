@@ -1 +1 @@
-export {};
+export const REQUEST_CANCELLED = -32800;
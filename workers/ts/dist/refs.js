@@ -0,0 +1,74 @@
+import ts from "typescript";
+// Attach to every renameSymbol op the spans of all identifiers in the base program that
+// resolve to the renamed declaration, so the applier can edit exactly those spans instead
+// of scanning files. Ops whose declaration cannot be resolved are left without references.
+export function attachReferences(base, nodes, ops) {
+    const renames = ops.filter((op) => op.type === "renameSymbol" && op.params?.oldName);
+    if (renames.length === 0)
+        return;
+    const byAddress = new Map(nodes.map((n) => [n.addressId, n]));
+    const files = new Map(base.sourceFiles.map((sf) => [sf.fileName, sf]));
+    const checker = base.program().getTypeChecker();
+    const wanted = new Map();
+    const names = new Set();
+    for (const op of renames) {
+        const node = byAddress.get(op.target.addressId ?? "");
+        const sf = node && files.get(node.range.file);
+        const nameNode = node && sf && declarationName(sf, node);
+        const symbol = nameNode && checker.getSymbolAtLocation(nameNode);
+        if (!symbol)
+            continue;
+        const list = wanted.get(symbol) ?? [];
+        list.push(op);
+        wanted.set(symbol, list);
+        names.add(op.params.oldName);
+        op.params.references = [];
+    }
+    if (wanted.size === 0)
+        return;
+    for (const sf of base.sourceFiles) {
+        if (sf.isDeclarationFile || ![...names].some((name) => sf.text.includes(name)))
+            continue;
+        ts.forEachChild(sf, function visit(n) {
+            if (ts.isIdentifier(n) && names.has(n.text)) {
+                const shorthand = ts.isShorthandPropertyAssignment(n.parent) && n.parent.name === n;
+                const symbol = resolve(checker, n, shorthand);
+                for (const op of (symbol && wanted.get(symbol)) ?? []) {
+                    if (op.params.oldName !== n.text)
+                        continue;
+                    const ref = { file: sf.fileName, start: n.getStart(sf), end: n.end };
+                    if (shorthand)
+                        ref.shorthand = true;
+                    op.params.references.push(ref);
+                }
+            }
+            ts.forEachChild(n, visit);
+        });
+    }
+}
+function declarationName(sf, node) {
+    let found;
+    ts.forEachChild(sf, function visit(n) {
+        if (found || n.pos > node.range.start || n.end < node.range.end)
+            return;
+        if (n.pos === node.range.start && n.end === node.range.end) {
+            let name = n.name;
+            if (!name && ts.isVariableStatement(n))
+                name = n.declarationList.declarations[0]?.name;
+            if (name && ts.isIdentifier(name))
+                found = name;
+            return;
+        }
+        ts.forEachChild(n, visit);
+    });
+    return found;
+}
+function resolve(checker, id, shorthand) {
+    let symbol = shorthand
+        ? checker.getShorthandAssignmentValueSymbol(id.parent)
+        : checker.getSymbolAtLocation(id);
+    // Imports and re-exports bind local aliases; follow them to the declaration they name.
+    if (symbol && symbol.flags & ts.SymbolFlags.Alias)
+        symbol = checker.getAliasedSymbol(symbol);
+    return symbol;
+}
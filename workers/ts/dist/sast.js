@@ -1,68 +1,166 @@
 import ts from "typescript";
 import crypto from "node:crypto";
+const MEMO_LIMIT = 50000;
+const parseMemo = new Map();
+const indexMemo = new Map();
 export function parseFiles(files) {
+    return drain(parseFilesSteps(files));
+}
+// parseFiles, one step per file, for callers that interleave other work between steps.
+export function* parseFilesSteps(files) {
+    const hashes = fileHashes(files);
+    const sourceFiles = [];
+    for (const f of files) {
+        yield;
+        const norm = normalizePath(f.path);
+        const key = `${norm}:${hashes.get(norm)}`;
+        let sf = parseMemo.get(key);
+        if (!sf) {
+            sf = ts.createSourceFile(norm, f.content, ts.ScriptTarget.Latest, true, ts.ScriptKind.TS);
+            remember(parseMemo, key, sf);
+        }
+        sourceFiles.push(sf);
+    }
+    let prog;
+    // Binding and type resolution are only paid for when a declaration actually needs the checker.
+    const program = () => {
+        if (!prog)
+            prog = createProgram(sourceFiles);
+        return prog;
+    };
+    return { sourceFiles, hashes, program };
+}
+function createProgram(sourceFiles) {
     const options = { allowJs: true };
     const host = ts.createCompilerHost(options, true);
-    const fileMap = new Map(files.map((f) => [normalizePath(f.path), f.content]));
+    const fileMap = new Map(sourceFiles.map((sf) => [sf.fileName, sf]));
     host.readFile = (fileName) => {
         const norm = normalizePath(fileName);
-        return fileMap.get(norm) ?? "";
+        return fileMap.get(norm)?.text ?? "";
     };
     host.fileExists = (fileName) => fileMap.has(normalizePath(fileName));
-    host.getSourceFile = (fileName, languageVersion) => {
-        const norm = normalizePath(fileName);
-        const text = fileMap.get(norm);
-        if (text === undefined)
-            return undefined;
-        return ts.createSourceFile(norm, text, languageVersion, true, ts.ScriptKind.TS);
-    };
+    // Module resolution probes directories before files; answer from the snapshot, not the disk.
+    const dirs = new Set([""]);
+    for (const name of fileMap.keys()) {
+        for (let i = name.indexOf("/"); i >= 0; i = name.indexOf("/", i + 1))
+            dirs.add(name.slice(0, i));
+    }
+    host.directoryExists = (dir) => dirs.has(normalizePath(dir).replace(/\/$/, "").replace(/^\.$/, ""));
+    host.getSourceFile = (fileName) => fileMap.get(normalizePath(fileName));
     host.getCurrentDirectory = () => ".";
     host.getDirectories = () => [];
     host.getCanonicalFileName = (f) => normalizePath(f);
     host.useCaseSensitiveFileNames = () => true;
-    const fileNames = files.map((f) => normalizePath(f.path));
-    return ts.createProgram({ rootNames: fileNames, options, host });
+    return ts.createProgram({ rootNames: [...fileMap.keys()], options, host });
 }
-export function buildIndex(prog) {
-    const checker = prog.getTypeChecker();
+export function fileHashes(files) {
+    return new Map(files.map((f) => [normalizePath(f.path), f.hash ?? hash(f.content)]));
+}
+export function buildIndex(parsed, seed = {}, mode = "tiered") {
+    return drain(buildIndexSteps(parsed, seed, mode));
+}
+// buildIndex, one step per file.
+export function* buildIndexSteps(parsed, seed = {}, mode = "tiered") {
     const nodes = [];
-    for (const sf of prog.getSourceFiles()) {
+    let programKey;
+    // Types resolved through the checker may come from any file of the program.
+    const programMemoKey = (memoKey) => `${memoKey}:${(programKey ?? (programKey = hash([...parsed.hashes.values()].sort().join(","))))}`;
+    for (const sf of parsed.sourceFiles) {
+        yield;
         if (sf.isDeclarationFile)
             continue;
-        ts.forEachChild(sf, function walk(n) {
-            if (ts.isFunctionDeclaration(n) ||
-                ts.isClassDeclaration(n) ||
-                ts.isInterfaceDeclaration(n) ||
-                ts.isEnumDeclaration(n) ||
-                ts.isVariableStatement(n)) {
-                const name = n.name?.getText?.() ?? null;
-                const kind = ts.SyntaxKind[n.kind];
-                const addressId = computeAddressId(sf, n, name);
-                const symbolId = computeSymbolId(checker, n);
-                const range = { file: sf.fileName, start: n.pos, end: n.end };
-                nodes.push({ symbolId, addressId, kind, name, range });
-            }
-            ts.forEachChild(n, walk);
-        });
+        const fileHash = parsed.hashes.get(sf.fileName) ?? hash(sf.text);
+        const memoKey = `${mode}:${fileHash}`;
+        // Content already indexed (for another commit or revision): reuse its symbols instead of re-deriving them.
+        // Symbols derived from the checker are only reused within the very same set of files, and never seeded.
+        let entries = seed[fileHash] ?? indexMemo.get(memoKey);
+        let typeChecked = false;
+        if (!entries && mode !== "syntax") {
+            entries = indexMemo.get(programMemoKey(memoKey));
+            typeChecked = entries !== undefined;
+        }
+        if (!entries) {
+            const indexed = indexFile(sf, parsed, mode);
+            entries = indexed.entries;
+            typeChecked = indexed.typeChecked;
+            remember(indexMemo, typeChecked ? programMemoKey(memoKey) : memoKey, entries);
+        }
+        for (const s of entries) {
+            const addressId = computeAddressId(sf.fileName, s.name, s.start);
+            const range = { file: sf.fileName, start: s.start, end: s.end };
+            const { symbolId, kind, name, fingerprint } = s;
+            const node = { symbolId, addressId, kind, name, range, fileHash, fingerprint };
+            if (typeChecked)
+                node.typeChecked = true;
+            nodes.push(node);
+        }
     }
-    return { nodes, checker };
+    return { nodes };
+}
+function drain(steps) {
+    for (;;) {
+        const step = steps.next();
+        if (step.done)
+            return step.value;
+    }
+}
+function indexFile(sf, parsed, mode) {
+    const entries = [];
+    let typeChecked = false;
+    const unresolved = mode === "syntax" ? new Set() : unresolvedTypeNames(sf);
+    const resolveType = (t) => {
+        if (mode === "full" || (mode === "tiered" && referencesAny(t, unresolved))) {
+            typeChecked = true;
+            const checker = parsed.program().getTypeChecker();
+            return checker.typeToString(checker.getTypeFromTypeNode(t));
+        }
+        return typeNodeText(t);
+    };
+    ts.forEachChild(sf, function walk(n) {
+        if (ts.isFunctionDeclaration(n) ||
+            ts.isClassDeclaration(n) ||
+            ts.isInterfaceDeclaration(n) ||
+            ts.isEnumDeclaration(n) ||
+            ts.isVariableStatement(n)) {
+            const name = n.name?.getText?.() ?? null;
+            const kind = ts.SyntaxKind[n.kind];
+            const symbolId = computeSymbolId(n, resolveType);
+            const fingerprint = computeFingerprint(sf, n);
+            entries.push({ symbolId, kind, name, start: n.pos, end: n.end, fingerprint });
+        }
+        ts.forEachChild(n, walk);
+    });
+    return { entries, typeChecked };
 }
-function computeAddressId(sf, n, name) {
-    return `${sf.fileName}::${name ?? "anon"}::${n.pos}`;
+export function textOf(parsed) {
+    const texts = new Map(parsed.sourceFiles.map((sf) => [sf.fileName, sf.text]));
+    return (n) => texts.get(n.range.file)?.slice(n.range.start, n.range.end) ?? "";
+}
+export function toSymbolEntry(n) {
+    return {
+        symbolId: n.symbolId,
+        addressId: n.addressId,
+        kind: n.kind,
+        name: n.name,
+        file: n.range.file,
+        start: n.range.start,
+        end: n.range.end,
+        fileHash: n.fileHash,
+        fingerprint: n.fingerprint,
+        typeChecked: n.typeChecked ?? false,
+    };
+}
+function computeAddressId(file, name, pos) {
+    return `${file}::${name ?? "anon"}::${pos}`;
 }
 function hash(data) {
     return crypto.createHash("sha256").update(data).digest("hex").slice(0, 16);
 }
-export function computeSymbolId(checker, n) {
+export function computeSymbolId(n, resolveType = typeNodeText) {
     let sig = "";
     if (ts.isFunctionDeclaration(n) && n.parameters) {
-        const params = n.parameters
-            .map((p) => {
-            const t = p.type ? checker.typeToString(checker.getTypeFromTypeNode(p.type)) : "any";
-            return t;
-        })
-            .join(",");
-        const rt = n.type ? checker.typeToString(checker.getTypeFromTypeNode(n.type)) : "any";
+        const params = n.parameters.map((p) => (p.type ? resolveType(p.type) : "any")).join(",");
+        const rt = n.type ? resolveType(n.type) : "any";
         sig = `fn(${params})->${rt}`;
     }
     else if (ts.isClassDeclaration(n)) {
@@ -82,6 +180,75 @@ export function computeSymbolId(checker, n) {
     }
     return hash(sig);
 }
+function computeFingerprint(sf, n) {
+    const start = n.getStart(sf);
+    let text = sf.text.slice(start, n.end);
+    const nameNode = n.name;
+    if (nameNode && ts.isIdentifier(nameNode)) {
+        const at = nameNode.getStart(sf) - start;
+        text = text.slice(0, at) + text.slice(at + nameNode.getWidth(sf));
+    }
+    return hash(`${ts.SyntaxKind[n.kind]}:${text.replace(/\s+/g, " ")}`);
+}
+function typeNodeText(t) {
+    return t.getText().replace(/\s+/g, " ").trim();
+}
+// Names whose spelling does not determine the type they denote within this file:
+// local type aliases and imported bindings. Anything else (primitives, lib globals,
+// in-file interfaces/classes/enums) prints the same through the checker.
+function unresolvedTypeNames(sf) {
+    const names = new Set();
+    for (const stmt of sf.statements) {
+        if (ts.isTypeAliasDeclaration(stmt)) {
+            names.add(stmt.name.text);
+        }
+        else if (ts.isImportDeclaration(stmt) && stmt.importClause) {
+            const clause = stmt.importClause;
+            if (clause.name)
+                names.add(clause.name.text);
+            const bindings = clause.namedBindings;
+            if (bindings && ts.isNamedImports(bindings)) {
+                for (const el of bindings.elements)
+                    names.add(el.name.text);
+            }
+            else if (bindings && ts.isNamespaceImport(bindings)) {
+                names.add(bindings.name.text);
+            }
+        }
+        else if (ts.isImportEqualsDeclaration(stmt)) {
+            names.add(stmt.name.text);
+        }
+    }
+    return names;
+}
+function referencesAny(t, names) {
+    if (names.size === 0)
+        return false;
+    let found = false;
+    (function visit(n) {
+        if (found)
+            return;
+        if (ts.isTypeReferenceNode(n) || ts.isExpressionWithTypeArguments(n)) {
+            const head = ts.isTypeReferenceNode(n) ? n.typeName : n.expression;
+            const first = head.getText().split(".")[0];
+            if (names.has(first)) {
+                found = true;
+                return;
+            }
+        }
+        else if (ts.isTypeQueryNode(n) || ts.isImportTypeNode(n)) {
+            found = true;
+            return;
+        }
+        ts.forEachChild(n, visit);
+    })(t);
+    return found;
+}
+function remember(memo, key, value) {
+    if (memo.size >= MEMO_LIMIT)
+        memo.clear();
+    memo.set(key, value);
+}
 function normalizePath(p) {
     return p.replace(/\\/g, "/").replace(/^\.\//, "").replace(/^\//, "");
 }
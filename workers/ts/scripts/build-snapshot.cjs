@@ -0,0 +1,77 @@
+// Build dist/snapshot/worker.blob, a Node startup snapshot of the worker.
+//
+// Optional: when the running Node cannot build snapshots, SEMMERGE_SNAPSHOT=0
+// is set, or the build fails, this prints a warning and exits successfully;
+// the Python bridge then starts dist/index.js as before. worker.json records
+// the Node binary the blob was built with, because a blob only loads in the
+// exact Node build that produced it, and a hash of dist/*.js, so that a
+// checkout that changes any worker module (not only index.js) retires the
+// blob. The bridge computes the same hash (bridge._dist_hash).
+"use strict";
+
+const { spawnSync } = require("node:child_process");
+const crypto = require("node:crypto");
+const fs = require("node:fs");
+const path = require("node:path");
+const v8 = require("node:v8");
+
+const root = path.resolve(__dirname, "..");
+const outDir = path.join(root, "dist", "snapshot");
+const blob = path.join(outDir, "worker.blob");
+const meta = path.join(outDir, "worker.json");
+const bundle = path.join(outDir, "worker.js");
+
+// SHA-256 over "<name>\0<content>\0" of every dist/*.js, in name order.
+function distHash() {
+  const dist = path.join(root, "dist");
+  const hash = crypto.createHash("sha256");
+  for (const name of fs.readdirSync(dist).filter((name) => name.endsWith(".js")).sort()) {
+    hash.update(`${name}\0`);
+    hash.update(fs.readFileSync(path.join(dist, name)));
+    hash.update("\0");
+  }
+  return hash.digest("hex");
+}
+
+function skip(reason) {
+  fs.rmSync(blob, { force: true });
+  fs.rmSync(meta, { force: true });
+  console.warn(`semmerge: startup snapshot skipped (${reason}); the worker starts from dist/index.js`);
+  process.exit(0);
+}
+
+if (process.env.SEMMERGE_SNAPSHOT === "0") skip("SEMMERGE_SNAPSHOT=0");
+if (!v8.startupSnapshot) skip(`Node ${process.version} cannot build startup snapshots`);
+if (!fs.existsSync(bundle)) skip("dist/snapshot/worker.js missing; run tsc -p tsconfig.snapshot.json");
+
+let typescript;
+try {
+  typescript = require.resolve("typescript", { paths: [root] });
+} catch (err) {
+  skip(`typescript not installed: ${err.message}`);
+}
+
+const started = Date.now();
+const result = spawnSync(
+  process.execPath,
+  ["--snapshot-blob", blob, "--build-snapshot", path.join(__dirname, "snapshot-entry.cjs")],
+  {
+    cwd: root,
+    env: { ...process.env, SEMMERGE_TYPESCRIPT: typescript, SEMMERGE_WORKER_BUNDLE: bundle },
+    stdio: ["ignore", "inherit", "inherit"],
+  }
+);
+if (result.status !== 0 || !fs.existsSync(blob)) skip(`node --build-snapshot exited with ${result.status}`);
+
+const node = fs.realpathSync(process.execPath);
+const stat = fs.statSync(node);
+fs.writeFileSync(
+  meta,
+  JSON.stringify(
+    { node, version: process.version, size: stat.size, mtime: Math.floor(stat.mtimeMs / 1000), dist: distHash() },
+    null,
+    2
+  ) + "\n"
+);
+const mb = (fs.statSync(blob).size / 1048576).toFixed(1);
+console.log(`semmerge: built startup snapshot ${path.relative(root, blob)} (${mb} MB) in ${Date.now() - started} ms`);
@@ -0,0 +1,56 @@
+// Entry script for `node --build-snapshot` (see build-snapshot.cjs).
+//
+// While a snapshot is being built only built-in modules can be required, so
+// TypeScript and the worker bundle (tsconfig.snapshot.json: every module of
+// src/ in one AMD file) are read from disk and evaluated here. The snapshot
+// captures TypeScript fully initialized and every worker module except
+// `index`, which starts reading requests and therefore runs only once the
+// snapshot is deserialized.
+"use strict";
+
+const fs = require("node:fs");
+const path = require("node:path");
+const v8 = require("node:v8");
+const vm = require("node:vm");
+
+function evaluateCommonJs(file) {
+  const source = fs.readFileSync(file, "utf8");
+  const wrapper = vm.runInThisContext(
+    `(function (exports, require, module, __filename, __dirname) {${source}\n})`,
+    { filename: file }
+  );
+  const module = { exports: {} };
+  wrapper(module.exports, require, module, file, path.dirname(file));
+  return module.exports;
+}
+
+const ts = evaluateCommonJs(process.env.SEMMERGE_TYPESCRIPT);
+
+const modules = new Map();
+function define(name, deps, factory) {
+  modules.set(name, { deps, factory, exports: undefined });
+}
+function load(name) {
+  if (name === "typescript") return ts;
+  if (name.startsWith("node:")) return require(name);
+  const module = modules.get(name);
+  if (!module) throw new Error(`snapshot bundle has no module ${name}`);
+  if (module.exports === undefined) {
+    module.exports = {};
+    const args = module.deps.map((dep) =>
+      dep === "require" ? load : dep === "exports" ? module.exports : load(dep)
+    );
+    module.factory(...args);
+  }
+  return module.exports;
+}
+
+const bundle = process.env.SEMMERGE_WORKER_BUNDLE;
+vm.runInThisContext(`(function (define) {${fs.readFileSync(bundle, "utf8")}\n})`, { filename: bundle })(define);
+for (const name of modules.keys()) {
+  if (name !== "index") load(name);
+}
+
+v8.startupSnapshot.setDeserializeMainFunction(() => {
+  load("index");
+});
@@ -1,56 +1,279 @@
 import readline from "node:readline";
-import { BuildAndDiffParams, BuildAndDiffResult } from "./protocol.js";
-import { parseFiles, buildIndex } from "./sast.js";
+import {
+  AddFilesParams,
+  BuildAndDiffParams,
+  BuildAndDiffResult,
+  CancelParams,
+  File,
+  ProgressParams,
+  REQUEST_CANCELLED,
+  Snapshot,
+  SnapshotRef,
+} from "./protocol.js";
+import {
+  IndexMode,
+  NodeInfo,
+  ParsedFiles,
+  SymbolSeed,
+  buildIndexSteps,
+  parseFiles,
+  parseFilesSteps,
+  textOf,
+  toSymbolEntry,
+} from "./sast.js";
 import { diffNodes } from "./diff.js";
 import { lift } from "./lift.js";
+import { attachReferences } from "./refs.js";
 
-type RpcRequest = { jsonrpc: "2.0"; id: number; method: string; params: any };
+type RpcRequest = { jsonrpc: "2.0"; id?: number; method: string; params: any };
+type Task = { id: number; cancelled: boolean; lastProgress: number };
+type Phase = { phase: ProgressParams["phase"]; side: string; total: number };
+type Index = { nodes: NodeInfo[] };
+
+class Cancelled extends Error {}
+class OverBudget extends Error {}
+
+// Longest a request runs before letting others take a turn.
+const SLICE_MS = 20;
+// Least time between two progress notifications of one request, except at the end of a phase.
+const PROGRESS_MS = 250;
+// Files indexed before projecting how long indexing will take.
+const PROJECTION_SAMPLE = 20;
+
+// Files streamed ahead of the request that uses them, keyed by snapshot reference.
+const streamed = new Map<string, File[]>();
+// Requests being handled, by id; `$/cancelRequest` marks one cancelled.
+const inflight = new Map<number, Task>();
 
 const rl = readline.createInterface({ input: process.stdin, crlfDelay: Infinity });
 
 async function main() {
+  // Requests are not awaited: each runs as its own task and yields every SLICE_MS (see sliced),
+  // so later requests and notifications are read, and short requests answered, while a long one runs.
   for await (const line of rl) {
     if (!line) continue;
     const req = JSON.parse(line) as RpcRequest;
-    try {
-      if (req.method === "buildAndDiff") {
-        const params = req.params as BuildAndDiffParams;
-        const baseProg = parseFiles(params.base.files);
-        const leftProg = parseFiles(params.left.files);
-        const rightProg = parseFiles(params.right.files);
-
-        const baseIdx = buildIndex(baseProg);
-        const leftIdx = buildIndex(leftProg);
-        const rightIdx = buildIndex(rightProg);
-
-        const diffA = diffNodes(baseIdx.nodes, leftIdx.nodes);
-        const diffB = diffNodes(baseIdx.nodes, rightIdx.nodes);
-
-        const result: BuildAndDiffResult = {
-          opLogLeft: lift("base", diffA),
-          opLogRight: lift("base", diffB),
-          symbolMaps: {
-            base: baseIdx.nodes.map((n) => ({ symbolId: n.symbolId, addressId: n.addressId })),
-            left: leftIdx.nodes.map((n) => ({ symbolId: n.symbolId, addressId: n.addressId })),
-            right: rightIdx.nodes.map((n) => ({ symbolId: n.symbolId, addressId: n.addressId })),
-          },
-          diagnostics: [],
+    if (req.id === undefined) {
+      notification(req);
+    } else {
+      void handle(req as RpcRequest & { id: number });
+    }
+  }
+}
+
+async function handle(req: RpcRequest & { id: number }) {
+  const task: Task = { id: req.id, cancelled: false, lastProgress: 0 };
+  inflight.set(req.id, task);
+  try {
+    if (req.method === "buildAndDiff") {
+      respond(req.id, await buildAndDiff(req.params as BuildAndDiffParams, task));
+    } else if (req.method === "diff") {
+      respond(req.id, await diff(req.params, task));
+    } else {
+      error(req.id, -32601, "Method not found");
+    }
+  } catch (err: any) {
+    if (err instanceof Cancelled) error(req.id, REQUEST_CANCELLED, "Request cancelled");
+    else error(req.id, -32000, err?.message ?? String(err));
+  } finally {
+    inflight.delete(req.id);
+  }
+}
+
+async function buildAndDiff(params: BuildAndDiffParams, task: Task): Promise<BuildAndDiffResult> {
+  const started = performance.now();
+  const lap = stopwatch();
+  // Claim streamed snapshots before the first yield, while they hold exactly the files sent before this request.
+  const files = {
+    base: snapshotFiles(params.base),
+    left: snapshotFiles(params.left),
+    right: snapshotFiles(params.right),
+  };
+
+  const progs: Record<string, ParsedFiles> = {};
+  for (const [side, sideFiles] of Object.entries(files)) {
+    progs[side] = await sliced(parseFilesSteps(sideFiles), task, phaseOf("parse", side, sideFiles));
+  }
+  const timings: Record<string, number> = { parse: lap() };
+
+  let mode = params.config.indexMode ?? "tiered";
+  const degraded: string[] = [];
+  const budgetMs = params.config.budgetMs;
+  let indexed: Record<string, Index>;
+  try {
+    indexed = await indexSides(progs, params.seed ?? {}, mode, task, budgetMs ? started + budgetMs : undefined);
+  } catch (err) {
+    if (!(err instanceof OverBudget)) throw err;
+    mode = "syntax";
+    degraded.push("syntax-index");
+    // Seeds hold symbols of the requested mode, which must not mix with syntax-only ones.
+    indexed = await indexSides(progs, {}, mode, task);
+  }
+  timings.index = lap();
+
+  const baseText = textOf(progs.base);
+  await checkpoint(task);
+  const diffA = diffNodes(indexed.base.nodes, indexed.left.nodes, baseText, textOf(progs.left));
+  await checkpoint(task);
+  const diffB = diffNodes(indexed.base.nodes, indexed.right.nodes, baseText, textOf(progs.right));
+  const opLogLeft = lift("base", diffA);
+  const opLogRight = lift("base", diffB);
+  timings.diff = lap();
+
+  await checkpoint(task);
+  // Both logs apply to the base tree, so references are resolved in the base program.
+  attachReferences(progs.base, indexed.base.nodes, [...opLogLeft, ...opLogRight]);
+  timings.references = lap();
+
+  return {
+    opLogLeft,
+    opLogRight,
+    symbolMaps: {
+      base: indexed.base.nodes.map(toSymbolEntry),
+      left: indexed.left.nodes.map(toSymbolEntry),
+      right: indexed.right.nodes.map(toSymbolEntry),
+    },
+    indexMode: mode,
+    diagnostics: [],
+    degraded,
+    timings,
+    files: { base: files.base.length, left: files.left.length, right: files.right.length },
+  };
+}
+
+// Index every side; with a deadline, throw OverBudget once indexing is projected to end after it.
+async function indexSides(
+  progs: Record<string, ParsedFiles>,
+  seed: SymbolSeed,
+  mode: IndexMode,
+  task: Task,
+  deadline?: number
+) {
+  const total = Object.values(progs).reduce((sum, prog) => sum + prog.sourceFiles.length, 0);
+  const started = performance.now();
+  let before = 0;
+  const overrun =
+    deadline === undefined || mode === "syntax"
+      ? undefined
+      : (done: number) => {
+          const indexed = before + done;
+          if (indexed < PROJECTION_SAMPLE) return false;
+          const now = performance.now();
+          return now + ((now - started) / indexed) * (total - indexed) > deadline;
         };
-        respond(req.id, result);
-      } else if (req.method === "diff") {
-        const baseProg = parseFiles(req.params.base.files);
-        const rightProg = parseFiles(req.params.right.files);
-        const diff = diffNodes(buildIndex(baseProg).nodes, buildIndex(rightProg).nodes);
-        respond(req.id, { opLogRight: lift("base", diff) });
-      } else {
-        error(req.id, -32601, "Method not found");
-      }
-    } catch (err: any) {
-      error(req.id, -32000, err?.message ?? String(err));
+  const indexed: Record<string, Index> = {};
+  for (const [side, prog] of Object.entries(progs)) {
+    const phase = phaseOf("index", side, prog.sourceFiles);
+    indexed[side] = await sliced(buildIndexSteps(prog, seed, mode), task, phase, overrun);
+    before += prog.sourceFiles.length;
+  }
+  return indexed;
+}
+
+async function diff(params: any, task: Task) {
+  const baseFiles = snapshotFiles(params.base);
+  const rightFiles = overlaid(baseFiles, params.right, snapshotFiles(params.right));
+  const mode = params.config?.indexMode ?? "tiered";
+
+  const baseProg = await sliced(parseFilesSteps(baseFiles), task, phaseOf("parse", "base", baseFiles));
+  const rightProg = await sliced(parseFilesSteps(rightFiles), task, phaseOf("parse", "right", rightFiles));
+  const baseIdx = await sliced(buildIndexSteps(baseProg, {}, mode), task, phaseOf("index", "base", baseFiles));
+  const rightIdx = await sliced(buildIndexSteps(rightProg, {}, mode), task, phaseOf("index", "right", rightFiles));
+  await checkpoint(task);
+  const nodes = diffNodes(baseIdx.nodes, rightIdx.nodes, textOf(baseProg), textOf(rightProg));
+  return { opLogRight: lift("base", nodes) };
+}
+
+// Run steps until done, taking a checkpoint whenever SLICE_MS have passed since the last one.
+// At each checkpoint, report progress through *phase* and stop if *overrun* says the work will not fit.
+async function sliced<T>(
+  steps: Generator<void, T>,
+  task: Task,
+  phase?: Phase,
+  overrun?: (done: number) => boolean
+): Promise<T> {
+  await checkpoint(task);
+  let since = performance.now();
+  let done = 0;
+  for (;;) {
+    const step = steps.next();
+    if (step.done) {
+      if (phase) progress(task, phase, phase.total, true);
+      return step.value;
+    }
+    done += 1;
+    if (performance.now() - since >= SLICE_MS) {
+      if (phase) progress(task, phase, done - 1);
+      if (overrun?.(done - 1)) throw new OverBudget();
+      await checkpoint(task);
+      since = performance.now();
     }
   }
 }
 
+function phaseOf(phase: Phase["phase"], side: string, files: unknown[]): Phase {
+  return { phase, side, total: files.length };
+}
+
+// Let other requests and notifications run, then stop here if this request was cancelled meanwhile.
+async function checkpoint(task: Task) {
+  await new Promise((resolve) => setImmediate(resolve));
+  if (task.cancelled) throw new Cancelled();
+}
+
+function progress(task: Task, phase: Phase, done: number, final = false) {
+  const now = performance.now();
+  if (!final && now - task.lastProgress < PROGRESS_MS) return;
+  task.lastProgress = now;
+  const params: ProgressParams = { id: task.id, phase: phase.phase, side: phase.side, done, total: phase.total };
+  process.stdout.write(JSON.stringify({ jsonrpc: "2.0", method: "$/progress", params }) + "\n");
+}
+
+// Returns the milliseconds since the previous call (or since creation).
+function stopwatch(): () => number {
+  let last = performance.now();
+  return () => {
+    const now = performance.now();
+    const elapsed = Math.round(now - last);
+    last = now;
+    return elapsed;
+  };
+}
+
+function notification(req: RpcRequest) {
+  try {
+    if (req.method === "addFiles") {
+      const params = req.params as AddFilesParams;
+      const files = streamed.get(params.snapshot) ?? [];
+      files.push(...params.files);
+      streamed.set(params.snapshot, files);
+      // Parse now, while the client is still reading the next files; the parse memo serves the request.
+      parseFiles(params.files);
+    } else if (req.method === "$/cancelRequest") {
+      const task = inflight.get((req.params as CancelParams).id);
+      if (task) task.cancelled = true;
+    }
+  } catch (err: any) {
+    process.stderr.write(`semmerge worker: ${req.method} failed: ${err?.message ?? String(err)}\n`);
+  }
+}
+
+function snapshotFiles(snapshot: Snapshot | SnapshotRef): File[] {
+  if ("files" in snapshot) return snapshot.files;
+  const files = streamed.get(snapshot.ref);
+  if (!files) throw new Error(`Unknown snapshot ${snapshot.ref}`);
+  streamed.delete(snapshot.ref);
+  return files;
+}
+
+// The files of *snapshot* on top of *base* when it is an overlay; unchanged files share base's parse.
+function overlaid(base: File[], snapshot: Snapshot | SnapshotRef, files: File[]): File[] {
+  if (!snapshot.overlay) return files;
+  const replaced = new Set([...snapshot.overlay.removed, ...files.map((f) => f.path)]);
+  const merged = [...base.filter((f) => !replaced.has(f.path)), ...files];
+  return merged.sort((a, b) => (a.path < b.path ? -1 : a.path > b.path ? 1 : 0));
+}
+
 function respond(id: number, result: any) {
   process.stdout.write(JSON.stringify({ jsonrpc: "2.0", id, result }) + "\n");
 }
@@ -8,6 +8,8 @@ function newId() {
 
 const now = () => new Date().toISOString();
 
+const confidence = (diff: Diff) => (diff.confidence === undefined ? {} : { confidence: diff.confidence });
+
 export function lift(baseRev: string, diffs: Diff[]): Op[] {
   const ops: Op[] = [];
   for (const diff of diffs) {
@@ -17,7 +19,7 @@ export function lift(baseRev: string, diffs: Diff[]): Op[] {
         schemaVersion: 1,
         type: "renameSymbol",
         target: { symbolId: diff.a.symbolId, addressId: diff.a.addressId },
-        params: { oldName: diff.a.name, newName: diff.b.name, file: diff.b.range.file },
+        params: { oldName: diff.a.name, newName: diff.b.name, file: diff.b.range.file, ...confidence(diff) },
         guards: { exists: true, addressMatch: diff.a.addressId },
         effects: { summary: `rename ${diff.a.name}→${diff.b.name}` },
         provenance: { rev: baseRev, timestamp: now() },
@@ -33,11 +35,39 @@ export function lift(baseRev: string, diffs: Diff[]): Op[] {
           newAddress: diff.b.addressId,
           oldFile: diff.a.range.file,
           newFile: diff.b.range.file,
+          ...confidence(diff),
         },
         guards: { exists: true, addressMatch: diff.a.addressId },
         effects: { summary: `move ${diff.a.addressId}→${diff.b.addressId}` },
         provenance: { rev: baseRev, timestamp: now() },
       });
+    } else if (diff.kind === "changeSig" && diff.a && diff.b) {
+      ops.push({
+        id: newId(),
+        schemaVersion: 1,
+        type: "changeSignature",
+        target: { symbolId: diff.a.symbolId, addressId: diff.a.addressId },
+        params: { file: diff.b.range.file, name: diff.b.name, newSymbolId: diff.b.symbolId, ...confidence(diff) },
+        guards: { exists: true, addressMatch: diff.a.addressId },
+        effects: { summary: `change signature of ${diff.b.name ?? "anon"}` },
+        provenance: { rev: baseRev, timestamp: now() },
+      });
+    } else if (diff.kind === "edit" && diff.a && diff.b) {
+      ops.push({
+        id: newId(),
+        schemaVersion: 1,
+        type: "editStmtBlock",
+        target: { symbolId: diff.a.symbolId, addressId: diff.a.addressId },
+        params: {
+          file: diff.b.range.file,
+          oldFingerprint: diff.a.fingerprint,
+          newFingerprint: diff.b.fingerprint,
+          ...confidence(diff),
+        },
+        guards: { exists: true, addressMatch: diff.a.addressId },
+        effects: { summary: `edit ${diff.b.name ?? "anon"}` },
+        provenance: { rev: baseRev, timestamp: now() },
+      });
     } else if (diff.kind === "add" && diff.b) {
       ops.push({
         id: newId(),
@@ -0,0 +1,147 @@
+import { NodeInfo } from "./sast.js";
+
+export type Match = { a: NodeInfo; b: NodeInfo; confidence: number };
+
+export type MatchOptions = {
+  shingle?: number;
+  bands?: number;
+  rows?: number;
+  threshold?: number;
+  maxBucket?: number;
+  minTokens?: number;
+};
+
+const DEFAULTS: Required<MatchOptions> = {
+  shingle: 3,
+  bands: 16,
+  rows: 4,
+  threshold: 0.75,
+  maxBucket: 64,
+  minTokens: 12,
+};
+
+// Pair deleted and added declarations that are really renames/moves of one another.
+// Bodies are reduced to MinHash signatures over token shingles; LSH banding limits the
+// comparisons to declarations that share at least one band, and a greedy assignment
+// over the surviving candidates keeps the whole pass near-linear in the number of nodes.
+// A pairing becomes a renameSymbol that rewrites references in other files, so short
+// declarations (too few shingles for the similarity to mean anything) are never paired
+// and the threshold only admits bodies that are mostly the same.
+export function matchDeclarations(
+  deletes: NodeInfo[],
+  adds: NodeInfo[],
+  baseText: (n: NodeInfo) => string,
+  sideText: (n: NodeInfo) => string,
+  options: MatchOptions = {},
+): { matches: Match[]; deletes: NodeInfo[]; adds: NodeInfo[] } {
+  const opts = { ...DEFAULTS, ...options };
+  if (deletes.length === 0 || adds.length === 0) return { matches: [], deletes, adds };
+
+  const size = opts.bands * opts.rows;
+  const signature = (toks: string[]) =>
+    toks.length < Math.max(opts.minTokens, opts.shingle) ? null : minhash(shingles(toks, opts.shingle), size);
+  const delSigs = deletes.map((n) => signature(tokens(baseText(n), n.name)));
+  const addSigs = adds.map((n) => signature(tokens(sideText(n), n.name)));
+
+  const buckets = new Map<string, { dels: number[]; adds: number[] }>();
+  const bucketFor = (key: string) => {
+    let bucket = buckets.get(key);
+    if (!bucket) {
+      bucket = { dels: [], adds: [] };
+      buckets.set(key, bucket);
+    }
+    return bucket;
+  };
+  for (let band = 0; band < opts.bands; band++) {
+    const from = band * opts.rows;
+    deletes.forEach((n, i) => {
+      const sig = delSigs[i];
+      if (sig) bucketFor(`${n.kind}|${band}|${sig.slice(from, from + opts.rows).join(",")}`).dels.push(i);
+    });
+    adds.forEach((n, j) => {
+      const sig = addSigs[j];
+      if (sig) bucketFor(`${n.kind}|${band}|${sig.slice(from, from + opts.rows).join(",")}`).adds.push(j);
+    });
+  }
+
+  const seen = new Set<number>();
+  const candidates: Array<{ i: number; j: number; score: number }> = [];
+  for (const bucket of buckets.values()) {
+    if (bucket.dels.length === 0 || bucket.adds.length === 0) continue;
+    // Huge buckets are boilerplate (getters, empty bodies); cap the work spent on them.
+    const dels = bucket.dels.slice(0, opts.maxBucket);
+    const addsIn = bucket.adds.slice(0, opts.maxBucket);
+    for (const i of dels) {
+      for (const j of addsIn) {
+        const key = i * adds.length + j;
+        if (seen.has(key)) continue;
+        seen.add(key);
+        const score = similarity(delSigs[i]!, addSigs[j]!);
+        if (score >= opts.threshold) candidates.push({ i, j, score });
+      }
+    }
+  }
+
+  candidates.sort((x, y) => y.score - x.score || x.i - y.i || x.j - y.j);
+  const usedDel = new Set<number>();
+  const usedAdd = new Set<number>();
+  const matches: Match[] = [];
+  for (const { i, j, score } of candidates) {
+    if (usedDel.has(i) || usedAdd.has(j)) continue;
+    usedDel.add(i);
+    usedAdd.add(j);
+    matches.push({ a: deletes[i], b: adds[j], confidence: Math.round(score * 1000) / 1000 });
+  }
+  return {
+    matches,
+    deletes: deletes.filter((_, i) => !usedDel.has(i)),
+    adds: adds.filter((_, j) => !usedAdd.has(j)),
+  };
+}
+
+function tokens(text: string, ownName: string | null): string[] {
+  const all = text.match(/[A-Za-z_$][\w$]*|\d+|\S/g) ?? [];
+  // The declaration's own name is exactly what a rename changes; leave it out.
+  return ownName ? all.filter((t) => t !== ownName) : all;
+}
+
+function shingles(toks: string[], k: number): number[] {
+  const out = new Set<number>();
+  for (let i = 0; i + k <= toks.length; i++) out.add(fnv(toks.slice(i, i + k).join(" ")));
+  return [...out];
+}
+
+function minhash(items: number[], size: number): number[] {
+  const sig = new Array<number>(size).fill(0xffffffff);
+  for (const item of items) {
+    for (let s = 0; s < size; s++) {
+      const h = mix(item ^ SEEDS[s]);
+      if (h < sig[s]) sig[s] = h;
+    }
+  }
+  return sig;
+}
+
+function similarity(x: number[], y: number[]): number {
+  let same = 0;
+  for (let s = 0; s < x.length; s++) if (x[s] === y[s]) same++;
+  return same / x.length;
+}
+
+function fnv(text: string): number {
+  let h = 0x811c9dc5;
+  for (let i = 0; i < text.length; i++) {
+    h ^= text.charCodeAt(i);
+    h = Math.imul(h, 0x01000193);
+  }
+  return h >>> 0;
+}
+
+function mix(x: number): number {
+  x = Math.imul(x ^ (x >>> 16), 0x7feb352d);
+  x = Math.imul(x ^ (x >>> 15), 0x846ca68b);
+  return (x ^ (x >>> 16)) >>> 0;
+}
+
+// Fixed per-permutation seeds keep signatures (and therefore matches) deterministic.
+const SEEDS: number[] = Array.from({ length: 256 }, (_, s) => mix(0x9e3779b9 + s));
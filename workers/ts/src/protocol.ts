@@ -1,5 +1,20 @@
-export type File = { path: string; content: string };
-export type Snapshot = { files: File[]; project?: string | null };
+import { IndexMode, SeedNode } from "./sast.js";
+
+export type File = { path: string; content: string; hash?: string };
+// The files of an overlay snapshot replace or add to those of the request's base snapshot; `removed` drops base files.
+export type Overlay = { removed: string[] };
+export type Snapshot = { files: File[]; project?: string | null; overlay?: Overlay };
+// A snapshot whose files were streamed earlier through `addFiles` notifications.
+export type SnapshotRef = { ref: string; project?: string | null; overlay?: Overlay };
+export type AddFilesParams = { snapshot: string; files: File[] };
+// `$/cancelRequest` notification: stop working on request `id`, which then fails with REQUEST_CANCELLED.
+export type CancelParams = { id: number };
+export const REQUEST_CANCELLED = -32800;
+// `$/progress` notification: `done` of `total` files of one side through one phase of request `id`.
+export type ProgressParams = { id: number; phase: "parse" | "index"; side: string; done: number; total: number };
+
+// A span in a base-revision file; `shorthand` marks `{ name }` object literals, which keep their key.
+export type Reference = { file: string; start: number; end: number; shorthand?: boolean };
 
 export type Op = {
   id: string;
@@ -13,15 +28,37 @@ export type Op = {
 };
 
 export type BuildAndDiffParams = {
-  base: Snapshot;
-  left: Snapshot;
-  right: Snapshot;
-  config: { deterministicSeed?: string };
+  base: Snapshot | SnapshotRef;
+  left: Snapshot | SnapshotRef;
+  right: Snapshot | SnapshotRef;
+  // budgetMs: time the request may take; indexing is redone syntax-only when projected to take longer.
+  config: { deterministicSeed?: string; indexMode?: IndexMode; budgetMs?: number };
+  seed?: Record<string, SeedNode[]>;
+};
+
+export type SymbolEntry = {
+  symbolId: string;
+  addressId: string;
+  kind: string;
+  name: string | null;
+  file: string;
+  start: number;
+  end: number;
+  fileHash: string;
+  fingerprint: string;
+  // Resolved through the checker: the symbols also depend on other files, so they are never seeded.
+  typeChecked: boolean;
 };
 
 export type BuildAndDiffResult = {
   opLogLeft: Op[];
   opLogRight: Op[];
-  symbolMaps: Record<string, Array<{ symbolId: string; addressId: string }>>;
+  symbolMaps: Record<string, SymbolEntry[]>;
+  indexMode: IndexMode;
   diagnostics: any[];
+  // Cheaper strategies taken to stay within budgetMs, e.g. "syntax-index".
+  degraded: string[];
+  // Milliseconds per phase, and files per side.
+  timings: Record<string, number>;
+  files: Record<string, number>;
 };